@@ -99,6 +99,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+# Shared by all workers: the product catalog version, sales figures and
+# thumbnail entries must be seen by every process. The table is created by
+# core's migrations (or ``manage.py createcachetable``).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'crm_cache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,6 +155,19 @@ STATICFILES_DIRS = [
 
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+# Where collect_media_garbage --quarantine moves unreferenced files; must be
+# outside MEDIA_ROOT, which is served publicly.
+MEDIA_QUARANTINE_ROOT = BASE_DIR / "media_quarantine"
+
+# Attachment and avatar previews (see core/thumbnails.py)
+THUMBNAIL_SIZE = (160, 160)
+AVATAR_SIZE = (200, 200)
+THUMBNAIL_WORKERS = 2
+
+# Due-date reminders (see core/reminders.py). Emails go through EMAIL_BACKEND,
+# the console backend unless configured otherwise.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+REMINDER_EMAIL = True
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -0,0 +1,430 @@
+"""
+Per-user agenda: calendar events, tasks with a due date and lead follow-ups.
+
+``agenda_items`` merges the three sources into one time-ordered list for the
+calendar (each source is already sorted, so they are combined with
+``heapq.merge``). ``ics_feed`` renders the same agenda as iCalendar for the
+private subscription URL:
+
+- Without a sync token the feed covers a bounded window (``ICS_PAST`` back,
+  ``ICS_FUTURE`` ahead); recurring events and tasks are sent once with their
+  ``RRULE`` instead of being expanded.
+- With ``sync_token`` only rows changed since that token are sent. Items that
+  no longer belong on the agenda, were deleted or left the user's view come
+  back as ``STATUS:CANCELLED`` so the client can drop them.
+
+Deleted items leave no row to compare against, so each user with a feed
+gets an ``AgendaTombstone`` for them: for a deleted task, everyone who could
+see it; for a lead, its owner; for an event, every feed (the calendar is
+shared). Tasks that leave someone's view (reassigned, or on a client or
+lead the user lost access to) get one for that user too; see
+``calendarapp.signals``.
+
+``agenda_fingerprint`` summarizes the sources with a few indexed aggregates;
+it is used as the ETag so polling clients get a 304 without the feed being built.
+"""
+import hashlib
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from client.models import Client
+from core.models import AccessGrant
+from lead.models import Lead
+from task.models import Task
+from task.recurrence import occurrences_between
+from .models import AgendaFeed, AgendaTombstone, Event
+from .recurrence import occurrences
+
+ICS_PAST = timedelta(days=90)
+ICS_FUTURE = timedelta(days=365)
+# Older tokens fall back to a full feed; tombstones are kept this long.
+SYNC_TOKEN_LIFETIME = timedelta(days=30)
+# Rows committed just after a sync can carry a slightly older timestamp.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+TASK_COLOR = '#5d718d'
+LEAD_COLOR = '#b7791f'
+
+EVENT_FEED_FIELDS = ('id', 'title', 'start', 'end', 'description', 'rrule', 'exdates', 'version')
+# What decides who sees a task; enough to load for ``task_viewers``.
+TASK_VIEWER_FIELDS = ('created_by', 'assigned_to', 'client', 'lead')
+
+
+def event_item(event, start=None, end=None):
+    """FullCalendar dict for an event row (``EVENT_FEED_FIELDS``) or one of its occurrences."""
+    data = {
+        'id': event['id'],
+        'title': event['title'],
+        'start': (start or event['start']).isoformat(),
+        'end': None,
+        'description': event['description'],
+    }
+    end = end if start else event['end']
+    if end:
+        data['end'] = end.isoformat()
+    if event['rrule']:
+        # One series, many occurrences: group them and edit the series, not a copy.
+        data.update({'groupId': event['id'], 'recurring': True, 'editable': False})
+    return data
+
+
+def event_items(range_start, range_end):
+    """``(sort key, item)`` pairs for events overlapping the range, in order."""
+    items = [
+        (event['start'], event_item(event))
+        for event in Event.objects.single_in_range(range_start, range_end).values(*EVENT_FEED_FIELDS)
+    ]
+    for event in Event.objects.recurring_in_range(range_start, range_end).values(*EVENT_FEED_FIELDS):
+        items.extend(
+            (start, event_item(event, start, end))
+            for start, end in occurrences(event, range_start, range_end)
+        )
+    items.sort(key=lambda pair: (pair[0], pair[1]['id']))
+    return items
+
+
+def _due(due_date, due_time):
+    """Sort key and FullCalendar fields for a due date with an optional time."""
+    if due_time is None:
+        moment = timezone.make_aware(datetime.combine(due_date, time.min))
+        return moment, {'start': due_date.isoformat(), 'allDay': True}
+    moment = timezone.make_aware(datetime.combine(due_date, due_time))
+    return moment, {'start': moment.isoformat(), 'allDay': False}
+
+
+def agenda_tasks(user):
+    return Task.objects.visible_to(user).exclude(status='canceled').filter(due_date__isnull=False)
+
+
+def task_viewers(tasks):
+    """``{task_id: {user_id}}`` of the users who can see each of ``tasks`` (as ``Task.visible_to``)."""
+    tasks = list(tasks)
+    content_types = ContentType.objects.get_for_models(Client, Lead)
+    client_type, lead_type = content_types[Client].pk, content_types[Lead].pk
+    grants = AccessGrant.objects.filter(
+        Q(content_type_id=client_type, object_id__in={task.client_id for task in tasks if task.client_id})
+        | Q(content_type_id=lead_type, object_id__in={task.lead_id for task in tasks if task.lead_id})
+    )
+    holders = defaultdict(set)
+    for content_type_id, object_id, user_id in grants.values_list('content_type_id', 'object_id', 'user_id'):
+        holders[content_type_id, object_id].add(user_id)
+    return {
+        task.pk: ({task.created_by_id, task.assigned_to_id} - {None})
+        | holders[client_type, task.client_id] | holders[lead_type, task.lead_id]
+        for task in tasks
+    }
+
+
+def record_removals(kind, removals):
+    """Tombstone ``(user_id, object_id)`` pairs of ``kind`` for the users who have a feed."""
+    removals = set(removals)
+    subscribers = set(
+        AgendaFeed.objects.filter(user_id__in={user_id for user_id, _ in removals}).values_list('user_id', flat=True)
+    )
+    AgendaTombstone.objects.bulk_create([
+        AgendaTombstone(user_id=user_id, kind=kind, object_id=object_id)
+        for user_id, object_id in removals if user_id in subscribers
+    ])
+
+
+def record_task_departures(viewers, tasks):
+    """Tombstone ``tasks`` for the users in ``viewers`` (earlier ``task_viewers``) who no longer see them."""
+    current = task_viewers(tasks)
+    record_removals('task', (
+        (user_id, task_id)
+        for task_id, user_ids in viewers.items()
+        for user_id in user_ids - current.get(task_id, set())
+    ))
+
+
+def agenda_leads(user):
+    return Lead.objects.filter(
+        created_by=user, converted_to_client=False, due_date__isnull=False,
+    ).exclude(status__in=[Lead.WON, Lead.LOST])
+
+
+def task_items(user, range_start, range_end):
+    first_day, last_day = timezone.localdate(range_start), timezone.localdate(range_end)
+    tasks = (
+        agenda_tasks(user)
+        # Open recurring tasks may have occurrences in the range after their due date.
+        .filter(Q(due_date__range=(first_day, last_day))
+                | Q(due_date__lt=first_day, status__in=['todo', 'in_progress'], recurrence__gt=''))
+        .select_related('series')
+        .only('id', 'title', 'status', 'due_date', 'due_time', 'recurrence',
+              'recurrence_interval', 'recurrence_until', 'series__due_date')
+    )
+    items = []
+    for task in tasks:
+        days = occurrences_between(task, first_day, last_day) if task.status != 'completed' else [task.due_date]
+        for day in days:
+            moment, fields = _due(day, task.due_time)
+            items.append((moment, {
+                'id': f'task-{task.pk}',
+                'title': task.title,
+                'kind': 'task',
+                'url': reverse('task:task_detail', args=[task.pk]),
+                'color': TASK_COLOR,
+                'editable': False,
+                **fields,
+            }))
+    items.sort(key=lambda pair: pair[0])
+    return items
+
+
+def lead_items(user, range_start, range_end):
+    leads = (
+        agenda_leads(user)
+        .filter(due_date__range=(timezone.localdate(range_start), timezone.localdate(range_end)))
+        .order_by('due_date', 'due_time')
+        .only('id', 'first_name', 'last_name', 'due_date', 'due_time')
+    )
+    items = []
+    for lead in leads:
+        moment, fields = _due(lead.due_date, lead.due_time)
+        items.append((moment, {
+            'id': f'lead-{lead.pk}',
+            'title': f'Follow up: {lead}',
+            'kind': 'lead',
+            'url': reverse('lead:detail', args=[lead.pk]),
+            'color': LEAD_COLOR,
+            'editable': False,
+            **fields,
+        }))
+    items.sort(key=lambda pair: pair[0])
+    return items
+
+
+def agenda_items(user, range_start, range_end):
+    """Events, tasks and lead follow-ups in the range, in time order."""
+    merged = heapq.merge(
+        event_items(range_start, range_end),
+        task_items(user, range_start, range_end),
+        lead_items(user, range_start, range_end),
+        key=lambda pair: pair[0],
+    )
+    return [item for _, item in merged]
+
+
+# iCalendar
+
+def _latest(queryset, field):
+    latest = queryset.order_by().aggregate(latest=Max(field))['latest']
+    return latest.isoformat() if latest else ''
+
+
+def _fingerprint_part(queryset, changed_field):
+    state = queryset.order_by().aggregate(latest=Max(changed_field), count=Count('id'))
+    return f"{state['latest'].isoformat() if state['latest'] else ''}/{state['count']}"
+
+
+def agenda_fingerprint(user, sync_token=None):
+    """Cheap summary of everything the feed depends on, used as its ETag."""
+    parts = [
+        str(user.pk),
+        sync_token or '',
+        # The full feed window moves once a day.
+        timezone.localdate().isoformat(),
+        # Deleted events show up as the user's tombstones, so the latest
+        # change is enough; no count over the whole table.
+        _latest(Event.objects.all(), 'updated_at'),
+        _fingerprint_part(Task.objects.visible_to(user), 'updated_at'),
+        _fingerprint_part(Lead.objects.filter(created_by=user), 'modified_at'),
+        _latest(AgendaTombstone.objects.filter(user=user), 'deleted_at'),
+    ]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def make_sync_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_sync_token(token):
+    """Moment a sync token stands for, or ``None`` if invalid or expired."""
+    try:
+        moment = datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    if timezone.now() - moment > SYNC_TOKEN_LIFETIME:
+        return None
+    return moment
+
+
+def _escape(text):
+    return (
+        (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Fold a content line at 75 octets without splitting UTF-8 characters."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size, limit = [], '', 0, 75
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(current)
+            current, size, limit = '', 0, 74  # continuation lines start with a space
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def _utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _due_properties(due_date, due_time):
+    if due_time is None:
+        return [
+            f'DTSTART;VALUE=DATE:{due_date:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{due_date + timedelta(days=1):%Y%m%d}',
+        ]
+    return [f'DTSTART:{_utc(timezone.make_aware(datetime.combine(due_date, due_time)))}']
+
+
+def _vevent(uid, stamp, properties):
+    return ['BEGIN:VEVENT', f'UID:{uid}', f'DTSTAMP:{_utc(stamp)}', *properties, 'END:VEVENT']
+
+
+def _cancelled(uid, stamp):
+    return _vevent(uid, stamp, [f'DTSTART:{_utc(stamp)}', 'STATUS:CANCELLED'])
+
+
+def _event_component(event, base_url):
+    properties = [f'DTSTART:{_utc(event.start)}', f'SUMMARY:{_escape(event.title)}']
+    if event.end:
+        properties.append(f'DTEND:{_utc(event.end)}')
+    if event.description:
+        properties.append(f'DESCRIPTION:{_escape(event.description)}')
+    if event.rrule:
+        properties.append(f"RRULE:{event.rrule.upper().removeprefix('RRULE:')}")
+        properties.extend(
+            f'EXDATE:{_utc(skipped)}' for skipped in map(_parse_exdate, event.exdates) if skipped
+        )
+    properties.append(f"URL:{base_url}{reverse('calendarapp:calendar')}")
+    return _vevent(f'event-{event.pk}@crmsys', event.updated_at, properties)
+
+
+def _parse_exdate(value):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+TASK_RRULE_FREQ = {'daily': 'DAILY', 'weekly': 'WEEKLY', 'monthly': 'MONTHLY', 'yearly': 'YEARLY'}
+
+
+def _task_component(task, base_url):
+    properties = [*_due_properties(task.due_date, task.due_time), f'SUMMARY:{_escape(task.title)}']
+    if task.description:
+        properties.append(f'DESCRIPTION:{_escape(task.description)}')
+    if task.recurrence and task.status != 'completed':
+        rule = f'RRULE:FREQ={TASK_RRULE_FREQ[task.recurrence]};INTERVAL={task.recurrence_interval or 1}'
+        if task.recurrence_until and task.due_time is None:
+            rule += f';UNTIL={task.recurrence_until:%Y%m%d}'
+        elif task.recurrence_until:
+            # UNTIL takes the form of DTSTART: a UTC date-time here.
+            until = timezone.make_aware(datetime.combine(task.recurrence_until, task.due_time))
+            rule += f';UNTIL={_utc(until)}'
+        properties.append(rule)
+    properties.append(f"URL:{base_url}{reverse('task:task_detail', args=[task.pk])}")
+    return _vevent(f'task-{task.pk}@crmsys', task.updated_at, properties)
+
+
+def _lead_component(lead, base_url):
+    properties = [
+        *_due_properties(lead.due_date, lead.due_time),
+        f'SUMMARY:{_escape(f"Follow up: {lead}")}',
+        f"URL:{base_url}{reverse('lead:detail', args=[lead.pk])}",
+    ]
+    return _vevent(f'lead-{lead.pk}@crmsys', lead.modified_at, properties)
+
+
+def _full_components(user, now, base_url):
+    window_start, window_end = now - ICS_PAST, now + ICS_FUTURE
+    first_day, last_day = timezone.localdate(window_start), timezone.localdate(window_end)
+    events = (
+        Event.objects.single_in_range(window_start, window_end)
+        | Event.objects.recurring_in_range(window_start, window_end)
+    )
+    for event in events.order_by('start', 'id'):
+        yield _event_component(event, base_url)
+    tasks = agenda_tasks(user).filter(
+        Q(due_date__range=(first_day, last_day))
+        | Q(due_date__lt=first_day, status__in=['todo', 'in_progress'], recurrence__gt='')
+    )
+    for task in tasks.order_by('due_date', 'pk'):
+        yield _task_component(task, base_url)
+    for lead in agenda_leads(user).filter(due_date__range=(first_day, last_day)).order_by('due_date', 'pk'):
+        yield _lead_component(lead, base_url)
+
+
+def _delta_components(user, since, now, base_url):
+    since = since - SYNC_OVERLAP
+    for event in Event.objects.filter(updated_at__gt=since).order_by('updated_at'):
+        yield _event_component(event, base_url)
+
+    on_agenda = set(agenda_tasks(user).filter(updated_at__gt=since).values_list('pk', flat=True))
+    sent = set()
+    for task in Task.objects.visible_to(user).filter(updated_at__gt=since).order_by('updated_at'):
+        if task.pk in on_agenda:
+            sent.add(f'task-{task.pk}')
+            yield _task_component(task, base_url)
+        else:
+            yield _cancelled(f'task-{task.pk}@crmsys', now)
+
+    on_agenda = set(agenda_leads(user).filter(modified_at__gt=since).values_list('pk', flat=True))
+    for lead in Lead.objects.filter(created_by=user, modified_at__gt=since).order_by('modified_at'):
+        if lead.pk in on_agenda:
+            yield _lead_component(lead, base_url)
+        else:
+            yield _cancelled(f'lead-{lead.pk}@crmsys', now)
+
+    # A task can leave the user's view and come back between two syncs.
+    tombstones = AgendaTombstone.objects.filter(user=user, deleted_at__gt=since).order_by('deleted_at', 'id')
+    for key in dict.fromkeys(f'{tombstone.kind}-{tombstone.object_id}' for tombstone in tombstones):
+        if key not in sent:
+            yield _cancelled(f'{key}@crmsys', now)
+
+
+def ics_feed(user, base_url, since=None):
+    """
+    Render the agenda as an iCalendar document.
+
+    Returns ``(text, sync_token)``; pass the token back as ``sync_token`` to
+    receive only what changed afterwards.
+    """
+    now = timezone.now()
+    if since is None:
+        # Tombstones older than any valid token are no longer needed.
+        AgendaTombstone.objects.filter(deleted_at__lt=now - SYNC_TOKEN_LIFETIME).delete()
+        components = _full_components(user, now, base_url)
+    else:
+        components = _delta_components(user, since, now, base_url)
+
+    token = make_sync_token(now)
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//CrmSys//Agenda//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape(f"CRM agenda ({user.username})")}',
+        f'X-CRMSYS-SYNC-TOKEN:{token}',
+    ]
+    for component in components:
+        lines.extend(component)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n', token
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CalendarappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calendarapp'
+
+    def ready(self):
+        # Record agenda items deleted or leaving a user's view for incremental ICS syncs.
+        from . import signals  # noqa: F401
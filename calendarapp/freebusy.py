@@ -0,0 +1,195 @@
+"""
+Free/busy and scheduling conflicts.
+
+A user's busy time is made of the events on their calendar (events they own
+plus shared events without an owner, recurring ones expanded for the range)
+and the due slots of tasks assigned to them. Everything is fetched with one
+range query per source and then handled with sorted sweeps over the intervals,
+never by comparing every pair:
+
+- ``merge_busy`` collapses a sorted interval list into disjoint busy blocks.
+- ``free_slots`` is the complement of the merged blocks inside the range.
+- ``overlapping`` walks two sorted lists with two pointers to find conflicts.
+- ``double_booked`` finds overlaps inside one list with a heap of open ends.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from task.models import Task
+from .models import Event
+from .recurrence import occurrences
+
+# How long a task with a due time blocks the calendar.
+TASK_BUSY_SLOT = timedelta(minutes=getattr(settings, 'TASK_BUSY_MINUTES', 30))
+# Recurring events are checked for conflicts this far ahead of their start.
+CONFLICT_HORIZON = timedelta(days=90)
+
+
+class Interval:
+    __slots__ = ('start', 'end', 'kind', 'pk', 'title')
+
+    def __init__(self, start, end, kind, pk, title):
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.pk = pk
+        self.title = title
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'id': self.pk,
+            'title': self.title,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+        }
+
+
+def _event_end(start, end):
+    # Events without an end still occupy their start instant.
+    return end if end and end > start else start + timedelta(minutes=1)
+
+
+def busy_intervals(user_ids, range_start, range_end, exclude_event=None):
+    """``{user_id: [Interval, ...]}`` sorted by start, for ``user_ids`` in the range."""
+    user_ids = list(user_ids)
+    busy = {user_id: [] for user_id in user_ids}
+    owners = Q(created_by_id__in=user_ids) | Q(created_by__isnull=True)
+    fields = ('id', 'title', 'start', 'end', 'rrule', 'exdates', 'version', 'created_by_id')
+
+    def add(owner_id, interval):
+        for user_id in ([owner_id] if owner_id else user_ids):
+            busy[user_id].append(interval)
+
+    events = Event.objects.filter(owners)
+    if exclude_event is not None:
+        events = events.exclude(pk=exclude_event)
+    for event in events.single_in_range(range_start, range_end).values(*fields):
+        add(event['created_by_id'], Interval(
+            event['start'], _event_end(event['start'], event['end']), 'event', event['id'], event['title'],
+        ))
+    for event in events.recurring_in_range(range_start, range_end).values(*fields):
+        for start, end in occurrences(event, range_start, range_end):
+            add(event['created_by_id'], Interval(start, _event_end(start, end), 'event', event['id'], event['title']))
+
+    # Tasks block their due slot for the assignee (the creator if unassigned).
+    first_day = timezone.localdate(range_start - TASK_BUSY_SLOT)
+    last_day = timezone.localdate(range_end)
+    tasks = (
+        Task.objects.filter(due_date__range=(first_day, last_day), due_time__isnull=False)
+        .filter(Q(assigned_to_id__in=user_ids) | Q(assigned_to__isnull=True, created_by_id__in=user_ids))
+        .exclude(status__in=['completed', 'canceled'])
+        .values_list('id', 'title', 'due_date', 'due_time', 'assigned_to_id', 'created_by_id')
+    )
+    for pk, title, due_date, due_time, assigned_to_id, created_by_id in tasks:
+        start = timezone.make_aware(datetime.combine(due_date, due_time))
+        end = start + TASK_BUSY_SLOT
+        if start < range_end and end > range_start:
+            busy[assigned_to_id or created_by_id].append(Interval(start, end, 'task', pk, title))
+
+    for intervals in busy.values():
+        intervals.sort(key=lambda interval: (interval.start, interval.end))
+    return busy
+
+
+def team_busy(busy):
+    """Busy blocks where at least one of the users is busy."""
+    return merge_busy(heapq.merge(*busy.values(), key=lambda interval: (interval.start, interval.end)))
+
+
+def merge_busy(intervals):
+    """Disjoint ``(start, end)`` blocks covering the sorted ``intervals``."""
+    merged = []
+    for interval in intervals:
+        if merged and interval.start <= merged[-1][1]:
+            if interval.end > merged[-1][1]:
+                merged[-1][1] = interval.end
+        else:
+            merged.append([interval.start, interval.end])
+    return [tuple(block) for block in merged]
+
+
+def free_slots(blocks, range_start, range_end, min_length=timedelta(0)):
+    """Gaps of at least ``min_length`` between sorted, disjoint busy ``blocks``."""
+    free = []
+    cursor = range_start
+    for start, end in blocks:
+        if start > cursor and start - cursor >= min_length:
+            free.append((cursor, min(start, range_end)))
+        cursor = max(cursor, end)
+        if cursor >= range_end:
+            break
+    if range_end > cursor and range_end - cursor >= min_length:
+        free.append((cursor, range_end))
+    return free
+
+
+def overlapping(candidates, intervals):
+    """
+    Pairs ``(candidate, interval)`` that overlap, for two lists sorted by start.
+
+    Two pointers sweep both lists once; an interval is only kept in view while
+    it can still overlap a later candidate.
+    """
+    conflicts = []
+    active = []
+    position = 0
+    for candidate in candidates:
+        while position < len(intervals) and intervals[position].start < candidate.end:
+            active.append(intervals[position])
+            position += 1
+        active = [interval for interval in active if interval.end > candidate.start]
+        conflicts.extend((candidate, interval) for interval in active)
+    return conflicts
+
+
+def double_booked(intervals):
+    """
+    Overlapping pairs within one user's sorted ``intervals``.
+
+    A min-heap of the ends still open replaces the pairwise check: each
+    interval is compared only with those that have not ended when it starts.
+    """
+    pairs = []
+    open_ends = []
+    for position, interval in enumerate(intervals):
+        while open_ends and open_ends[0][0] <= interval.start:
+            heapq.heappop(open_ends)
+        pairs.extend((intervals[other], interval) for _, other in open_ends)
+        heapq.heappush(open_ends, (interval.end, position))
+    return pairs
+
+
+def event_conflicts(event, user_id):
+    """
+    Busy intervals of ``user_id`` that overlap the saved ``event`` (all its
+    occurrences in the next ``CONFLICT_HORIZON`` for a recurring event).
+    """
+    end = _event_end(event.start, event.end)
+    if event.rrule:
+        range_start, range_end = event.start, event.start + CONFLICT_HORIZON
+        row = {
+            'id': event.pk, 'version': event.version, 'start': event.start, 'end': event.end,
+            'rrule': event.rrule, 'exdates': event.exdates,
+        }
+        candidates = [
+            Interval(start, _event_end(start, occurrence_end), 'event', event.pk, event.title)
+            for start, occurrence_end in occurrences(row, range_start, range_end)
+        ]
+    else:
+        range_start, range_end = event.start, end
+        candidates = [Interval(event.start, end, 'event', event.pk, event.title)]
+
+    busy = busy_intervals([user_id], range_start, range_end, exclude_event=event.pk)[user_id]
+    seen = set()
+    conflicts = []
+    for _, interval in overlapping(candidates, busy):
+        key = (interval.kind, interval.pk, interval.start)
+        if key not in seen:
+            seen.add(key)
+            conflicts.append(interval.as_dict())
+    return conflicts
@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from calendarapp.ics_import import IMPORT_BATCH_SIZE, import_ics
+
+
+class Command(BaseCommand):
+    help = "Import the events of an iCalendar (.ics) file into a user's calendar."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .ics file.')
+        parser.add_argument('--user', required=True, help='Username that will own the events.')
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Events inserted per query.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist")
+
+        try:
+            with open(options['path'], 'rb') as ics_file:
+                result = import_ics(ics_file, user, batch_size=options['batch_size'])
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} events "
+            f"({result['skipped']} already there or cancelled, {result['invalid']} invalid)."
+        ))
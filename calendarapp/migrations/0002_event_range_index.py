@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start', 'end'], name='calendarapp_start_2291e5_idx'),
+        ),
+    ]
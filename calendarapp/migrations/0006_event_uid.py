@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendarapp', '0005_event_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='uid',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(condition=models.Q(('uid', ''), _negated=True), fields=('created_by', 'uid'), name='unique_event_uid'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_shared_tombstones(apps, schema_editor):
+    # Existing tombstones belong to no user. Clients only miss deletions made
+    # before the upgrade, until their token expires and they fetch a full feed.
+    apps.get_model('calendarapp', 'AgendaTombstone').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('calendarapp', '0006_event_uid'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_shared_tombstones, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='agendatombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, default=0, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='agendatombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='calendarapp_tombstone_idx'),
+        ),
+    ]
@@ -1,5 +1,36 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.db import models
 
+from .recurrence import series_end
+
+# Longest an event may last; range queries look back this far for events
+# still running at the start of the range.
+MAX_EVENT_LENGTH = timedelta(days=getattr(settings, 'EVENT_MAX_DAYS', 366))
+
+
+class EventQuerySet(models.QuerySet):
+    def single_in_range(self, range_start, range_end):
+        """
+        One-off events overlapping ``[range_start, range_end)``: they begin
+        before the end and end after the start; events without an end are
+        treated as instants. No event lasts longer than ``MAX_EVENT_LENGTH``,
+        which bounds the ``(start, end)`` index scan from below too.
+        """
+        return self.filter(rrule='', start__lt=range_end, start__gte=range_start - MAX_EVENT_LENGTH).filter(
+            models.Q(end__gt=range_start) | models.Q(end__isnull=True, start__gte=range_start)
+        )
+
+    def recurring_in_range(self, range_start, range_end):
+        """Recurring series that started before the end and are still running at the start."""
+        return self.exclude(rrule='').filter(start__lt=range_end).filter(
+            models.Q(recurrence_end__isnull=True) | models.Q(recurrence_end__gt=range_start)
+        )
+
+
 # Create your models here.
 # Event
 class Event(models.Model):
@@ -7,7 +38,87 @@ class Event(models.Model):
     start = models.DateTimeField()
     end = models.DateTimeField(null=True, blank=True)
     description = models.TextField(blank=True, null=True)
+    # Whose calendar the event is on for free/busy; events without an owner
+    # (created before owners were tracked) count as busy for everyone.
+    created_by = models.ForeignKey(User, related_name='events', null=True, blank=True, on_delete=models.SET_NULL)
+    # iCalendar UID of imported events; re-importing a file skips known UIDs.
+    uid = models.CharField(max_length=255, blank=True, default='')
+    # Recurrence (see calendarapp/recurrence.py): an RFC 5545 RRULE and the
+    # ISO starts of skipped occurrences. Empty rrule means a single event.
+    rrule = models.CharField(max_length=500, blank=True, default='')
+    exdates = models.JSONField(default=list, blank=True)
+    # End of the last occurrence (None: repeats forever), kept up to date on save.
+    recurrence_end = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped on every save; part of the expansion cache key.
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = EventQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # Range feed: events starting before the window end, filtered on end.
+            models.Index(fields=['start', 'end']),
+            models.Index(fields=['start', 'recurrence_end'], name='calendarapp_recurring_idx',
+                         condition=~models.Q(rrule='')),
+            # Agenda sync tokens: rows changed since the last sync.
+            models.Index(fields=['updated_at']),
+            # Free/busy: one user's events in a range.
+            models.Index(fields=['created_by', 'start']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['created_by', 'uid'], condition=~models.Q(uid=''),
+                                    name='unique_event_uid'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        if self.rrule:
+            self.recurrence_end = series_end(self.rrule, self.start, self.end)
+        else:
+            self.recurrence_end = None
+        if self.pk:
+            self.version += 1
+        super().save(*args, **kwargs)
+
+
+# Private iCalendar subscription URL of one user's agenda
+class AgendaFeed(models.Model):
+    user = models.OneToOneField(User, related_name='agenda_feed', on_delete=models.CASCADE)
+    token = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Agenda feed of {self.user}'
+
+    @classmethod
+    def for_user(cls, user):
+        feed, _ = cls.objects.get_or_create(user=user, defaults={'token': secrets.token_urlsafe(32)})
+        return feed
+
+    def regenerate(self):
+        self.token = secrets.token_urlsafe(32)
+        self.save(update_fields=['token'])
+
+
+# Agenda items that were deleted or left a user's view, so that user's
+# incremental syncs can tell their client to drop them
+class AgendaTombstone(models.Model):
+    # No constraint: deleting a user deletes their tasks, which tombstones
+    # them for that user too; such rows just expire with the others.
+    user = models.ForeignKey(User, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False,
+                             db_index=False)
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Incremental syncs: one user's tombstones since their last sync.
+            models.Index(fields=['user', 'deleted_at'], name='calendarapp_tombstone_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
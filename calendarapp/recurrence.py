@@ -0,0 +1,164 @@
+"""
+Recurring events.
+
+A recurring event is one ``Event`` row holding an RFC 5545 ``RRULE`` (for
+example ``FREQ=WEEKLY;BYDAY=MO,WE``) and a list of skipped occurrence starts.
+Occurrences are expanded with ``dateutil`` only for the range being requested.
+Rules are user input, so they may not repeat more often than daily and only
+the first ``MAX_OCCURRENCES`` occurrences of a series are ever expanded.
+
+Rules are expanded in the site's local time zone, so a 09:00 weekly meeting
+stays at 09:00 across daylight-saving changes. Expansions are memoized in a
+process-wide LRU keyed by ``(event id, event version, range)``; saving an
+event bumps its version, so stale expansions are never served and simply age
+out of the cache.
+"""
+import re
+import threading
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from dateutil.rrule import rrulestr
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+EXPANSION_CACHE_SIZE = getattr(settings, 'EVENT_EXPANSION_CACHE_SIZE', 2048)
+# Occurrences of a series that are ever expanded (about 27 years of a daily
+# event); rules are user input and every expansion walks them from the start.
+MAX_OCCURRENCES = getattr(settings, 'EVENT_MAX_OCCURRENCES', 10000)
+
+_SUB_DAILY = re.compile(r'FREQ=(HOURLY|MINUTELY|SECONDLY)', re.IGNORECASE)
+_COUNT = re.compile(r'COUNT=(\d+)', re.IGNORECASE)
+_UNTIL = re.compile(r'UNTIL=(\d{8})(?:T(\d{6}))?(Z?)', re.IGNORECASE)
+
+
+def aware_until(rrule, tz=None):
+    """
+    ``rrule`` with a date-only or floating ``UNTIL`` rewritten as UTC (the end
+    of that day, or that wall time, in ``tz``; site time by default).
+    ``dateutil`` rejects a naive ``UNTIL`` once ``DTSTART`` is aware.
+    """
+    def to_utc(match):
+        day, clock, utc = match.groups()
+        if utc:
+            return match.group(0)
+        if clock:
+            moment = datetime.strptime(day + clock, '%Y%m%d%H%M%S')
+        else:
+            moment = datetime.combine(datetime.strptime(day, '%Y%m%d').date(), time(23, 59, 59))
+        moment = timezone.make_aware(moment, tz)
+        return f'UNTIL={moment.astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}'
+    return _UNTIL.sub(to_utc, rrule)
+
+
+def build_rule(rrule, start):
+    """
+    Parse ``rrule`` anchored at ``start``; raises ``ValueError`` if invalid,
+    repeating more often than daily or with a ``COUNT`` above ``MAX_OCCURRENCES``.
+    """
+    rrule = rrule.strip()
+    if rrule.upper().startswith('RRULE:'):
+        rrule = rrule[len('RRULE:'):]
+    if _SUB_DAILY.search(rrule):
+        raise ValueError('Events cannot repeat more often than daily')
+    count = _COUNT.search(rrule)
+    if count and int(count.group(1)) > MAX_OCCURRENCES:
+        raise ValueError(f'Events cannot repeat more than {MAX_OCCURRENCES} times')
+    return rrulestr(aware_until(rrule), dtstart=timezone.localtime(start))
+
+
+def series_end(rrule, start, end):
+    """
+    When the last occurrence of a series ends, or ``None`` if it never does.
+
+    Stored on the event so the feed can skip finished series with an index.
+    """
+    upper = rrule.upper()
+    if 'COUNT=' not in upper and 'UNTIL=' not in upper:
+        return None
+    rule = build_rule(rrule, start)
+    last, steps = None, 0
+    for last in islice(rule, MAX_OCCURRENCES + 1):
+        steps += 1
+    if steps > MAX_OCCURRENCES:
+        return None  # expansions stop at MAX_OCCURRENCES anyway
+    if last is None:
+        return start
+    return last + (end - start if end else timedelta())
+
+
+def _exdates(values):
+    skipped = set()
+    for value in values or ():
+        parsed = parse_datetime(value) if isinstance(value, str) else value
+        if parsed is not None:
+            skipped.add(parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed))
+    return skipped
+
+
+def _expand(event, range_start, range_end):
+    try:
+        rule = build_rule(event['rrule'], event['start'])
+    except ValueError:
+        return ()  # saved before the rule limits
+    duration = event['end'] - event['start'] if event['end'] else timedelta()
+    skipped = _exdates(event['exdates'])
+    occurrences = []
+    # Occurrences starting up to one duration before the window still overlap it.
+    window_start = range_start - duration
+    for start in islice(rule, MAX_OCCURRENCES):
+        if start >= range_end:
+            break
+        if start < window_start or start in skipped:
+            continue
+        end = start + duration
+        if end > range_start or (not duration and start >= range_start):
+            occurrences.append((start.astimezone(dt_timezone.utc), end.astimezone(dt_timezone.utc) if duration else None))
+    return tuple(occurrences)
+
+
+class _ExpansionCache:
+    """Small thread-safe LRU; ``functools.lru_cache`` would key on whole rows."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_expansions = _ExpansionCache(EXPANSION_CACHE_SIZE)
+
+
+def occurrences(event, range_start, range_end):
+    """
+    ``(start, end)`` pairs of ``event`` overlapping ``[range_start, range_end)``.
+
+    ``event`` is a ``values()`` row with ``id``, ``version``, ``start``, ``end``,
+    ``rrule`` and ``exdates``.
+    """
+    key = (event['id'], event['version'], range_start, range_end)
+    cached = _expansions.get(key)
+    if cached is None:
+        cached = _expand(event, range_start, range_end)
+        _expansions.set(key, cached)
+    return cached
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from client.models import Client
+from core.access import grants_revoked
+from lead.models import Lead
+from task.models import Task
+from .agenda import TASK_VIEWER_FIELDS, record_removals, record_task_departures, task_viewers
+from .models import AgendaFeed, Event
+
+
+# Deleted events leave every feed; tasks and leads only those that showed them.
+def event_deleted(sender, instance, **kwargs):
+    subscribers = AgendaFeed.objects.values_list('user_id', flat=True)
+    record_removals('event', ((user_id, instance.pk) for user_id in subscribers))
+
+
+def lead_deleted(sender, instance, **kwargs):
+    record_removals('lead', [(instance.created_by_id, instance.pk)])
+
+
+def task_deleted(sender, instance, **kwargs):
+    record_removals('task', ((user_id, instance.pk) for user_id in task_viewers([instance])[instance.pk]))
+
+
+# Reassigning a task, or moving it to another client or lead, can take it
+# out of someone's view; remember who saw it before the save.
+def task_saving(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    previous = Task.objects.filter(pk=instance.pk).only(*TASK_VIEWER_FIELDS).first()
+    if previous is not None and any(
+        getattr(previous, f'{field}_id') != getattr(instance, f'{field}_id') for field in TASK_VIEWER_FIELDS
+    ):
+        instance._agenda_viewers = task_viewers([previous])
+
+
+def task_saved(sender, instance, **kwargs):
+    viewers = instance.__dict__.pop('_agenda_viewers', None)
+    if viewers:
+        record_task_departures(viewers, [instance])
+
+
+def access_revoked(sender, grants, **kwargs):
+    # Tasks on clients and leads a user can no longer see leave their agenda.
+    content_types = ContentType.objects.get_for_models(Client, Lead)
+    kinds = {content_types[Client].pk: 'client', content_types[Lead].pk: 'lead'}
+    lost = defaultdict(lambda: {'client': set(), 'lead': set()})
+    for user_id, content_type_id, object_id in grants:
+        if content_type_id in kinds:
+            lost[user_id][kinds[content_type_id]].add(object_id)
+    for user_id in AgendaFeed.objects.filter(user_id__in=list(lost)).values_list('user_id', flat=True):
+        tasks = (
+            Task.objects.filter(Q(client_id__in=lost[user_id]['client']) | Q(lead_id__in=lost[user_id]['lead']))
+            .filter(due_date__isnull=False)
+            .exclude(pk__in=Task.objects.visible_to(user_id).values('pk'))
+            .values_list('pk', flat=True)
+        )
+        record_removals('task', ((user_id, task_id) for task_id in tasks))
+
+
+post_delete.connect(event_deleted, sender=Event, dispatch_uid='agenda_tombstone_Event')
+post_delete.connect(lead_deleted, sender=Lead, dispatch_uid='agenda_tombstone_Lead')
+post_delete.connect(task_deleted, sender=Task, dispatch_uid='agenda_tombstone_Task')
+pre_save.connect(task_saving, sender=Task, dispatch_uid='agenda_task_saving')
+post_save.connect(task_saved, sender=Task, dispatch_uid='agenda_task_saved')
+grants_revoked.connect(access_revoked, dispatch_uid='agenda_access_revoked')
@@ -26,7 +26,7 @@ document.addEventListener('DOMContentLoaded', function() {
     var calendarEl = document.getElementById('calendar');
     var calendar = new FullCalendar.Calendar(calendarEl, {
         initialView: 'dayGridMonth',
-        events: calendarEventsUrl,  // We'll define this in template!
+        events: calendarAgendaUrl,  // events, tasks and lead follow-ups; defined in template
         eventTimeFormat: {  // uppercase H for 24h, lowercase i for minutes
             hour: '2-digit',
             minute: '2-digit',
@@ -52,6 +52,12 @@ document.addEventListener('DOMContentLoaded', function() {
         },
 
         eventClick: function(info) {
+            // Tasks and lead follow-ups open their own page
+            if (info.event.extendedProps.kind) {
+                info.jsEvent.preventDefault();
+                window.location.href = info.event.url;
+                return;
+            }
             // Store event id and title in the modal for easy access
             document.getElementById('eventActionEventId').value = info.event.id;
             document.getElementById('eventActionModalTitle').textContent = info.event.title;
@@ -75,16 +81,47 @@ document.addEventListener('DOMContentLoaded', function() {
             // Remove any old listeners to avoid stacking
             document.getElementById('editEventBtn').onclick = function() {
                 actionModal.hide();
+                if (info.event.extendedProps.recurring) {
+                    // Edit the series (its first start and rule), not this occurrence
+                    openEditModal(info.event.id);
+                    return;
+                }
                 // Prefill and show the edit modal
                 document.getElementById('editEventId').value = info.event.id;
                 document.getElementById('editEventTitle').value = info.event.title;
                 document.getElementById('editEventStart').value = toDatetimeLocal(info.event.start);
                 document.getElementById('editEventEnd').value = info.event.end ? toDatetimeLocal(info.event.end) : '';
                 document.getElementById('editEventDesc').value = info.event.extendedProps.description || "";
+                setRepeatValue('editEventRepeat', '');
                 var editModal = new bootstrap.Modal(document.getElementById('editEventModal'));
                 editModal.show();
             };
 
+            var skipBtn = document.getElementById('skipOccurrenceBtn');
+            skipBtn.style.display = info.event.extendedProps.recurring ? '' : 'none';
+            skipBtn.onclick = function() {
+                actionModal.hide();
+                if (!confirm('Skip this occurrence of the event?')) {
+                    return;
+                }
+                fetch(`skip_occurrence/${info.event.id}/`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': getCookie('csrftoken'),
+                    },
+                    body: JSON.stringify({occurrence: info.event.start.toISOString()})
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        calendar.refetchEvents();
+                    } else {
+                        alert('Failed to skip occurrence.');
+                    }
+                });
+            };
+
             document.getElementById('deleteEventBtn').onclick = function() {
                 actionModal.hide();
                 if (confirm('Are you sure you want to delete this event?')) {
@@ -127,6 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
             start: localToUTC(document.getElementById('eventStart').value),
             end: localToUTC(document.getElementById('eventEnd').value),
             description: document.getElementById('eventDesc').value,
+            rrule: document.getElementById('eventRepeat').value,
         };
 
         fetch('add_event/', {
@@ -145,6 +183,7 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(data => {
             if (data.success) {
+                warnConflicts(data.conflicts);
                 // Optionally refresh the calendar:
                 calendar.refetchEvents();
                 refreshUpcomingEvents();
@@ -174,6 +213,7 @@ document.addEventListener('DOMContentLoaded', function() {
             start: localToUTC(document.getElementById('editEventStart').value),
             end: localToUTC(document.getElementById('editEventEnd').value),
             description: document.getElementById('editEventDesc').value,
+            rrule: document.getElementById('editEventRepeat').value,
         };
 
         fetch(`update_event/${eventId}/`, {
@@ -187,6 +227,7 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
+                warnConflicts(data.conflicts);
                 calendar.refetchEvents();
                 refreshUpcomingEvents();
                 bootstrap.Modal.getInstance(document.getElementById('editEventModal')).hide();
@@ -216,6 +257,8 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!data.success) {
                 alert('Failed to update event');
                 info.revert(); // Revert to original position
+            } else {
+                warnConflicts(data.conflicts);
             }
         });
     }
@@ -223,6 +266,29 @@ document.addEventListener('DOMContentLoaded', function() {
 
 });
 
+// Tell the user what a saved event overlaps on their calendar
+function warnConflicts(conflicts) {
+    if (!conflicts || !conflicts.length) {
+        return;
+    }
+    const lines = conflicts.slice(0, 10).map(function(item) {
+        return '- ' + item.title + ' (' + new Date(item.start).toLocaleString() + ')';
+    });
+    if (conflicts.length > 10) {
+        lines.push('...and ' + (conflicts.length - 10) + ' more');
+    }
+    alert('Saved, but this overlaps:\n' + lines.join('\n'));
+}
+
+// Select the event's RRULE, adding it as an option if it is not a preset
+function setRepeatValue(selectId, rrule) {
+    const select = document.getElementById(selectId);
+    if (rrule && !Array.from(select.options).some(option => option.value === rrule)) {
+        select.add(new Option(rrule, rrule));
+    }
+    select.value = rrule;
+}
+
 function toDatetimeLocal(date) {
     if (!date) return '';
     const d = (date instanceof Date) ? date : new Date(date);
@@ -266,42 +332,6 @@ function getCookie(name) {
 // upcomming events
 document.addEventListener('DOMContentLoaded', function () {
     loadUpcomingEvents();
-    fetch(calendarEventsUrl)
-        .then(response => response.json())
-        .then(function(events) {
-            const now = new Date();
-            // Sort upcoming events by start (asc)
-            const upcoming = events
-                .filter(ev => new Date(ev.start) >= now)
-                .sort((a, b) => new Date(a.start) - new Date(b.start))
-                .slice(0, 5); // Only show next 5 by default. Adjust if needed
-
-            const ul = document.getElementById('upcoming-events-list');
-            ul.innerHTML = ""; // Clear old contents
-
-            upcoming.forEach(event => {
-                const li = document.createElement('li');
-                li.classList.add('list-group-item');
-
-                // Add end time if available. You can change format as needed
-                let display = `<strong>${event.title}</strong><br>
-                    <small>Start: ${formatDateDisplay(event.start)}</small><br>`;
-                if (event.end) {
-                    display += `<br><small>End: ${formatDateDisplay(event.end)}</small>`;
-                }
-                // Add the description under the date section, if it exists
-                if (event.description) {
-                    display += `<br><small class="text-muted">${event.description}</small>`;
-                }
-
-                li.innerHTML = display;
-                ul.appendChild(li);
-            });
-
-            if (upcoming.length === 0) {
-                ul.innerHTML = '<li class="list-group-item">No upcoming events!</li>';
-            }
-        });
 });
 
 let currentPage = 1;
@@ -379,12 +409,10 @@ function refreshUpcomingEvents() {
 // --- Global functions for Action Buttons ---
 
 function showEventDetail(eventId) {
-    // Fetch event data using the global URL variable
-    fetch(calendarEventsUrl)
-        .then(response => response.json())
-        .then(events => {
-            // Find event ensuring ID comparison matches (string to string)
-            const event = events.find(e => String(e.id) === String(eventId));
+    // Fetch just this event; the feed only covers the visible range
+    fetch(calendarEventUrl.replace('0', eventId))
+        .then(response => response.ok ? response.json() : null)
+        .then(event => {
 
             if (event) {
                 // Fill in the details modal with the event's data
@@ -405,12 +433,10 @@ function showEventDetail(eventId) {
 }
 
 function openEditModal(eventId) {
-    // Fetch the list of events to find the specific one
-    fetch(calendarEventsUrl)
-        .then(response => response.json())
-        .then(events => {
-            // Ensure ID comparison works (casting to string)
-            const event = events.find(e => String(e.id) === String(eventId));
+    // Fetch just this event; the feed only covers the visible range
+    fetch(calendarEventUrl.replace('0', eventId))
+        .then(response => response.ok ? response.json() : null)
+        .then(event => {
 
             if (event) {
                 document.getElementById('editEventId').value = event.id;
@@ -423,6 +449,7 @@ function openEditModal(eventId) {
                 document.getElementById('editEventStart').value = startVal;
                 document.getElementById('editEventEnd').value = endVal;
                 document.getElementById('editEventDesc').value = event.description || "";
+                setRepeatValue('editEventRepeat', event.rrule || '');
 
                 // If you are using flatpickr, we need to update its internal state
                 if (document.getElementById('editEventStart')._flatpickr) {
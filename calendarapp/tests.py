@@ -1,3 +1,196 @@
+import re
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from calendarapp.agenda import ics_feed
+from calendarapp.ics_import import import_ics
+from calendarapp.models import MAX_EVENT_LENGTH, AgendaFeed, Event
+from calendarapp.recurrence import MAX_OCCURRENCES, build_rule, occurrences, series_end
+from client.models import Client
+from core.models import Team, TeamMembership
+from lead.models import Lead
+from task.models import Task
+
+ICS = """BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:single@example.com
+DTSTART:20300105T090000Z
+DTEND:20300105T100000Z
+SUMMARY:Single
+END:VEVENT
+BEGIN:VEVENT
+UID:weekly@example.com
+DTSTART:20300107T090000Z
+DTEND:20300107T100000Z
+RRULE:FREQ=WEEKLY;UNTIL=20300201T090000Z
+SUMMARY:Weekly
+END:VEVENT
+BEGIN:VEVENT
+UID:all-day@example.com
+DTSTART;VALUE=DATE:20291229
+DTEND;VALUE=DATE:20291230
+RRULE:FREQ=DAILY;UNTIL=20300101
+SUMMARY:All day
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class IcsImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer', 'importer@example.com', 'x')
+
+    def test_import(self):
+        result = import_ics(ICS.splitlines(), self.user)
+        self.assertEqual(result, {'created': 3, 'skipped': 0, 'invalid': 0})
+
+    def test_all_day_until_includes_last_day(self):
+        import_ics(ICS.splitlines(), self.user)
+        event = Event.objects.get(uid='all-day@example.com')
+        self.assertTrue(event.rrule.endswith('Z'))
+        self.assertEqual(timezone.localdate(event.recurrence_end), date(2030, 1, 2))
+
+    def test_reimport_skips_known_events(self):
+        import_ics(ICS.splitlines(), self.user)
+        result = import_ics(ICS.splitlines(), self.user)
+        self.assertEqual(result, {'created': 0, 'skipped': 3, 'invalid': 0})
+
+
+class RecurrenceTests(TestCase):
+    start = timezone.make_aware(datetime(2030, 1, 1, 9))
+
+    def test_rejects_sub_daily_rules(self):
+        for rule in ('FREQ=SECONDLY', 'FREQ=MINUTELY;COUNT=5', 'RRULE:FREQ=HOURLY'):
+            with self.assertRaises(ValueError):
+                build_rule(rule, self.start)
+
+    def test_rejects_huge_count(self):
+        with self.assertRaises(ValueError):
+            build_rule(f'FREQ=DAILY;COUNT={MAX_OCCURRENCES + 1}', self.start)
+
+    def test_long_series_stops_at_the_limit(self):
+        rule = 'FREQ=DAILY;UNTIL=99991231T000000Z'
+        self.assertIsNone(series_end(rule, self.start, None))
+        event = {'id': 0, 'version': 1, 'start': self.start, 'end': None, 'rrule': rule, 'exdates': []}
+        late = self.start + timedelta(days=MAX_OCCURRENCES + 10)
+        self.assertEqual(occurrences(event, late, late + timedelta(days=7)), ())
+
+
+class AgendaSyncTests(TestCase):
+    def setUp(self):
+        self.owner, self.assignee, self.other = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('owner', 'assignee', 'other')
+        )
+        for user in (self.owner, self.assignee, self.other):
+            AgendaFeed.for_user(user)
+        self.since = timezone.now()
+
+    def create_task(self, **fields):
+        return Task.objects.create(
+            title='Task', created_by=self.owner, status='todo', due_date=timezone.localdate(), **fields,
+        )
+
+    def cancelled(self, user, uid):
+        feed = ics_feed(user, 'http://testserver', self.since)[0]
+        return re.search(rf'UID:{uid}@crmsys\r\nDTSTAMP:\S+\r\nDTSTART:\S+\r\nSTATUS:CANCELLED', feed) is not None
+
+    def test_reassigned_task_leaves_previous_assignee(self):
+        task = self.create_task(assigned_to=self.assignee)
+        task.assigned_to = self.other
+        task.save()
+        self.assertTrue(self.cancelled(self.assignee, f'task-{task.pk}'))
+        self.assertFalse(self.cancelled(self.other, f'task-{task.pk}'))
+
+    def test_lost_membership_removes_client_tasks(self):
+        client = Client.objects.create(
+            first_name='Team', last_name='Client', email='c@example.com', created_by=self.owner,
+        )
+        team = Team.objects.create(name='Team', client=client, created_by=self.owner)
+        membership = TeamMembership.objects.create(team=team, user=self.assignee)
+        task = self.create_task(client=client)
+        membership.delete()
+        self.assertTrue(self.cancelled(self.assignee, f'task-{task.pk}'))
+
+    def test_tombstones_are_per_user(self):
+        lead = Lead.objects.create(first_name='Lead', last_name='One', email='l@example.com', created_by=self.owner)
+        uid = f'lead-{lead.pk}'
+        lead.delete()
+        self.assertTrue(self.cancelled(self.owner, uid))
+        self.assertNotIn(uid, ics_feed(self.other, 'http://testserver', self.since)[0])
+
+    def test_timed_task_until_is_utc(self):
+        until = timezone.localdate() + timedelta(days=30)
+        self.create_task(due_time=time(9), recurrence='weekly', recurrence_until=until)
+        feed = ics_feed(self.owner, 'http://testserver')[0]
+        self.assertRegex(feed, r'RRULE:FREQ=WEEKLY;INTERVAL=1;UNTIL=\d{8}T\d{6}Z')
+
+
+class EventFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('events', 'events@example.com', 'x')
+        self.start = timezone.make_aware(datetime(2030, 1, 1, 9))
+
+    def feed(self, range_start, range_end):
+        return self.client.get(reverse('calendarapp:events_json'), {
+            'start': range_start.isoformat(), 'end': range_end.isoformat(),
+        })
+
+    def test_requires_login(self):
+        response = self.feed(self.start, self.start + timedelta(days=7))
+        self.assertEqual(response.status_code, 302)
+
+    def test_event_running_into_the_range(self):
+        Event.objects.create(title='Long', start=self.start, end=self.start + MAX_EVENT_LENGTH)
+        self.client.force_login(self.user)
+        window = self.start + MAX_EVENT_LENGTH - timedelta(days=1)
+        titles = [item['title'] for item in self.feed(window, window + timedelta(days=7)).json()]
+        self.assertEqual(titles, ['Long'])
+
+    def test_rejects_longer_events(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('calendarapp:add_event'), {
+            'title': 'Too long', 'start': self.start.isoformat(),
+            'end': (self.start + MAX_EVENT_LENGTH + timedelta(days=1)).isoformat(),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Event.objects.exists())
+
+
+class SkipOccurrenceTests(TestCase):
+    def setUp(self):
+        self.owner, self.other = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('owner', 'other')
+        )
+        self.start = timezone.make_aware(datetime(2030, 1, 1, 9))
+        self.event = Event.objects.create(
+            title='Standup', start=self.start, rrule='FREQ=DAILY;COUNT=5', created_by=self.owner,
+        )
+        self.url = reverse('calendarapp:skip_occurrence', args=[self.event.pk])
+
+    def skip(self, body):
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def test_requires_login(self):
+        self.assertEqual(self.skip({'occurrence': self.start.isoformat()}).status_code, 302)
+
+    def test_only_the_owner_can_skip(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.skip({'occurrence': self.start.isoformat()}).status_code, 404)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.skip({'occurrence': self.start.isoformat()}).status_code, 200)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.exdates, [self.start.isoformat()])
+
+    def test_rejects_invalid_json(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.skip('{').status_code, 400)
 
-# Create your tests here.
+    def test_requires_csrf_token(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.skip({'occurrence': self.start.isoformat()}).status_code, 403)
@@ -7,8 +7,15 @@ app_name = 'calendarapp'
 urlpatterns = [
     path('', views.calendar_view, name='calendar'),
     path('events/', views.events_json, name='events_json'),
+    path('events/<int:event_id>/', views.event_json, name='event_json'),
+    path('agenda/', views.agenda_json, name='agenda_json'),
+    path('agenda/<str:token>.ics', views.agenda_ics, name='agenda_ics'),
+    path('agenda/regenerate/', views.agenda_ics_regenerate, name='agenda_ics_regenerate'),
+    path('import/', views.import_ics_file, name='import_ics'),
     path('add_event/', views.add_event, name='add_event'),
     path('delete_event/<int:event_id>/', views.delete_event, name='delete_event'),
     path('update_event/<int:event_id>/', views.update_event, name='update_event'),
+    path('skip_occurrence/<int:event_id>/', views.skip_occurrence, name='skip_occurrence'),
+    path('freebusy/', views.freebusy_json, name='freebusy_json'),
     path('upcoming_events/', views.upcoming_events_json, name='upcoming_events_json'),
 ]
@@ -1,32 +1,174 @@
 import json
+from datetime import datetime, time, timedelta
 
-from django.shortcuts import render
-from django.http import JsonResponse
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404, redirect, render
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from django.utils import timezone
 
-from .models import Event
+from core.models import TeamMembership
+from .models import MAX_EVENT_LENGTH, AgendaFeed, Event
+from .agenda import (
+    EVENT_FEED_FIELDS, agenda_fingerprint, agenda_items, event_item, event_items, ics_feed,
+    parse_sync_token,
+)
+from .freebusy import busy_intervals, double_booked, event_conflicts, free_slots, merge_busy, team_busy
+from .ics_import import import_ics
+from .recurrence import build_rule
 
 
 # html page for event and calendar
+@login_required
 def calendar_view(request):
+    feed = AgendaFeed.for_user(request.user)
+    ics_url = request.build_absolute_uri(reverse('calendarapp:agenda_ics', args=[feed.token]))
+    return render(request, 'calendarapp/calendar.html', {'agenda_ics_url': ics_url})
 
-    return render(request, 'calendarapp/calendar.html')
+
+def _parse_bound(value):
+    """FullCalendar range bound: an ISO datetime (with or without offset) or a date."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
 # events
+@login_required
 def events_json(request):
-    events = []
-    for event in Event.objects.all():
-        events.append({
-            'id': event.id,
-            'title': event.title,
-            'start': event.start.isoformat(),
-            'end': event.end.isoformat() if event.end else None,
-            'description': event.description,
-        })
-    return JsonResponse(events, safe=False)
+    """
+    Events overlapping the visible range FullCalendar asks for (``start``/``end``).
+
+    Recurring series still running in the window are expanded on the fly. The
+    response carries an ETag so unchanged windows revalidate with a 304.
+    """
+    range_start = _parse_bound(request.GET.get('start', ''))
+    range_end = _parse_bound(request.GET.get('end', ''))
+    if range_start is None or range_end is None or range_end <= range_start:
+        return JsonResponse({'error': 'start and end must be valid ISO dates'}, status=400)
+
+    events = [item for _, item in event_items(range_start, range_end)]
+
+    response = JsonResponse(events, safe=False)
+    set_response_etag(response)
+    # Always revalidate: edits must show up on the next refetch.
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+# agenda: events plus the user's tasks and lead follow-ups
+@login_required
+def agenda_json(request):
+    range_start = _parse_bound(request.GET.get('start', ''))
+    range_end = _parse_bound(request.GET.get('end', ''))
+    if range_start is None or range_end is None or range_end <= range_start:
+        return JsonResponse({'error': 'start and end must be valid ISO dates'}, status=400)
+
+    response = JsonResponse(agenda_items(request.user, range_start, range_end), safe=False)
+    set_response_etag(response)
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+# iCalendar subscription; the secret token in the URL stands in for a login
+def agenda_ics(request, token):
+    feed = get_object_or_404(AgendaFeed.objects.select_related('user'), token=token)
+    sync_token = request.GET.get('sync_token')
+    since = parse_sync_token(sync_token) if sync_token else None
+
+    # The ETag comes from a few aggregates, so unchanged polls skip building the feed.
+    etag = f'"{agenda_fingerprint(feed.user, sync_token if since else None)}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    text, new_token = ics_feed(feed.user, request.build_absolute_uri('/')[:-1], since)
+    response = HttpResponse(text, content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['X-Sync-Token'] = new_token
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def agenda_ics_regenerate(request):
+    if request.method != "POST":
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    feed = AgendaFeed.for_user(request.user)
+    feed.regenerate()
+    return redirect('calendarapp:calendar')
+
+
+# import events from an uploaded .ics file
+@login_required
+def import_ics_file(request):
+    if request.method != "POST":
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    upload = request.FILES.get('ics_file')
+    if upload is None:
+        messages.error(request, 'Choose an .ics file to import.')
+        return redirect('calendarapp:calendar')
+    # The upload is read line by line; large files stay in a temporary file.
+    result = import_ics(upload, request.user)
+    messages.success(
+        request,
+        f"Imported {result['created']} events ({result['skipped']} skipped, {result['invalid']} invalid).",
+    )
+    return redirect('calendarapp:calendar')
+
+
+# single event, for the detail and edit modals
+@login_required
+def event_json(request, event_id):
+    event = Event.objects.filter(id=event_id).values(*EVENT_FEED_FIELDS).first()
+    if event is None:
+        return JsonResponse({'success': False, 'error': 'Event not found'}, status=404)
+    data = event_item(event)
+    data.update({'rrule': event['rrule'], 'exdates': event['exdates']})
+    return JsonResponse(data)
+
+
+def _apply_event_data(event, data):
+    """Copy the modal's JSON onto ``event``; returns an error message or ``None``."""
+    start = _parse_bound(data.get('start') or '')
+    end = _parse_bound(data['end']) if data.get('end') else None
+    if start is None:
+        return 'Invalid start date'
+    if end is not None and end - start > MAX_EVENT_LENGTH:
+        return f'An event can last at most {MAX_EVENT_LENGTH.days} days'
+    event.title = data.get('title')
+    event.start = start
+    event.end = end
+    event.description = data.get('description')
+    if 'rrule' in data:
+        event.rrule = (data.get('rrule') or '').strip()
+    if 'exdates' in data:
+        event.exdates = list(data.get('exdates') or [])
+    if event.rrule:
+        try:
+            build_rule(event.rrule, event.start)
+        except ValueError:
+            return 'Invalid recurrence rule'
+    return None
+
+
+def _conflicts_for(request, event):
+    """What the saved ``event`` overlaps on its owner's (or the editor's) calendar."""
+    owner_id = event.created_by_id or (request.user.id if request.user.is_authenticated else None)
+    if owner_id is None:
+        return []
+    return event_conflicts(event, owner_id)
 
 
 # add event
@@ -34,13 +176,14 @@ def events_json(request):
 def add_event(request):
     if request.method == "POST":
         data = json.loads(request.body)
-        Event.objects.create(
-            title=data.get('title'),
-            start=data.get('start'),
-            end=data.get('end') or None,
-            description=data.get('description')
-        )
-        return JsonResponse({'success': True})
+        event = Event()
+        error = _apply_event_data(event, data)
+        if error:
+            return JsonResponse({'success': False, 'error': error}, status=400)
+        if request.user.is_authenticated:
+            event.created_by = request.user
+        event.save()
+        return JsonResponse({'success': True, 'conflicts': _conflicts_for(request, event)})
     return JsonResponse({'success': False})
 
 
@@ -64,17 +207,82 @@ def update_event(request, event_id):
         try:
             data = json.loads(request.body)
             event = Event.objects.get(id=event_id)
-            event.title = data.get('title')
-            event.start = data.get('start')
-            event.end = data.get('end') or None
-            event.description = data.get('description')
+            error = _apply_event_data(event, data)
+            if error:
+                return JsonResponse({'success': False, 'error': error}, status=400)
             event.save()
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'conflicts': _conflicts_for(request, event)})
         except Event.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Event not found'})
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
 
+# skip one occurrence of a recurring event; only its owner may
+@login_required
+def skip_occurrence(request, event_id):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        occurrence = _parse_bound(data.get('occurrence') or '') if isinstance(data, dict) else None
+        if occurrence is None:
+            return JsonResponse({'success': False, 'error': 'Invalid occurrence'}, status=400)
+        try:
+            event = Event.objects.get(id=event_id, created_by=request.user)
+        except Event.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Event not found'}, status=404)
+        if not event.rrule:
+            return JsonResponse({'success': False, 'error': 'Event does not repeat'}, status=400)
+        event.exdates = event.exdates + [occurrence.isoformat()]
+        event.save()
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
+
+# free/busy of the user and their teammates, e.g. ?users=1,2&start=...&end=...
+@login_required
+def freebusy_json(request):
+    range_start = _parse_bound(request.GET.get('start', ''))
+    range_end = _parse_bound(request.GET.get('end', ''))
+    if range_start is None or range_end is None or range_end <= range_start:
+        return JsonResponse({'error': 'start and end must be valid ISO dates'}, status=400)
+    try:
+        user_ids = {int(value) for value in request.GET.get('users', '').split(',') if value.strip()}
+    except ValueError:
+        return JsonResponse({'error': 'users must be a comma separated list of ids'}, status=400)
+    user_ids = user_ids or {request.user.id}
+
+    # Only the user's own calendar and those of people on one of their active teams.
+    team_ids = TeamMembership.objects.filter(
+        user=request.user, is_active=True, team__is_active=True,
+    ).values('team_id')
+    allowed = set(TeamMembership.objects.filter(
+        team_id__in=team_ids, is_active=True, user_id__in=user_ids,
+    ).values_list('user_id', flat=True))
+    allowed.add(request.user.id)
+    if not user_ids <= allowed:
+        return JsonResponse({'error': 'Not allowed to see some of these calendars'}, status=403)
+
+    busy = busy_intervals(sorted(user_ids), range_start, range_end)
+    try:
+        min_minutes = int(request.GET.get('min_minutes', 0))
+    except ValueError:
+        min_minutes = 0
+    free = free_slots(team_busy(busy), range_start, range_end, timedelta(minutes=max(min_minutes, 0)))
+
+    return JsonResponse({
+        'users': {
+            str(user_id): {
+                'busy': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in merge_busy(intervals)],
+                'conflicts': [[a.as_dict(), b.as_dict()] for a, b in double_booked(intervals)],
+            }
+            for user_id, intervals in busy.items()
+        },
+        'free': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in free],
+    })
+
+
 # paginator for upcoming events
 def upcoming_events_json(request):
     page_number = int(request.GET.get('page', 1))
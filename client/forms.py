@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Client, Comment, ClientFile, Purchase
+from core.widgets import AutocompleteSelect
 from product.models import Product
 
 
@@ -27,7 +28,7 @@ class PurchaseForm(forms.ModelForm):
         model = Purchase
         fields = ['product', 'quantity', 'notes']  # Remove purchase_price
         widgets = {
-            'product': forms.Select(attrs={
+            'product': AutocompleteSelect('core:autocomplete_products', attrs={
                 'class': 'form-control',
                 'id': 'id_product',
             }),
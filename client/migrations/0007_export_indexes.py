@@ -0,0 +1,21 @@
+# Generated by Django 4.2.24 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0006_purchase_notes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['created_by', 'modified_at'], name='client_clie_created_5bdfb8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['created_by', 'created_at'], name='client_purc_created_c1a99a_idx'),
+        ),
+    ]
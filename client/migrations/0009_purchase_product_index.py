@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client', '0008_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['product', '-created_at', '-id'], name='client_purc_product_da57d0_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_price_history'),
+        ('client', '0009_purchase_product_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        # Existing purchases get the price in effect when they were made, as
+        # recorded in the price history (the current price where there is none).
+        migrations.RunSQL(
+            """
+            UPDATE client_purchase AS purchase
+            SET unit_price = COALESCE(
+                (SELECT history.net_price FROM product_productprice AS history
+                 WHERE history.product_id = purchase.product_id AND history.valid_from <= purchase.created_at
+                 ORDER BY history.valid_from DESC LIMIT 1),
+                product.net_price
+            )
+            FROM product_product AS product
+            WHERE product.id = purchase.product_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['created_at'], include=('product', 'quantity', 'unit_price'), name='client_purchase_revenue_idx'),
+        ),
+    ]
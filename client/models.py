@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 from lead.models import Lead
 from product.models import Product
@@ -35,6 +36,9 @@ class Client(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'modified_at']),
+        ]
 
     def __str__(self):
         return f'{self.last_name} {self.first_name}'
@@ -63,6 +67,8 @@ class Purchase(models.Model):
     client = models.ForeignKey(Client, related_name='purchases', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name='purchases', on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    # Product net price at the time of sale; revenue never needs the product row.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, related_name='client_purchases', on_delete=models.CASCADE)
@@ -72,22 +78,32 @@ class Purchase(models.Model):
 
     @property
     def purchase_price(self):
-        """Calculate purchase price from product's net_price"""
-        return self.product.net_price
+        """Unit price captured when the purchase was made"""
+        return self.unit_price
 
     @property
     def total_price(self):
         """Calculate total price"""
-        return self.quantity * self.product.net_price
+        return self.quantity * self.unit_price
 
     def save(self, *args, **kwargs):
         # Only track sold items (no quantity field in Product anymore)
         if not self.pk:  # Only on creation
-            # Just increment sold_quantity
-            self.product.sold_quantity += self.quantity
-            self.product.save()
+            if self.unit_price is None:
+                self.unit_price = self._meta.get_field('unit_price').to_python(self.product.net_price)
+            # Increment sold_quantity in SQL; product.save() would also bump
+            # the product catalog version on every sale.
+            Product.objects.filter(pk=self.product_id).update(sold_quantity=F('sold_quantity') + self.quantity)
 
         super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'created_at']),
+            # Product page: a product's purchases, newest first.
+            models.Index(fields=['product', '-created_at', '-id']),
+            # Revenue over time read from the index alone, without product_product.
+            models.Index(fields=['created_at'], include=['product', 'quantity', 'unit_price'],
+                         name='client_purchase_revenue_idx'),
+        ]
@@ -17,5 +17,6 @@ urlpatterns = [
     path('<int:client_id>/comment/<int:comment_id>/delete/', views.delete_client_comment, name='delete_comment'),
     path('<int:pk>/add-file/', AddFileView.as_view(), name='add_client_file'),
     path('export/', views.clients_export, name='export'),
+    path('purchases/export/', views.purchases_export, name='export_purchases'),
     path('<int:client_id>/file/<int:file_id>/delete/', views.delete_client_file, name='delete_client_file'),
 ]
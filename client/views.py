@@ -1,11 +1,9 @@
-import csv
-
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Q
 from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponseForbidden
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import View
@@ -13,6 +11,11 @@ from django.views.generic import ListView, DetailView, CreateView, DeleteView, U
 
 from client.forms import AddCommentForm, AddFileForm, PurchaseForm
 from client.models import Client, Comment, ClientFile, Purchase
+from core.access import granted_ids, visible_to
+from core.exports import ExportColumn, export_response
+from core.thumbnails import schedule_thumbnail
+from product.catalog import catalog
+from product.recommendations import upsell_suggestions
 from task.models import Task
 
 
@@ -24,7 +27,7 @@ class ClientListView(ListView):
 
     def get_queryset(self):
         queryset = super(ClientListView, self).get_queryset()
-        queryset = queryset.filter(created_by=self.request.user)
+        queryset = visible_to(self.request.user, queryset)
 
         query = self.request.GET.get('q')
         if query:
@@ -57,14 +60,10 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
         task_page_number = self.request.GET.get('task_page')
         tasks_page = task_paginator.get_page(task_page_number)
 
-        # Add purchases pagination with total calculation
+        # Add purchases pagination (totals come from the stored unit price)
         purchase_list = Purchase.objects.filter(client_id=self.kwargs.get('pk')).select_related('product').order_by(
             '-created_at')
 
-        # Add total to each purchase - use property instead of field
-        for purchase in purchase_list:
-            purchase.total = purchase.total_price  # Use the property
-
         purchase_paginator = Paginator(purchase_list, 10)
         purchase_page_number = self.request.GET.get('purchase_page')
         purchases_page = purchase_paginator.get_page(purchase_page_number)
@@ -73,6 +72,13 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
         context['comments'] = comments_page
         context['tasks'] = tasks_page
         context['purchases'] = purchases_page
+        context['is_owner'] = self.object.created_by_id == self.request.user.id
+        # Products bought by clients who share purchases with this one
+        products = catalog.by_id()
+        context['upsell_suggestions'] = [
+            (product, score) for product_id, score in upsell_suggestions(self.object.pk)
+            if (product := products.get(product_id))
+        ]
 
         return context
 
@@ -99,7 +105,7 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
 
     def get_queryset(self):
         queryset = super(ClientDetailView, self).get_queryset()
-        return queryset.filter(created_by=self.request.user, pk=self.kwargs.get('pk'))
+        return visible_to(self.request.user, queryset).filter(pk=self.kwargs.get('pk'))
 
 
 # Comment view
@@ -133,6 +139,7 @@ class AddFileView(LoginRequiredMixin, View):
             file.client_id = pk
             file.created_by = request.user
             file.save()
+            schedule_thumbnail(file.file.name)
 
         return redirect('client:detail', pk=pk)
 
@@ -187,24 +194,45 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
         return queryset.filter(created_by=self.request.user, pk=self.kwargs.get('pk'))
 
 
-# Export leads in csv
-@login_required
-def clients_export(request):
-    clients =Client.objects.filter(created_by=request.user)
+# Export clients (csv, gzipped ndjson or parquet)
+CLIENT_EXPORT_COLUMNS = [
+    ExportColumn('last_name', 'Last name'),
+    ExportColumn('first_name', 'First name'),
+    ExportColumn('phone', 'Phone'),
+    ExportColumn('email', 'Email'),
+    ExportColumn('description', 'Description'),
+    ExportColumn('created_at', 'Created at'),
+    ExportColumn('created_by', 'Created by', 'created_by__username'),
+    ExportColumn('company', 'Company'),
+    ExportColumn('status', 'Status'),
+    ExportColumn('modified_at', 'Modified at'),
+    ExportColumn('id', 'ID'),
+]
+
+PURCHASE_EXPORT_COLUMNS = [
+    ExportColumn('id', 'ID'),
+    ExportColumn('client_id', 'Client ID', 'client_id'),
+    ExportColumn('product_id', 'Product ID', 'product_id'),
+    ExportColumn('product', 'Product', 'product__name'),
+    ExportColumn('quantity', 'Quantity'),
+    ExportColumn('unit_price', 'Unit price'),
+    ExportColumn('notes', 'Notes'),
+    ExportColumn('created_at', 'Created at'),
+    ExportColumn('created_by', 'Created by', 'created_by__username'),
+]
 
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="clients.csv"'},
-    )
 
-    writer = csv.writer(response)
-    writer.writerow(['Last name', 'First name', 'Phone', 'Email', 'Description', 'Created at', 'Created by'])
+@login_required
+def clients_export(request):
+    clients = visible_to(request.user, Client.objects.all())
+    return export_response(request, clients, CLIENT_EXPORT_COLUMNS, 'clients', 'modified_at')
 
-    for client in clients:
-        writer.writerow([client.last_name, client.first_name, client.phone, client.email, client.description,
-                         client.created_at, client.created_by])
 
-    return response
+@login_required
+def purchases_export(request):
+    # Purchases of every client the user can see, as on the client pages.
+    purchases = Purchase.objects.filter(client_id__in=granted_ids(request.user, Client))
+    return export_response(request, purchases, PURCHASE_EXPORT_COLUMNS, 'purchases', 'created_at')
 
 
 # Bulk delete clients
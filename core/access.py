@@ -0,0 +1,198 @@
+"""
+Who can see what, precomputed.
+
+Visibility follows team membership (active memberships of active teams).
+A user sees:
+
+- teams they created or are a member of;
+- projects they created and projects assigned to their teams;
+- clients and leads they created, the clients of their teams, and the
+  clients and leads of the projects assigned to their teams;
+- conversations they started, those of their teams, and the project
+  conversations (without a team) of projects assigned to their teams.
+
+Resolving that on every query means joining memberships, teams,
+assignments and projects. ``AccessGrant`` stores the result instead, one row
+per user and object, and ``visible_to`` scopes a queryset with one semi-join
+on its ``(user, content_type, object_id)`` index.
+
+Grants are recomputed per user: ``sync_access`` compares what the users
+should see with the rows they have and writes the difference. The signals in
+``core.signals`` call it for the users a membership, assignment, team or
+project change affects, and add or drop single rows when clients, leads and
+conversations are created, changed or deleted. ``manage.py rebuild_access``
+recomputes everyone, for a fresh database or after bulk changes that bypass
+signals. Grants a sync removes are announced with ``grants_revoked``, so
+data derived from them (agenda feeds) can follow.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.dispatch import Signal
+
+from client.models import Client
+from lead.models import Lead
+from .models import AccessGrant, Conversation, Project, ProjectTeamAssignment, Team, TeamMembership
+
+ACCESS_MODELS = (Team, Project, Client, Lead, Conversation)
+ACCESS_BATCH_SIZE = 1000
+
+# Sent with ``grants=[(user_id, content_type_id, object_id)]`` after a sync removed them.
+grants_revoked = Signal()
+
+
+def granted_ids(user, model):
+    """Subquery of the ids of the ``model`` objects ``user`` (a user or id) can see."""
+    return AccessGrant.objects.filter(
+        user=user, content_type=ContentType.objects.get_for_model(model),
+    ).values('object_id')
+
+
+def visible_to(user, queryset):
+    """``queryset`` limited to the objects ``user`` can see."""
+    return queryset.filter(pk__in=granted_ids(user, queryset.model))
+
+
+def holders(obj):
+    """Ids of the users who can see ``obj``."""
+    return set(AccessGrant.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk,
+    ).values_list('user_id', flat=True))
+
+
+def compute_grants(user_ids=None):
+    """``{(user_id, content_type_id, object_id)}`` of ``user_ids`` (of every user when ``None``)."""
+    def of_users(queryset, field):
+        return queryset if user_ids is None else queryset.filter(**{f'{field}__in': user_ids})
+
+    memberships = list(
+        of_users(TeamMembership.objects.filter(is_active=True), 'user_id')
+        .values_list('user_id', 'team_id', 'team__is_active')
+    )
+    active = [(user_id, team_id) for user_id, team_id, team_active in memberships if team_active]
+    team_ids = {team_id for _, team_id in active}
+
+    team_projects = defaultdict(list)
+    for team_id, project_id in ProjectTeamAssignment.objects.filter(
+        team_id__in=team_ids, is_active=True,
+    ).values_list('team_id', 'project_id'):
+        team_projects[team_id].append(project_id)
+    assigned = {(user_id, project_id) for user_id, team_id in active for project_id in team_projects[team_id]}
+    project_ids = {project_id for _, project_id in assigned}
+
+    team_clients = dict(Team.objects.filter(id__in=team_ids).values_list('id', 'client_id'))
+    project_links = {
+        pk: (client_id, lead_id)
+        for pk, client_id, lead_id in Project.objects.filter(id__in=project_ids).values_list('id', 'client_id', 'lead_id')
+    }
+    team_conversations = defaultdict(list)
+    for team_id, pk in Conversation.objects.filter(team_id__in=team_ids).values_list('team_id', 'id'):
+        team_conversations[team_id].append(pk)
+    project_conversations = defaultdict(list)
+    for project_id, pk in Conversation.objects.filter(
+        team__isnull=True, project_id__in=project_ids,
+    ).values_list('project_id', 'id'):
+        project_conversations[project_id].append(pk)
+
+    content_types = ContentType.objects.get_for_models(*ACCESS_MODELS)
+    grants = set()
+
+    def add(model, pairs):
+        content_type_id = content_types[model].pk
+        grants.update((user_id, content_type_id, pk) for user_id, pk in pairs if pk is not None)
+
+    for model in ACCESS_MODELS:
+        add(model, of_users(model.objects, 'created_by_id').values_list('created_by_id', 'id').iterator())
+    add(Team, ((user_id, team_id) for user_id, team_id, _ in memberships))
+    add(Project, assigned)
+    add(Client, ((user_id, team_clients[team_id]) for user_id, team_id in active))
+    add(Client, ((user_id, project_links[project_id][0]) for user_id, project_id in assigned))
+    add(Lead, ((user_id, project_links[project_id][1]) for user_id, project_id in assigned))
+    add(Conversation, (
+        (user_id, pk) for user_id, team_id in active for pk in team_conversations[team_id]
+    ))
+    add(Conversation, (
+        (user_id, pk) for user_id, project_id in assigned for pk in project_conversations[project_id]
+    ))
+    return grants
+
+
+def _apply(grants, existing):
+    """Make the ``existing`` rows match ``grants``; returns ``(added, removed)``."""
+    current = {
+        (user_id, content_type_id, object_id): pk
+        for pk, user_id, content_type_id, object_id in existing.values_list(
+            'id', 'user_id', 'content_type_id', 'object_id',
+        ).iterator()
+    }
+    stale = {key: pk for key, pk in current.items() if key not in grants}
+    stale_ids = list(stale.values())
+    for start in range(0, len(stale_ids), ACCESS_BATCH_SIZE):
+        AccessGrant.objects.filter(id__in=stale_ids[start:start + ACCESS_BATCH_SIZE]).delete()
+    if stale:
+        grants_revoked.send(sender=AccessGrant, grants=list(stale))
+    missing = [
+        AccessGrant(user_id=user_id, content_type_id=content_type_id, object_id=object_id)
+        for user_id, content_type_id, object_id in grants - current.keys()
+    ]
+    AccessGrant.objects.bulk_create(missing, batch_size=ACCESS_BATCH_SIZE, ignore_conflicts=True)
+    return len(missing), len(stale)
+
+
+def sync_access(user_ids):
+    """Recompute the grants of ``user_ids``."""
+    user_ids = set(user_ids)
+    if user_ids:
+        with transaction.atomic():
+            _apply(compute_grants(user_ids), AccessGrant.objects.filter(user_id__in=user_ids))
+
+
+def rebuild_access():
+    """Recompute every grant; returns ``(added, removed)``."""
+    with transaction.atomic():
+        return _apply(compute_grants(), AccessGrant.objects.all())
+
+
+def grant_creator(obj):
+    AccessGrant.objects.bulk_create([
+        AccessGrant(user_id=obj.created_by_id, content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk),
+    ], ignore_conflicts=True)
+
+
+def revoke_object(obj):
+    """Drop the grants of a deleted ``obj``; returns the ids of the users who had one."""
+    user_ids = holders(obj)
+    AccessGrant.objects.filter(content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk).delete()
+    return user_ids
+
+
+def conversation_users(conversation):
+    """Ids of the users who should see ``conversation``, from memberships."""
+    if conversation.team_id:
+        team_ids = Team.objects.filter(pk=conversation.team_id, is_active=True).values('id')
+    else:
+        team_ids = ProjectTeamAssignment.objects.filter(
+            project_id=conversation.project_id, is_active=True, team__is_active=True,
+        ).values('team_id')
+    user_ids = set(
+        TeamMembership.objects.filter(team_id__in=team_ids, is_active=True).values_list('user_id', flat=True)
+    )
+    user_ids.add(conversation.created_by_id)
+    return user_ids
+
+
+def sync_conversation_access(conversation):
+    """Grant ``conversation`` to exactly its participants; returns the ids of the users who lost it."""
+    content_type = ContentType.objects.get_for_model(conversation)
+    with transaction.atomic():
+        current = holders(conversation)
+        user_ids = conversation_users(conversation)
+        AccessGrant.objects.filter(
+            content_type=content_type, object_id=conversation.pk, user_id__in=current - user_ids,
+        ).delete()
+        AccessGrant.objects.bulk_create([
+            AccessGrant(user_id=user_id, content_type=content_type, object_id=conversation.pk)
+            for user_id in user_ids - current
+        ], ignore_conflicts=True)
+    return current - user_ids
@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q
 
 # Register your models here.
 from .models import (
@@ -8,7 +10,11 @@ from .models import (
     ProjectTeamAssignment,
     Conversation,
     Message,
+    MessageRetentionPolicy,
+    ArchivedMessageChunk,
+    Notification,
 )
+from .message_search import message_search_query
 
 
 # ... existing code ...
@@ -52,4 +58,39 @@ class ConversationAdmin(admin.ModelAdmin):
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ("conversation", "sender", "created_at")
-    search_fields = ("sender__username", "body")
\ No newline at end of file
+    search_fields = ("sender__username", "body")
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text search on the indexed search_document (or an exact
+        # username) instead of icontains over every message body.
+        if not search_term:
+            return queryset, False
+        senders = User.objects.filter(username=search_term).values("id")
+        return queryset.filter(Q(search_document=message_search_query(search_term)) | Q(sender_id__in=senders)), False
+
+
+@admin.register(MessageRetentionPolicy)
+class MessageRetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ("team", "project", "keep_days", "created_at")
+    search_fields = ("team__name", "project__name")
+
+
+@admin.register(ArchivedMessageChunk)
+class ArchivedMessageChunkAdmin(admin.ModelAdmin):
+    list_display = ("conversation", "period_start", "message_count", "first_created_at", "last_created_at", "archived_at")
+    list_filter = ("period_start",)
+    fields = ("conversation", "period_start", "message_count", "first_created_at", "last_created_at", "archived_at")
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("user", "title", "is_read", "created_at")
+    list_filter = ("is_read",)
+    search_fields = ("user__username", "title")
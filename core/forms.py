@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.models import User
 
 from .models import Team, TeamMembership, ProjectTeamAssignment
-from .models import Project
+from .models import Conversation, Project
+from .widgets import AutocompleteSelect
 
 
 class TeamForm(forms.ModelForm):
@@ -12,7 +13,10 @@ class TeamForm(forms.ModelForm):
 
 
 class TeamMemberAddForm(forms.Form):
-    user = forms.ModelChoiceField(queryset=User.objects.all())
+    user = forms.ModelChoiceField(
+        queryset=User.objects.filter(is_active=True),
+        widget=AutocompleteSelect('core:autocomplete_users'),
+    )
     role = forms.ChoiceField(choices=TeamMembership.ROLE_CHOICES)
 
 
@@ -37,4 +41,31 @@ class ProjectForm(forms.ModelForm):
             "is_active",
             "client",
             "lead",
-        ]
\ No newline at end of file
+        ]
+        widgets = {
+            "client": AutocompleteSelect("core:autocomplete_clients"),
+            "lead": AutocompleteSelect("core:autocomplete_leads"),
+        }
+
+class ConversationForm(forms.ModelForm):
+    """Team and project choices are limited to the user's (see ``for_user``)."""
+
+    class Meta:
+        model = Conversation
+        fields = ["title", "team", "project"]
+
+    @classmethod
+    def for_user(cls, user, *args, **kwargs):
+        form = cls(*args, **kwargs)
+        team_ids = TeamMembership.objects.filter(user=user, is_active=True).values("team_id")
+        form.fields["team"].queryset = Team.objects.filter(id__in=team_ids, is_active=True).order_by("name")
+        form.fields["project"].queryset = Project.objects.filter(
+            team_assignments__team_id__in=team_ids, team_assignments__is_active=True, is_active=True,
+        ).distinct().order_by("name")
+        return form
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("team") and not cleaned.get("project"):
+            raise forms.ValidationError("Choose a team, a project or both.")
+        return cleaned
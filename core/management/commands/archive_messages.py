@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import ARCHIVE_BATCH_SIZE, archive_expired_messages
+
+
+class Command(BaseCommand):
+    help = 'Move messages past their retention period into the compressed archive (for cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+            help='Messages archived and deleted per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_expired_messages(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} messages.'))
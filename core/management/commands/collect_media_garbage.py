@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from core.thumbnails import THUMBNAIL_DIR, source_digests, variant_digest
+
+
+def _fingerprint(name):
+    """64-bit digest of a storage name; keeps the mark set small in memory."""
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def referenced_names(chunk_size=5000):
+    """Every file name stored in a FileField/ImageField."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if not isinstance(field, models.FileField):
+                continue
+            yield from (
+                model._base_manager.exclude(**{field.attname: ''})
+                .exclude(**{f'{field.attname}__isnull': True})
+                .values_list(field.attname, flat=True)
+                .iterator(chunk_size=chunk_size)
+            )
+
+
+def referenced_fingerprints(chunk_size=5000):
+    """Mark phase: fingerprint every referenced file name."""
+    return {_fingerprint(name) for name in referenced_names(chunk_size)}
+
+
+def live_thumbnail_fingerprints(chunk_size=5000):
+    """
+    Mark phase for thumbnails, which are named by the digest of their
+    source's content: fingerprint the digests of the referenced files.
+    """
+    return {_fingerprint(digest) for digest in source_digests(referenced_names(chunk_size))}
+
+
+def walk_media(root):
+    """Sweep phase: yield ``(entry, relative name)`` for every file under ``root``."""
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        with os.scandir(os.path.join(root, relative_dir)) as entries:
+            for entry in entries:
+                relative = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(relative)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry, relative
+
+
+class Command(BaseCommand):
+    help = (
+        'Find files in MEDIA_ROOT that no FileField references any more, and thumbnails '
+        'of such files, and delete or quarantine them. Without --delete or --quarantine '
+        'this is a dry run.'
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--delete', action='store_true', help='Delete unreferenced files.')
+        action.add_argument(
+            '--quarantine', action='store_true',
+            help='Move unreferenced files to MEDIA_QUARANTINE_ROOT instead of deleting them.',
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=1.0,
+            help='Ignore files modified less than this many hours ago (uploads in flight).',
+        )
+
+    def handle(self, *args, **options):
+        root = os.fspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            raise CommandError(f'MEDIA_ROOT {root} does not exist.')
+
+        quarantine_root = getattr(settings, 'MEDIA_QUARANTINE_ROOT', None)
+        if options['quarantine']:
+            if not quarantine_root:
+                raise CommandError('Set MEDIA_QUARANTINE_ROOT to quarantine files.')
+            quarantine_root, media_root = os.path.realpath(quarantine_root), os.path.realpath(root)
+            # Anything under MEDIA_ROOT is served publicly.
+            if os.path.commonpath([quarantine_root, media_root]) == media_root:
+                raise CommandError('MEDIA_QUARANTINE_ROOT must be outside MEDIA_ROOT.')
+
+        marked = referenced_fingerprints()
+        self.stdout.write(f'Marked {len(marked)} referenced files.')
+        # Thumbnails are keyed by content hash, not by name; one stays while
+        # any referenced file has that content.
+        thumbnails = live_thumbnail_fingerprints()
+        self.stdout.write(f'Marked {len(thumbnails)} thumbnail sources.')
+
+        cutoff = time.time() - options['min_age'] * 3600
+
+        scanned = orphaned = reclaimed = 0
+        for entry, relative in walk_media(root):
+            scanned += 1
+            if relative.startswith(f'{THUMBNAIL_DIR}/'):
+                if _fingerprint(variant_digest(relative)) in thumbnails:
+                    continue
+            elif _fingerprint(relative) in marked:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                continue
+
+            orphaned += 1
+            reclaimed += stat.st_size
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {relative} ({stat.st_size} bytes)')
+
+            if options['delete']:
+                os.remove(entry.path)
+            elif options['quarantine']:
+                target = os.path.join(quarantine_root, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(entry.path, target)
+
+        if options['delete']:
+            verb = 'Deleted'
+        elif options['quarantine']:
+            verb = 'Quarantined'
+        else:
+            verb = 'Would remove'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files. {verb} {orphaned} unreferenced files '
+            f'({reclaimed} bytes).'
+        ))
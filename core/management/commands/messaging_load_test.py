@@ -0,0 +1,152 @@
+import asyncio
+import resource
+import statistics
+import time
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.messaging import get_broker, get_writer
+from core.models import Conversation, Message
+
+
+class StreamClient:
+    """One in-process SSE connection to the ASGI application."""
+
+    def __init__(self, application, scope):
+        self.application = application
+        self.scope = scope
+        self.status = None
+        self.connected = asyncio.Event()
+        self.received = {}
+        self._disconnect = asyncio.Event()
+        self._request_sent = False
+        self._buffer = ''
+
+    async def receive(self):
+        if not self._request_sent:
+            self._request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self._disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, event):
+        if event['type'] == 'http.response.start':
+            self.status = event['status']
+            return
+        self._buffer += event.get('body', b'').decode()
+        self.connected.set()
+        while '\n\n' in self._buffer:
+            block, self._buffer = self._buffer.split('\n\n', 1)
+            for line in block.splitlines():
+                if line.startswith('id: '):
+                    self.received[line[4:].rpartition('|')[2]] = time.monotonic()
+
+    async def run(self):
+        await self.application(self.scope, self.receive, self.send)
+
+    def close(self):
+        self._disconnect.set()
+
+
+class Command(BaseCommand):
+    help = (
+        'Open many message streams to one conversation inside this process (through the ASGI '
+        'application), post messages and report how fast they fan out. The posted messages are '
+        'deleted afterwards, but stay in the other participants\' unread counts, so use a scratch '
+        'conversation.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('conversation', type=int, help='Conversation to stream.')
+        parser.add_argument('--connections', type=int, default=1000, help='Concurrent streams.')
+        parser.add_argument('--messages', type=int, default=20, help='Messages to post.')
+        parser.add_argument('--interval', type=float, default=0.05, help='Seconds between posts.')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for each phase.')
+
+    def handle(self, *args, **options):
+        try:
+            conversation = Conversation.objects.select_related('created_by').get(pk=options['conversation'])
+        except Conversation.DoesNotExist:
+            raise CommandError('Conversation not found.')
+        asyncio.run(self.load_test(
+            conversation, options['connections'], options['messages'], options['interval'], options['timeout'],
+        ))
+
+    def session_cookie(self, user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'.encode()
+
+    async def load_test(self, conversation, connections, messages, interval, timeout):
+        application = get_asgi_application()
+        user = conversation.created_by
+        cookie = await sync_to_async(self.session_cookie)(user)
+        path = reverse('core:conversation_stream', args=[conversation.pk])
+        clients = [
+            StreamClient(application, {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': b'', 'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'cookie', cookie), (b'accept', b'text/event-stream')],
+                'client': ('127.0.0.1', 10000 + index), 'server': ('localhost', 80),
+            })
+            for index in range(connections)
+        ]
+
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(client.run()) for client in clients]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(client.connected.wait() for client in clients)), timeout)
+        except asyncio.TimeoutError:
+            raise CommandError(f'Only {sum(c.connected.is_set() for c in clients)} streams connected in time.')
+        failed = [client.status for client in clients if client.status != 200]
+        if failed:
+            raise CommandError(f'{len(failed)} streams were refused (status {failed[0]}).')
+        self.stdout.write(
+            f'{connections} streams open in {time.monotonic() - started:.2f}s '
+            f'({get_broker().subscriber_count(conversation.pk)} subscribed).'
+        )
+
+        sent = {}
+        writer = get_writer()
+        for index in range(messages):
+            message = Message(conversation=conversation, sender=user, body=f'Load test message {index}')
+            posted = time.monotonic()
+            await asyncio.wrap_future(writer.submit(message))
+            sent[str(message.pk)] = posted
+            await asyncio.sleep(interval)
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(len(client.received) < len(sent) for client in clients):
+            await asyncio.sleep(0.05)
+
+        latencies = sorted(
+            (client.received[key] - posted) * 1000
+            for client in clients for key, posted in sent.items() if key in client.received
+        )
+        for client in clients:
+            client.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await sync_to_async(Message.objects.filter(pk__in=[int(key) for key in sent]).delete)()
+
+        expected = connections * len(sent)
+        self.stdout.write(f'Delivered {len(latencies)} of {expected} messages.')
+        if latencies:
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            self.stdout.write(
+                f'Post-to-delivery latency: p50 {quantiles[49]:.1f}ms, p95 {quantiles[94]:.1f}ms, '
+                f'p99 {quantiles[98]:.1f}ms, max {latencies[-1]:.1f}ms.'
+            )
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(f'Peak memory {peak:.0f} MB.'))
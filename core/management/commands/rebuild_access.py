@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.access import rebuild_access
+
+
+class Command(BaseCommand):
+    help = 'Recompute every access grant from teams, memberships and project assignments.'
+
+    def handle(self, *args, **options):
+        added, removed = rebuild_access()
+        self.stdout.write(self.style.SUCCESS(f'Added {added} and removed {removed} access grants.'))
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the due-date reminder scheduler for tasks and leads (long-running).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=int, default=30,
+            help='Seconds between polls for edited tasks and leads.',
+        )
+        parser.add_argument(
+            '--horizon-hours', type=float, default=24,
+            help='How far ahead due items are kept in memory.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Fire reminders that are due now and exit (for cron).',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(
+            horizon=timedelta(hours=options['horizon_hours']),
+            poll_interval=options['poll_interval'],
+        )
+
+        if options['once']:
+            scheduler.start()
+            fired = scheduler.fire_due()
+            self.stdout.write(self.style.SUCCESS(f'Sent {fired} reminders.'))
+            return
+
+        self.stdout.write('Reminder scheduler running. Press Ctrl+C to stop.')
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Reminder scheduler stopped.')
@@ -0,0 +1,69 @@
+"""
+Full-text search over the messages of the conversations a user can see.
+
+Matching uses ``Message.search_document``, the body's ``tsvector`` that a
+database trigger keeps up to date, through its GIN index. Storing it means
+Postgres never re-parses bodies to recheck or filter candidate rows. Queries
+use web search syntax (``"exact phrase"``, ``or``, ``-word``).
+
+Results are newest first and paged with the usual ``created_at|id`` cursor,
+so a page never needs an OFFSET. Snippets come from ``ts_headline``, which
+Postgres only evaluates for the rows of the page. Matches are delimited with
+control characters and turned into ``<mark>`` after the rest of the snippet
+has been escaped, because message bodies are user input.
+"""
+from django.contrib.postgres.search import SearchHeadline, SearchQuery
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .messaging import message_cursor, parse_message_cursor, visible_conversations
+from .models import MESSAGE_SEARCH_CONFIG, Message
+
+SEARCH_PAGE_SIZE = 20
+_START, _STOP = '\x02', '\x03'
+SNIPPET_OPTIONS = {'start_sel': _START, 'stop_sel': _STOP, 'max_words': 30, 'min_words': 10, 'max_fragments': 2}
+# The same options for raw ``ts_headline`` calls.
+SNIPPET_OPTIONS_SQL = f'StartSel={_START}, StopSel={_STOP}, MaxWords=30, MinWords=10, MaxFragments=2'
+
+
+def message_search_query(text):
+    return SearchQuery(text, config=MESSAGE_SEARCH_CONFIG, search_type='websearch')
+
+
+def matching_messages(text):
+    """Messages whose body matches ``text``."""
+    return Message.objects.filter(search_document=message_search_query(text))
+
+
+def highlight(headline):
+    return mark_safe(escape(headline).replace(_START, '<mark>').replace(_STOP, '</mark>'))
+
+
+def search_messages(user, text, cursor=None):
+    """
+    ``(messages, next_cursor)`` matching ``text`` in conversations ``user``
+    can see, newest first. Each message has a ``snippet`` with the matches
+    highlighted. Raises ``ValueError`` for a malformed cursor.
+    """
+    messages = (
+        matching_messages(text)
+        .filter(conversation__in=visible_conversations(user))
+        .select_related('sender', 'conversation')
+        .annotate(headline=SearchHeadline(
+            'body', message_search_query(text), config=MESSAGE_SEARCH_CONFIG, **SNIPPET_OPTIONS,
+        ))
+        .order_by('-created_at', '-id')
+    )
+    if cursor:
+        created_at, pk = parse_message_cursor(cursor)
+        messages = messages.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    page = list(messages[:SEARCH_PAGE_SIZE + 1])
+    next_cursor = message_cursor(page[SEARCH_PAGE_SIZE - 1]) if len(page) > SEARCH_PAGE_SIZE else None
+    page = page[:SEARCH_PAGE_SIZE]
+    for message in page:
+        message.snippet = highlight(message.headline)
+        # History cursor of the conversation page that ends with this message.
+        message.context_cursor = f'{message.created_at.isoformat()}|{message.pk + 1}'
+    return page, next_cursor
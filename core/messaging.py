@@ -0,0 +1,401 @@
+"""
+Team and project messaging.
+
+A conversation page shows the newest ``MESSAGE_PAGE_SIZE`` messages and pages
+back through older ones with a ``created_at|id`` cursor on the
+``(conversation, created_at, id)`` index. New messages reach open pages
+through a Server-Sent Events stream (``core.views.conversation_stream``):
+
+- ``MessageWriter`` saves posted messages in batches. A background thread
+  collects whatever arrives within ``MESSAGING_FLUSH_SECONDS`` (at most
+  ``MESSAGING_BATCH_SIZE`` messages) and writes it with one ``bulk_create``,
+  then hands the saved messages back to their senders and publishes them.
+- The broker fans published messages out to the streams subscribed to a
+  conversation. ``InProcessBroker`` only reaches streams served by the same
+  process. With several processes or hosts, ``MESSAGING_BROKER`` names a class
+  with the same ``subscribe``/``unsubscribe``/``publish`` methods backed by a
+  shared channel (Redis pub/sub, Postgres LISTEN/NOTIFY, ...).
+- Streams never depend on the broker alone. A reconnecting page sends the
+  cursor of the last message it has, and the gap is read from the database
+  first. A stream that falls too far behind is dropped and catches up the
+  same way.
+
+Unread counts live in ``ConversationReadState``, one row per user and
+conversation. The writer adds each batch to the counts of the
+conversation's participants in the same transaction (``count_unread``).
+``mark_read`` moves a user's cursor and recounts the few messages after it.
+So a badge is one read of the user's rows with something unread, whatever
+the number of messages. Messages created without the writer (the admin,
+say) are not counted until the next ``mark_read``.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .access import holders, visible_to
+from .models import Conversation, ConversationReadState, Message
+
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_MAX_LENGTH = 5000
+# Most messages a reconnecting page catches up on; a longer gap reloads it.
+MESSAGE_REPLAY_LIMIT = 500
+# Messages saved by another process can commit slightly out of created_at
+# order; catching up re-reads a small overlap and pages skip ids they have.
+MESSAGE_CURSOR_OVERLAP = timedelta(seconds=2)
+
+MESSAGING_BATCH_SIZE = getattr(settings, 'MESSAGING_BATCH_SIZE', 200)
+MESSAGING_FLUSH_SECONDS = getattr(settings, 'MESSAGING_FLUSH_SECONDS', 0.02)
+MESSAGING_BROKER = getattr(settings, 'MESSAGING_BROKER', 'core.messaging.InProcessBroker')
+# Messages waiting for one stream before it is dropped as too slow.
+SUBSCRIBER_BACKLOG = 1000
+
+
+def visible_conversations(user):
+    """
+    Active conversations ``user`` (a user or id) takes part in: those of
+    their teams, project conversations (without a team) of projects assigned
+    to their teams, and the ones they started (see ``core.access``).
+    """
+    return visible_to(user, Conversation.objects.filter(is_active=True))
+
+
+def conversation_participants(conversation):
+    """Ids of the users who see ``conversation`` (the inverse of ``visible_conversations``)."""
+    return holders(conversation)
+
+
+def message_cursor(message):
+    return f'{message.created_at.isoformat()}|{message.pk}'
+
+
+def parse_message_cursor(cursor):
+    """``(created_at, id)`` of a cursor; raises ``ValueError`` when malformed."""
+    created_at, _, pk = cursor.rpartition('|')
+    created_at = parse_datetime(created_at)
+    if created_at is None or not pk.isdigit():
+        raise ValueError('Invalid cursor')
+    return created_at, int(pk)
+
+
+def message_payload(message):
+    sender = message.sender
+    return {
+        'id': message.pk,
+        'cursor': message_cursor(message),
+        'sender_id': sender.pk,
+        'sender': sender.get_full_name() or sender.username,
+        'body': message.body,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def _conversation_messages(conversation_id):
+    return Message.objects.filter(conversation_id=conversation_id).select_related('sender')
+
+
+def message_history(conversation_id, before=None):
+    """
+    ``(messages, older_cursor)``: the page of messages before the ``before``
+    cursor (the newest page without one), oldest first. ``older_cursor`` is
+    ``None`` when there is nothing older. Raises ``ValueError`` for a
+    malformed cursor.
+    """
+    messages = _conversation_messages(conversation_id).order_by('-created_at', '-id')
+    if before:
+        created_at, pk = parse_message_cursor(before)
+        messages = messages.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    page = list(messages[:MESSAGE_PAGE_SIZE + 1])
+    older_cursor = message_cursor(page[MESSAGE_PAGE_SIZE - 1]) if len(page) > MESSAGE_PAGE_SIZE else None
+    page = page[:MESSAGE_PAGE_SIZE]
+    page.reverse()
+    return page, older_cursor
+
+
+def messages_since(conversation_id, cursor=None, limit=MESSAGE_REPLAY_LIMIT):
+    """
+    Payloads of the messages after ``cursor`` (all of them without one),
+    oldest first, plus the overlap. At most ``limit + 1`` are returned, so
+    callers can tell that the gap was longer than ``limit``.
+    """
+    messages = _conversation_messages(conversation_id).order_by('created_at', 'id')
+    if cursor:
+        created_at, pk = parse_message_cursor(cursor)
+        messages = messages.filter(created_at__gte=created_at - MESSAGE_CURSOR_OVERLAP).exclude(id=pk)
+    return [message_payload(message) for message in messages[:limit + 1]]
+
+
+def count_unread(messages):
+    """
+    Add just-saved ``messages`` to the unread counts of their conversations'
+    participants (not to the sender's own). Call it in the transaction that
+    saved them.
+    """
+    by_conversation = {}
+    for message in messages:
+        by_conversation.setdefault(message.conversation_id, []).append(message)
+    conversations = Conversation.objects.filter(pk__in=by_conversation).only('id')
+    for conversation in conversations:
+        batch = by_conversation[conversation.pk]
+        participants = conversation_participants(conversation)
+        states = ConversationReadState.objects.filter(conversation=conversation, user_id__in=participants)
+        missing = participants - set(states.values_list('user_id', flat=True))
+        ConversationReadState.objects.bulk_create(
+            [ConversationReadState(user_id=user_id, conversation=conversation) for user_id in missing],
+            ignore_conflicts=True,
+        )
+        # Everyone gets the whole batch, minus the messages they sent themselves.
+        own = Case(
+            *[When(user_id=sender_id, then=Value(count)) for sender_id, count in Counter(
+                message.sender_id for message in batch
+            ).items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        states.update(unread_count=F('unread_count') + len(batch) - own)
+
+
+def mark_read(user, conversation_id, cursor):
+    """
+    Move ``user``'s read cursor of the conversation forward to ``cursor`` and
+    recount what is unread after it. Raises ``ValueError`` for a malformed cursor.
+
+    The state row is locked first. A message the writer saves meanwhile is
+    then either counted here (committed before the lock) or added by the
+    writer afterwards, never lost or counted twice.
+    """
+    created_at, pk = parse_message_cursor(cursor)
+    with transaction.atomic():
+        state, _ = ConversationReadState.objects.select_for_update().get_or_create(
+            user=user, conversation_id=conversation_id,
+        )
+        if state.last_read_at is not None and (state.last_read_at, state.last_read_id) >= (created_at, pk):
+            return state
+        state.last_read_at, state.last_read_id = created_at, pk
+        state.unread_count = (
+            Message.objects.filter(conversation_id=conversation_id)
+            .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            .exclude(sender=user)
+            .count()
+        )
+        state.save(update_fields=['last_read_at', 'last_read_id', 'unread_count'])
+    return state
+
+
+def unread_counts(user):
+    """``{conversation_id: unread}`` for the conversations with unread messages."""
+    return dict(
+        ConversationReadState.objects.filter(user=user, unread_count__gt=0)
+        .values_list('conversation_id', 'unread_count')
+    )
+
+
+def unread_total(user):
+    return (
+        ConversationReadState.objects.filter(user=user, unread_count__gt=0)
+        .aggregate(total=Sum('unread_count'))['total'] or 0
+    )
+
+
+def prune_read_states(user_ids):
+    """Drop the read states of conversations these users no longer see (after membership changes)."""
+    for user_id in user_ids:
+        ConversationReadState.objects.filter(user_id=user_id).exclude(
+            conversation__in=visible_conversations(user_id),
+        ).delete()
+
+
+class Subscription:
+    """
+    Messages published to one conversation for one stream. ``put`` may be
+    called from any thread; ``get`` is awaited by the stream.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.dropped = False
+        self._items = deque()
+        self._loop = None
+        self._waiter = None
+
+    def put(self, payloads):
+        """Queue ``payloads`` and return the event loop to wake, if any."""
+        if len(self._items) + len(payloads) > SUBSCRIBER_BACKLOG:
+            self.dropped = True
+        else:
+            self._items.extend(payloads)
+        return self._loop
+
+    def wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self, timeout):
+        """The next payload, or ``None`` after ``timeout`` seconds or once dropped."""
+        self._loop = asyncio.get_running_loop()
+        if not self._items and not self.dropped:
+            self._waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiter = None
+        return self._items.popleft() if self._items and not self.dropped else None
+
+
+def _wake_all(subscriptions):
+    for subscription in subscriptions:
+        subscription.wake()
+
+
+class InProcessBroker:
+    """Publish/subscribe between the writer and the streams of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, key):
+        subscription = Subscription(key)
+        with self._lock:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def subscriber_count(self, key=None):
+        with self._lock:
+            if key is not None:
+                return len(self._subscriptions.get(key, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, key, payloads):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(key, ()))
+        # Streams of one event loop are woken by a single callback, so a
+        # publish costs one cross-thread wake-up per loop, not per stream.
+        by_loop = {}
+        for subscription in subscriptions:
+            loop = subscription.put(payloads)
+            if loop is not None:
+                by_loop.setdefault(loop, []).append(subscription)
+        for loop, woken in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_wake_all, woken)
+            except RuntimeError:
+                # The loop was closed; its streams are gone.
+                pass
+
+
+class MessageWriter:
+    """
+    Group commit for posted messages. ``submit`` queues an unsaved ``Message``
+    and returns a ``concurrent.futures.Future`` that resolves to the saved
+    message; a daemon thread saves the queue in batches.
+    """
+
+    def __init__(self, batch_size=MESSAGING_BATCH_SIZE, flush_seconds=MESSAGING_FLUSH_SECONDS, broker=None):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.broker = broker
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, message):
+        future = Future()
+        self._queue.put((message, future))
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+                    self._thread.start()
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self.flush(self._next_batch())
+
+    def flush(self, batch):
+        """Save ``batch`` (``(message, future)`` pairs), resolve the futures and publish."""
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message for message, _ in batch])
+                count_unread([message for message, _ in batch])
+            saved = batch
+        except Exception:
+            # Save one by one, so a single bad message (say, its
+            # conversation was just deleted) fails alone.
+            saved = []
+            for message, future in batch:
+                message.pk = None
+                try:
+                    with transaction.atomic():
+                        message.save()
+                        count_unread([message])
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    saved.append((message, future))
+
+        published = {}
+        for message, future in saved:
+            future.set_result(message)
+            published.setdefault(message.conversation_id, []).append(message_payload(message))
+        broker = self.broker or get_broker()
+        for conversation_id, payloads in published.items():
+            broker.publish(conversation_id, payloads)
+
+
+_broker = None
+_writer = None
+_singleton_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _singleton_lock:
+            if _broker is None:
+                _broker = import_string(MESSAGING_BROKER)()
+    return _broker
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _singleton_lock:
+            if _writer is None:
+                _writer = MessageWriter()
+    return _writer
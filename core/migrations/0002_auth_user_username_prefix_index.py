@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Prefix-search indexes for the autocomplete endpoints. On PostgreSQL
+    ``istartswith`` compiles to ``UPPER(col::text) LIKE 'Q%'``, which only a
+    ``text_pattern_ops`` index on the same expression can answer.
+    """
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_username_prefix ON auth_user ((UPPER(username::text)) text_pattern_ops);',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_username_prefix;',
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.24 on 2026-10-19 13:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Max
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Runs outside a transaction: each batch commits on its own, so the table
+    # is never locked as a whole.
+    Message = apps.get_model('core', 'Message')
+    last_id = Message.objects.aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        Message.objects.filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE).update(
+            search_document=SearchVector('body', config='english'),
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_conversation_read_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            CREATE TRIGGER core_message_search_document
+            BEFORE INSERT OR UPDATE OF body ON core_message
+            FOR EACH ROW EXECUTE FUNCTION
+            tsvector_update_trigger(search_document, 'pg_catalog.english', body);
+            """,
+            "DROP TRIGGER IF EXISTS core_message_search_document ON core_message;",
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='core_message_search_idx'),
+        ),
+    ]
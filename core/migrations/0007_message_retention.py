@@ -0,0 +1,58 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_message_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageRetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keep_days', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='message_retention', to='core.project')),
+                ('team', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='message_retention', to='core.team')),
+            ],
+            options={
+                'verbose_name_plural': 'message retention policies',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessageChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('search_document', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_chunks', to='core.conversation')),
+            ],
+            options={
+                'ordering': ['-last_created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='messageretentionpolicy',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('project__isnull', True), ('team__isnull', False)), models.Q(('project__isnull', False), ('team__isnull', True)), _connector='OR'), name='message_retention_team_xor_project'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessagechunk',
+            index=models.Index(fields=['conversation', '-last_created_at'], name='core_archive_by_conv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessagechunk',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='core_archive_search_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+ACCESS_MODELS = (('core', 'team'), ('core', 'project'), ('client', 'client'), ('lead', 'lead'), ('core', 'conversation'))
+
+
+def backfill_access_grants(apps, schema_editor):
+    # Same rules as core.access.compute_grants, for every user.
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    AccessGrant = apps.get_model('core', 'AccessGrant')
+    TeamMembership = apps.get_model('core', 'TeamMembership')
+    ProjectTeamAssignment = apps.get_model('core', 'ProjectTeamAssignment')
+    Conversation = apps.get_model('core', 'Conversation')
+
+    grants = set()
+    content_types = {}
+    for app_label, model_name in ACCESS_MODELS:
+        content_type, _ = ContentType.objects.get_or_create(app_label=app_label, model=model_name)
+        content_types[model_name] = content_type.pk
+        grants.update(
+            (user_id, content_type.pk, pk)
+            for user_id, pk in apps.get_model(app_label, model_name).objects.values_list('created_by_id', 'id')
+        )
+
+    def add(model_name, rows):
+        grants.update((user_id, content_types[model_name], pk) for user_id, pk in rows if pk is not None)
+
+    memberships = TeamMembership.objects.filter(is_active=True)
+    add('team', memberships.values_list('user_id', 'team_id'))
+    active = memberships.filter(team__is_active=True)
+    add('client', active.values_list('user_id', 'team__client_id'))
+    add('conversation', active.values_list('user_id', 'team__conversations__id'))
+    project_users = {}
+    for user_id, project_id, client_id, lead_id in ProjectTeamAssignment.objects.filter(
+        is_active=True, team__is_active=True, team__memberships__is_active=True,
+    ).values_list('team__memberships__user_id', 'project_id', 'project__client_id', 'project__lead_id'):
+        project_users.setdefault(project_id, set()).add(user_id)
+        add('project', [(user_id, project_id)])
+        add('client', [(user_id, client_id)])
+        add('lead', [(user_id, lead_id)])
+    add('conversation', (
+        (user_id, pk)
+        for pk, project_id in Conversation.objects.filter(team__isnull=True).values_list('id', 'project_id')
+        for user_id in project_users.get(project_id, ())
+    ))
+
+    AccessGrant.objects.bulk_create(
+        [AccessGrant(user_id=user_id, content_type_id=content_type_id, object_id=pk) for user_id, content_type_id, pk in grants],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0007_message_retention'),
+        ('client', '0010_purchase_unit_price'),
+        ('lead', '0004_reminder_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessGrant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.BigIntegerField()),
+                ('content_type', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='access_grants', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'object_id'], name='core_access_by_object_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accessgrant',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type', 'object_id'), name='unique_access_grant'),
+        ),
+        migrations.RunPython(backfill_access_grants, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 
 from client.models import Client
 from lead.models import Lead
@@ -177,15 +180,182 @@ class Conversation(models.Model):
         return self.title or f"Conversation #{self.pk}"
 
 
+# Text search configuration of message bodies. The search_document trigger
+# (migration 0006) uses it too; changing it needs a new migration.
+MESSAGE_SEARCH_CONFIG = "english"
+
+
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name="messages_sent")
     body = models.TextField()
+    # to_tsvector(MESSAGE_SEARCH_CONFIG, body), filled in by a database trigger.
+    search_document = SearchVectorField(null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # History pages and stream catch-up: (created_at, id) cursor per conversation.
+            models.Index(fields=["conversation", "created_at", "id"], name="core_message_history_idx"),
+            # Full-text search (core/message_search.py).
+            GinIndex(fields=["search_document"], name="core_message_search_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.sender} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+
+
+class ConversationReadState(models.Model):
+    """
+    Where ``user`` stopped reading ``conversation`` (a ``created_at``/``id``
+    message cursor) and how many messages from others arrived after it.
+    ``unread_count`` is maintained when messages are saved and recounted when
+    the cursor moves (see ``core.messaging``), so badges never count messages.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversation_read_states")
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="read_states")
+
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    last_read_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "conversation"], name="unique_conversation_read_state"),
+        ]
+        indexes = [
+            # Unread badges: only the conversations with something unread.
+            models.Index(
+                fields=["user"],
+                include=["conversation", "unread_count"],
+                condition=models.Q(unread_count__gt=0),
+                name="core_unread_by_user_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.conversation} ({self.unread_count} unread)"
+
+
+class MessageRetentionPolicy(models.Model):
+    """
+    How long messages of a team's or a project's conversations stay in the
+    message table before ``core.retention`` moves them to the archive.
+    A team policy wins over a project policy for conversations that have both.
+    """
+    team = models.OneToOneField(
+        Team,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="message_retention",
+    )
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="message_retention",
+    )
+    keep_days = models.PositiveIntegerField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "message retention policies"
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(team__isnull=False, project__isnull=True)
+                | models.Q(team__isnull=True, project__isnull=False),
+                name="message_retention_team_xor_project",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.team or self.project}: {self.keep_days} days"
+
+
+class ArchivedMessageChunk(models.Model):
+    """
+    Messages moved out of ``Message`` by the retention job: a run of one
+    conversation's messages from one month, stored as zlib-compressed JSON.
+    ``search_document`` covers all of their bodies, so archive searches only
+    decompress chunks that can match (see ``core/retention.py``).
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="archived_chunks")
+    period_start = models.DateField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    search_document = SearchVectorField(null=True)
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-last_created_at"]
+        indexes = [
+            models.Index(fields=["conversation", "-last_created_at"], name="core_archive_by_conv_idx"),
+            GinIndex(fields=["search_document"], name="core_archive_search_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.conversation} - {self.period_start:%Y-%m} ({self.message_count} messages)"
+
+
+class Notification(models.Model):
+    """
+    In-app notification for a single user.
+
+    ``key`` identifies what the notification is about (e.g. a task reminder for
+    a specific due time) so producers can safely retry without duplicates.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=500, blank=True)
+    key = models.CharField(max_length=255)
+    is_read = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_notification_key"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "is_read", "-created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.title}"
+
+
+class AccessGrant(models.Model):
+    """
+    ``user`` can see one object (a team, project, client, lead or
+    conversation): they created it or reach it through their teams. The rows
+    are derived from memberships and assignments and kept up to date by
+    ``core.access``, so scoping a queryset is one semi-join on this table.
+    """
+    # Both covered by the indexes below.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="access_grants", db_index=False)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+", db_index=False)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index of the semi-join: (user, type) -> object ids.
+            models.UniqueConstraint(fields=["user", "content_type", "object_id"], name="unique_access_grant"),
+        ]
+        indexes = [
+            # Who can see an object (participants, object changes).
+            models.Index(fields=["content_type", "object_id"], name="core_access_by_object_idx"),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.sender} @ {self.created_at:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"{self.user} - {self.content_type.model} #{self.object_id}"
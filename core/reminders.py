@@ -0,0 +1,213 @@
+"""
+Due-date reminders for tasks and leads.
+
+``ReminderScheduler`` is meant to run in its own long-lived process (see the
+``run_reminders`` management command). It never scans the task or lead tables:
+
+- Only items due inside a sliding horizon (24 hours by default) are loaded,
+  through the ``(due_date, due_time)`` indexes, into an in-memory min-heap
+  ordered by fire time.
+- Edits are picked up by polling ``updated_at``/``modified_at`` for rows that
+  changed since the previous poll. Superseded heap entries are skipped lazily
+  when they reach the top of the heap.
+- Right before firing, the item is re-read by primary key, so deleted,
+  completed or rescheduled items do not fire.
+
+Each reminder becomes a ``core.Notification`` whose key contains the item and
+its due moment, so restarts and overlapping polls never notify twice. If
+``REMINDER_EMAIL`` is enabled, an email is also sent through ``EMAIL_BACKEND``.
+"""
+import heapq
+import time as time_module
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Notification
+
+REMINDER_ADVANCE = getattr(settings, 'REMINDER_ADVANCE', timedelta(minutes=15))
+REMINDER_EMAIL = getattr(settings, 'REMINDER_EMAIL', True)
+
+# Rows committed slightly after a poll started can carry an older timestamp;
+# re-reading a small overlap is cheap because rescheduling is idempotent.
+CHANGE_FEED_OVERLAP = timedelta(seconds=5)
+
+
+def due_moment(due_date, due_time):
+    """Aware datetime an item is due; date-only items are due at midnight."""
+    return timezone.make_aware(datetime.combine(due_date, due_time or time.min))
+
+
+class TaskReminders:
+    kind = 'task'
+    changed_field = 'updated_at'
+
+    def queryset(self):
+        from task.models import Task
+        return (
+            Task.objects.exclude(status__in=['completed', 'canceled'])
+            .select_related('assigned_to', 'created_by')
+        )
+
+    def recipient(self, task):
+        return task.assigned_to or task.created_by
+
+    def title(self, task):
+        return f'Task due: {task.title}'
+
+    def url(self, task):
+        return reverse('task:task_detail', args=[task.pk])
+
+
+class LeadReminders:
+    kind = 'lead'
+    changed_field = 'modified_at'
+
+    def queryset(self):
+        from lead.models import Lead
+        return (
+            Lead.objects.filter(converted_to_client=False)
+            .exclude(status__in=['won', 'lost'])
+            .select_related('created_by')
+        )
+
+    def recipient(self, lead):
+        return lead.created_by
+
+    def title(self, lead):
+        return f'Lead follow-up due: {lead}'
+
+    def url(self, lead):
+        return reverse('lead:detail', args=[lead.pk])
+
+
+class ReminderScheduler:
+    def __init__(self, sources=None, horizon=timedelta(hours=24), catch_up=timedelta(hours=1),
+                 poll_interval=30, advance=REMINDER_ADVANCE, clock=timezone.now):
+        self.sources = {source.kind: source for source in (sources or [TaskReminders(), LeadReminders()])}
+        self.horizon = horizon
+        self.catch_up = catch_up
+        self.poll_interval = poll_interval
+        self.advance = advance
+        self.clock = clock
+
+        self._heap = []
+        # (kind, pk) -> fire time of the entry that is currently valid
+        self._scheduled = {}
+        self._loaded_until = None
+        self._changes_since = None
+
+    # Loading
+
+    def _schedule(self, kind, obj):
+        key = (kind, obj.pk)
+        if obj.due_date is None:
+            self._scheduled.pop(key, None)
+            return
+        fire_at = due_moment(obj.due_date, obj.due_time) - self.advance
+        if fire_at < self.clock() - self.catch_up:
+            # Long overdue (an old item edited, say): too late to remind.
+            self._scheduled.pop(key, None)
+            return
+        if fire_at >= self._loaded_until:
+            # Outside the horizon; the window extension will load it later.
+            self._scheduled.pop(key, None)
+            return
+        if self._scheduled.get(key) != fire_at:
+            self._scheduled[key] = fire_at
+            heapq.heappush(self._heap, (fire_at, kind, obj.pk))
+
+    def _load_window(self, start, end):
+        """Load every open item whose reminder fires in ``[start, end)``."""
+        self._loaded_until = max(self._loaded_until or end, end)
+        due_start, due_end = start + self.advance, end + self.advance
+        for kind, source in self.sources.items():
+            items = source.queryset().filter(
+                due_date__gte=timezone.localdate(due_start),
+                due_date__lte=timezone.localdate(due_end),
+            )
+            for obj in items.iterator(chunk_size=2000):
+                if due_start <= due_moment(obj.due_date, obj.due_time) < due_end:
+                    self._schedule(kind, obj)
+
+    def start(self):
+        now = self.clock()
+        self._changes_since = now
+        self._load_window(now - self.catch_up, now + self.horizon)
+
+    def extend_window(self):
+        now = self.clock()
+        if self._loaded_until - now < self.horizon / 2:
+            start = self._loaded_until
+            self._load_window(start, now + self.horizon)
+
+    def poll_changes(self):
+        """Reschedule items edited since the previous poll."""
+        now = self.clock()
+        since = self._changes_since - CHANGE_FEED_OVERLAP
+        for kind, source in self.sources.items():
+            changed = source.queryset().filter(**{f'{source.changed_field}__gt': since})
+            for obj in changed.iterator(chunk_size=2000):
+                self._schedule(kind, obj)
+        self._changes_since = now
+
+    # Firing
+
+    def next_fire_at(self):
+        return self._heap[0][0] if self._heap else None
+
+    def fire_due(self):
+        now = self.clock()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, kind, pk = heapq.heappop(self._heap)
+            if self._scheduled.get((kind, pk)) != fire_at:
+                continue  # superseded by a later edit
+            del self._scheduled[(kind, pk)]
+
+            source = self.sources[kind]
+            obj = source.queryset().filter(pk=pk).first()
+            if obj is None or obj.due_date is None:
+                continue
+            if due_moment(obj.due_date, obj.due_time) - self.advance != fire_at:
+                continue
+            if self.notify(source, obj, fire_at):
+                fired += 1
+        return fired
+
+    def notify(self, source, obj, fire_at):
+        user = source.recipient(obj)
+        title = source.title(obj)
+        due = due_moment(obj.due_date, obj.due_time)
+        body = f'Due {timezone.localtime(due):%Y-%m-%d %H:%M}.'
+        key = f'reminder:{source.kind}:{obj.pk}:{due.isoformat()}'
+
+        _, created = Notification.objects.get_or_create(
+            user=user, key=key,
+            defaults={'title': title, 'body': body, 'url': source.url(obj)},
+        )
+        if REMINDER_EMAIL and user.email and created:
+            send_mail(title, body, None, [user.email], fail_silently=True)
+        return created
+
+    # Main loop
+
+    def run_forever(self, max_sleep=60):
+        self.start()
+        next_poll = time_module.monotonic() + self.poll_interval
+        while True:
+            self.fire_due()
+            if time_module.monotonic() >= next_poll:
+                self.poll_changes()
+                self.extend_window()
+                next_poll = time_module.monotonic() + self.poll_interval
+
+            sleep_for = min(max_sleep, max(next_poll - time_module.monotonic(), 0))
+            upcoming = self.next_fire_at()
+            if upcoming is not None:
+                sleep_for = min(sleep_for, max((upcoming - self.clock()).total_seconds(), 0))
+            time_module.sleep(sleep_for)
+
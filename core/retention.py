@@ -0,0 +1,240 @@
+"""
+Message retention and archival.
+
+``MessageRetentionPolicy`` sets how many days a team's or a project's
+conversations keep their messages in the message table. Other conversations
+use ``MESSAGE_RETENTION_DAYS`` (``None`` keeps them forever).
+
+``archive_expired_messages`` (``manage.py archive_messages``, meant for a
+nightly cron) walks each conversation's expired messages oldest first
+through the ``(conversation, created_at, id)`` index, ``batch_size`` at a
+time. Each batch becomes ``ArchivedMessageChunk`` rows (per month, and
+split so a chunk's text stays well under the ``tsvector`` size limit) and
+is deleted from the message table in the same transaction, which also
+takes the batch out of the readers' unread counts. The message table and its
+indexes then only hold recent messages; autovacuum reuses the freed space.
+
+Archived messages leave the conversation pages but stay searchable.
+``search_archive`` narrows the chunks down through their GIN-indexed
+``search_document``, decompresses only those, and lets Postgres match and
+highlight the single messages inside them.
+"""
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from django.db.models import BooleanField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .message_search import SEARCH_PAGE_SIZE, SNIPPET_OPTIONS_SQL, highlight
+from .messaging import parse_message_cursor, visible_conversations
+from .models import (
+    MESSAGE_SEARCH_CONFIG, ArchivedMessageChunk, Conversation, ConversationReadState, Message, MessageRetentionPolicy,
+)
+
+MESSAGE_RETENTION_DAYS = getattr(settings, 'MESSAGE_RETENTION_DAYS', None)
+ARCHIVE_BATCH_SIZE = 1000
+# Text per chunk; tsvectors are limited to 1MB.
+ARCHIVE_CHUNK_TEXT_SIZE = 256 * 1024
+ARCHIVE_SEARCH_CHUNKS = 5
+
+
+def retention_days(conversations):
+    """``{conversation_id: keep_days}`` for the conversations whose messages expire."""
+    team_days = dict(
+        MessageRetentionPolicy.objects.filter(team__isnull=False).values_list('team_id', 'keep_days')
+    )
+    project_days = dict(
+        MessageRetentionPolicy.objects.filter(project__isnull=False).values_list('project_id', 'keep_days')
+    )
+    days = {}
+    for conversation in conversations:
+        if conversation.team_id in team_days:
+            days[conversation.pk] = team_days[conversation.team_id]
+        elif conversation.project_id in project_days:
+            days[conversation.pk] = project_days[conversation.project_id]
+        elif MESSAGE_RETENTION_DAYS is not None:
+            days[conversation.pk] = MESSAGE_RETENTION_DAYS
+    return days
+
+
+def pack(messages):
+    return zlib.compress(json.dumps([
+        [message['id'], message['sender_id'], message['created_at'].isoformat(), message['body']]
+        for message in messages
+    ]).encode())
+
+
+def unpack(chunk):
+    """The messages of ``chunk`` as dicts, oldest first."""
+    return [
+        {'id': pk, 'sender_id': sender_id, 'created_at': parse_datetime(created_at), 'body': body}
+        for pk, sender_id, created_at, body in json.loads(zlib.decompress(bytes(chunk.data)))
+    ]
+
+
+def _chunks(conversation_id, messages):
+    """Split consecutive ``messages`` into unsaved chunks by month and size."""
+    groups = []
+    for message in messages:
+        period = timezone.localdate(message['created_at']).replace(day=1)
+        size = len(message['body'])
+        if not groups or groups[-1][0] != period or groups[-1][1] + size > ARCHIVE_CHUNK_TEXT_SIZE:
+            groups.append([period, 0, []])
+        groups[-1][1] += size
+        groups[-1][2].append(message)
+    return [
+        ArchivedMessageChunk(
+            conversation_id=conversation_id,
+            period_start=period,
+            first_created_at=group[0]['created_at'],
+            last_created_at=group[-1]['created_at'],
+            message_count=len(group),
+            data=pack(group),
+            search_document=SearchVector(
+                Value('\n'.join(message['body'] for message in group)), config=MESSAGE_SEARCH_CONFIG,
+            ),
+        )
+        for period, _, group in groups
+    ]
+
+
+def _forget_unread(conversation_id, messages):
+    """Take archived ``messages`` out of the unread counts of the conversation's readers."""
+    # Locked like mark_read does, so a concurrent recount cannot be overwritten.
+    states = list(
+        ConversationReadState.objects.select_for_update()
+        .filter(conversation_id=conversation_id, unread_count__gt=0)
+    )
+    for state in states:
+        cursor = (state.last_read_at, state.last_read_id) if state.last_read_at is not None else None
+        unread = sum(
+            1 for message in messages
+            if message['sender_id'] != state.user_id
+            and (cursor is None or (message['created_at'], message['id']) > cursor)
+        )
+        state.unread_count = max(state.unread_count - unread, 0)
+    ConversationReadState.objects.bulk_update(states, ['unread_count'])
+
+
+def archive_batch(conversation_id, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive and delete up to ``batch_size`` messages older than ``cutoff``; returns how many."""
+    with transaction.atomic():
+        messages = list(
+            Message.objects.filter(conversation_id=conversation_id, created_at__lt=cutoff)
+            .order_by('created_at', 'id')
+            .values('id', 'sender_id', 'created_at', 'body')[:batch_size]
+        )
+        if messages:
+            ArchivedMessageChunk.objects.bulk_create(_chunks(conversation_id, messages))
+            _forget_unread(conversation_id, messages)
+            Message.objects.filter(id__in=[message['id'] for message in messages]).delete()
+    return len(messages)
+
+
+def archive_expired_messages(now=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive every conversation's messages past its retention period; returns how many."""
+    now = now or timezone.now()
+    conversations = Conversation.objects.only('id', 'team_id', 'project_id')
+    archived = 0
+    for conversation_id, keep_days in retention_days(conversations.iterator()).items():
+        cutoff = now - timedelta(days=keep_days)
+        while True:
+            count = archive_batch(conversation_id, cutoff, batch_size)
+            archived += count
+            if count < batch_size:
+                break
+    return archived
+
+
+# The chunk prefilter only uses the positive part of the query: a chunk
+# that contains an excluded word can still hold messages without it.
+_CANDIDATE_SQL = f"""
+    {ArchivedMessageChunk._meta.db_table}.search_document @@ querytree(websearch_to_tsquery(%s::regconfig, %s))::tsquery
+    OR querytree(websearch_to_tsquery(%s::regconfig, %s)) = 'T'
+"""
+
+_MATCH_SQL = """
+    SELECT t.position, ts_headline(%s::regconfig, t.body, query, %s)
+    FROM unnest(%s::text[]) WITH ORDINALITY AS t(body, position),
+         websearch_to_tsquery(%s::regconfig, %s) AS query
+    WHERE to_tsvector(%s::regconfig, t.body) @@ query
+"""
+
+
+def _match(bodies, text):
+    """``{index: headline}`` of the ``bodies`` that match ``text``."""
+    with connection.cursor() as cursor:
+        cursor.execute(_MATCH_SQL, [
+            MESSAGE_SEARCH_CONFIG, SNIPPET_OPTIONS_SQL, bodies, MESSAGE_SEARCH_CONFIG, text, MESSAGE_SEARCH_CONFIG,
+        ])
+        return {position - 1: headline for position, headline in cursor.fetchall()}
+
+
+def search_archive(user, text, cursor=None):
+    """
+    ``(hits, next_cursor)``: archived messages matching ``text`` in
+    conversations ``user`` can see, newest first, paged like
+    ``search_messages``. Hits are dicts with the ``conversation``, ``sender``,
+    ``created_at`` and highlighted ``snippet``. Raises ``ValueError`` for a
+    malformed cursor.
+
+    Chunks are read newest first, ``ARCHIVE_SEARCH_CHUNKS`` at a time, until
+    no unread chunk can hold a message newer than the last hit of the page.
+    """
+    chunks = (
+        ArchivedMessageChunk.objects.filter(conversation__in=visible_conversations(user))
+        .filter(RawSQL(_CANDIDATE_SQL, [MESSAGE_SEARCH_CONFIG, text] * 2, output_field=BooleanField()))
+        .select_related('conversation')
+        .defer('search_document')
+        .order_by('-last_created_at', '-id')
+    )
+    after = None
+    if cursor:
+        after = parse_message_cursor(cursor)
+        chunks = chunks.filter(first_created_at__lte=after[0])
+
+    hits = []
+    while True:
+        batch = list(chunks[:ARCHIVE_SEARCH_CHUNKS])
+        candidates = [
+            (chunk, message) for chunk in batch for message in unpack(chunk)
+            if after is None or (message['created_at'], message['id']) < after
+        ]
+        if candidates:
+            headlines = _match([message['body'] for _, message in candidates], text)
+            hits.extend(
+                {'conversation': candidates[index][0].conversation, 'message': candidates[index][1], 'headline': headline}
+                for index, headline in headlines.items()
+            )
+            hits.sort(key=lambda hit: (hit['message']['created_at'], hit['message']['id']), reverse=True)
+        if len(batch) < ARCHIVE_SEARCH_CHUNKS:
+            break
+        last = batch[-1]
+        if len(hits) > SEARCH_PAGE_SIZE and hits[SEARCH_PAGE_SIZE]['message']['created_at'] > last.last_created_at:
+            break
+        chunks = chunks.filter(
+            Q(last_created_at__lt=last.last_created_at) | Q(last_created_at=last.last_created_at, id__lt=last.pk)
+        )
+
+    next_cursor = None
+    if len(hits) > SEARCH_PAGE_SIZE:
+        message = hits[SEARCH_PAGE_SIZE - 1]['message']
+        next_cursor = f"{message['created_at'].isoformat()}|{message['id']}"
+    hits = hits[:SEARCH_PAGE_SIZE]
+    senders = User.objects.in_bulk({hit['message']['sender_id'] for hit in hits})
+    return [
+        {
+            'conversation': hit['conversation'],
+            'sender': senders.get(hit['message']['sender_id']),
+            'created_at': hit['message']['created_at'],
+            'snippet': highlight(hit['headline']),
+        }
+        for hit in hits
+    ], next_cursor
@@ -0,0 +1,65 @@
+from django.db.models.signals import post_delete, post_save
+
+from client.models import Client
+from lead.models import Lead
+from .access import grant_creator, holders, revoke_object, sync_access, sync_conversation_access
+from .messaging import prune_read_states
+from .models import Conversation, ConversationReadState, Project, ProjectTeamAssignment, Team, TeamMembership
+
+
+# Access grants follow memberships and assignments; unread counts of
+# conversations a user no longer sees must not stay in their badge.
+def membership_changed(sender, instance, **kwargs):
+    sync_access([instance.user_id])
+    prune_read_states([instance.user_id])
+
+
+def assignment_changed(sender, instance, **kwargs):
+    user_ids = list(
+        TeamMembership.objects.filter(team_id=instance.team_id, is_active=True).values_list('user_id', flat=True)
+    )
+    sync_access(user_ids)
+    prune_read_states(user_ids)
+
+
+def team_changed(sender, instance, **kwargs):
+    # Members of an inactive team no longer reach its client, projects and conversations.
+    user_ids = holders(instance) | {instance.created_by_id}
+    sync_access(user_ids)
+    prune_read_states(user_ids)
+
+
+def project_changed(sender, instance, **kwargs):
+    sync_access(holders(instance) | {instance.created_by_id})
+
+
+def record_created(sender, instance, created, **kwargs):
+    if created:
+        grant_creator(instance)
+
+
+def conversation_changed(sender, instance, created, **kwargs):
+    removed = sync_conversation_access(instance)
+    if not instance.is_active:
+        ConversationReadState.objects.filter(conversation=instance).delete()
+    elif removed:
+        ConversationReadState.objects.filter(conversation=instance, user_id__in=removed).delete()
+
+
+def record_deleted(sender, instance, **kwargs):
+    user_ids = revoke_object(instance)
+    if sender in (Team, Project):
+        sync_access(user_ids | {instance.created_by_id})
+
+
+post_save.connect(membership_changed, sender=TeamMembership, dispatch_uid='core_access_membership_saved')
+post_delete.connect(membership_changed, sender=TeamMembership, dispatch_uid='core_access_membership_deleted')
+post_save.connect(assignment_changed, sender=ProjectTeamAssignment, dispatch_uid='core_access_assignment_saved')
+post_delete.connect(assignment_changed, sender=ProjectTeamAssignment, dispatch_uid='core_access_assignment_deleted')
+post_save.connect(team_changed, sender=Team, dispatch_uid='core_access_team_saved')
+post_save.connect(project_changed, sender=Project, dispatch_uid='core_access_project_saved')
+post_save.connect(record_created, sender=Client, dispatch_uid='core_access_client_saved')
+post_save.connect(record_created, sender=Lead, dispatch_uid='core_access_lead_saved')
+post_save.connect(conversation_changed, sender=Conversation, dispatch_uid='core_access_conversation_saved')
+for model in (Team, Project, Client, Lead, Conversation):
+    post_delete.connect(record_deleted, sender=model, dispatch_uid=f'core_access_{model._meta.model_name}_deleted')
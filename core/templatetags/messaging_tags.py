@@ -0,0 +1,13 @@
+from django import template
+
+from core.messaging import unread_total
+
+register = template.Library()
+
+
+@register.simple_tag
+def unread_message_count(user):
+    """Unread messages across the user's conversations (0 for anonymous users)."""
+    if not user.is_authenticated:
+        return 0
+    return unread_total(user)
@@ -0,0 +1,29 @@
+from django import template
+
+from core.thumbnails import AVATAR_SIZE, THUMBNAIL_SIZE, thumbnail_url, thumbnail_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(field_file):
+    """Thumbnail URL for a file field, or the placeholder while it renders."""
+    return thumbnail_url(field_file, THUMBNAIL_SIZE)
+
+
+@register.simple_tag
+def with_thumbnails(objects, field='file'):
+    """
+    ``objects`` as a list, each with ``thumbnail_url`` set for its ``field``,
+    so a list of files costs one cache read instead of one per file.
+    """
+    objects = list(objects)
+    for obj, url in zip(objects, thumbnail_urls([getattr(obj, field) for obj in objects], THUMBNAIL_SIZE)):
+        obj.thumbnail_url = url
+    return objects
+
+
+@register.simple_tag
+def avatar(field_file):
+    """Avatar-sized variant of a profile picture."""
+    return thumbnail_url(field_file, AVATAR_SIZE)
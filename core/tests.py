@@ -1,3 +1,323 @@
-from django.test import TestCase
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from client.models import Client
+from core.access import rebuild_access, visible_to
+from core.message_search import search_messages
+from core.messaging import MessageWriter, count_unread, mark_read, message_cursor, messages_since
+from core.models import (
+    AccessGrant, Conversation, ConversationReadState, Message, MessageRetentionPolicy, Notification, Project,
+    ProjectTeamAssignment, Team, TeamMembership,
+)
+from core.reminders import ReminderScheduler, TaskReminders
+from core.retention import archive_expired_messages
+from core.templatetags.thumbnail_tags import with_thumbnails
+from core.thumbnails import NO_PREVIEW, PLACEHOLDER, THUMBNAIL_SIZE, _cache_key
+from lead.models import Lead, LeadFile
+from task.forms import TaskEditForm
+from task.models import Task
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reminders', 'reminders@example.com', 'x')
+        self.now = timezone.now()
+        self.scheduler = ReminderScheduler(sources=[TaskReminders()], clock=lambda: self.now)
+        self.scheduler.start()
+
+    def create_task(self, due):
+        due = timezone.localtime(due)
+        return Task.objects.create(
+            title='Task', created_by=self.user, status='todo',
+            due_date=due.date(), due_time=due.time().replace(microsecond=0),
+        )
+
+    def test_edited_task_due_soon_fires(self):
+        self.create_task(self.now + timedelta(minutes=5))
+        self.scheduler.poll_changes()
+        self.assertEqual(self.scheduler.fire_due(), 1)
+
+    def test_edited_overdue_task_does_not_fire(self):
+        task = self.create_task(self.now - timedelta(days=300))
+        task.title = 'Edited'
+        task.save()
+        self.scheduler.poll_changes()
+        self.assertEqual(self.scheduler.fire_due(), 0)
+        self.assertFalse(Notification.objects.exists())
+
+
+class ArchiveUnreadTests(TestCase):
+    def setUp(self):
+        self.sender, self.reader = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('sender', 'reader')
+        )
+        team = Team.objects.create(name='Team', created_by=self.sender)
+        TeamMembership.objects.create(team=team, user=self.reader)
+        self.conversation = Conversation.objects.create(team=team, created_by=self.sender)
+        self.now = timezone.now()
+
+    def post(self, days_ago):
+        message = Message.objects.create(conversation=self.conversation, sender=self.sender, body='Hello')
+        Message.objects.filter(pk=message.pk).update(created_at=self.now - timedelta(days=days_ago))
+        message.refresh_from_db()
+        count_unread([message])
+        return message
+
+    def unread(self):
+        return ConversationReadState.objects.get(user=self.reader, conversation=self.conversation).unread_count
+
+    def test_archived_messages_leave_unread_counts(self):
+        read = self.post(days_ago=40)
+        mark_read(self.reader, self.conversation.pk, message_cursor(read))
+        for days_ago in (35, 30, 1):
+            self.post(days_ago)
+        self.assertEqual(self.unread(), 3)
+        MessageRetentionPolicy.objects.create(team=self.conversation.team, keep_days=7)
+        self.assertEqual(archive_expired_messages(now=self.now), 3)
+        self.assertEqual(self.unread(), 1)
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, key, payloads):
+        self.published.append((key, [payload['body'] for payload in payloads]))
+
+
+# flush() closes stale connections and commits, so it cannot run inside a test transaction.
+class MessageWriterTests(TransactionTestCase):
+    def test_bad_message_fails_alone(self):
+        sender = User.objects.create_user('writer', 'writer@example.com', 'x')
+        conversation = Conversation.objects.create(created_by=sender)
+        broker = RecordingBroker()
+        batch = [
+            (Message(conversation=conversation, sender=sender, body=body), Future())
+            for body in ('first', None, 'third')
+        ]
+        MessageWriter(broker=broker).flush(batch)
+        (first, first_future), (_, bad_future), (third, third_future) = batch
+        self.assertIsInstance(bad_future.exception(), Exception)
+        self.assertEqual([first_future.result(), third_future.result()], [first, third])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('body', flat=True)), ['first', 'third'])
+        self.assertEqual(broker.published, [(conversation.pk, ['first', 'third'])])
+
+
+class ConversationMessagesTests(TestCase):
+    def setUp(self):
+        self.user, self.outsider = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('talker', 'outsider')
+        )
+        team = Team.objects.create(name='Team', created_by=self.user)
+        self.conversation = Conversation.objects.create(team=team, created_by=self.user)
+        self.now = timezone.now()
+
+    def post(self, body, seconds_ago):
+        message = Message.objects.create(conversation=self.conversation, sender=self.user, body=body)
+        Message.objects.filter(pk=message.pk).update(created_at=self.now - timedelta(seconds=seconds_ago))
+        message.refresh_from_db()
+        return message
+
+    def bodies(self, payloads):
+        return [payload['body'] for payload in payloads]
+
+    def test_messages_since_rereads_the_overlap(self):
+        self.post('old', 10)
+        self.post('overlap', 1)
+        seen = self.post('seen', 0)
+        self.post('new', -1)
+        self.assertEqual(self.bodies(messages_since(self.conversation.pk, message_cursor(seen))), ['overlap', 'new'])
+
+    def test_messages_since_returns_one_more_than_the_limit(self):
+        for seconds_ago in range(5, 0, -1):
+            self.post(f'm{seconds_ago}', seconds_ago)
+        self.assertEqual(self.bodies(messages_since(self.conversation.pk, limit=3)), ['m5', 'm4', 'm3', 'm2'])
+        self.client.force_login(self.user)
+        with mock.patch('core.views.MESSAGE_REPLAY_LIMIT', 3):
+            response = self.client.get(reverse('core:conversation_messages_since', args=[self.conversation.pk]))
+        self.assertEqual(len(response.json()['messages']), 3)
+        self.assertTrue(response.json()['reload'])
+
+    def test_stream_needs_asgi(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('core:conversation_stream', args=[self.conversation.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_post_to_invisible_conversation(self):
+        self.client.force_login(self.outsider)
+        response = self.client.post(reverse('core:conversation_post', args=[self.conversation.pk]), {'body': 'Hi'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Message.objects.exists())
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.user, self.outsider = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('searcher', 'outsider')
+        )
+        team = Team.objects.create(name='Team', created_by=self.user)
+        self.conversation = Conversation.objects.create(team=team, created_by=self.user)
+        self.now = timezone.now()
+
+    def post(self, body, conversation=None, seconds_ago=0):
+        message = Message.objects.create(
+            conversation=conversation or self.conversation, sender=self.user, body=body,
+        )
+        Message.objects.filter(pk=message.pk).update(created_at=self.now - timedelta(seconds=seconds_ago))
+        return message
+
+    def test_invisible_conversations_never_match(self):
+        other_team = Team.objects.create(name='Other', created_by=self.outsider)
+        hidden = Conversation.objects.create(team=other_team, created_by=self.outsider)
+        self.post('invoice hidden', conversation=hidden)
+        visible = self.post('invoice visible')
+        self.assertEqual([message.pk for message in search_messages(self.user, 'invoice')[0]], [visible.pk])
+
+    def test_cursor_paging(self):
+        oldest, middle, newest = (self.post('invoice', seconds_ago=seconds_ago) for seconds_ago in (3, 2, 1))
+        with mock.patch('core.message_search.SEARCH_PAGE_SIZE', 2):
+            page, cursor = search_messages(self.user, 'invoice')
+            self.assertEqual([message.pk for message in page], [newest.pk, middle.pk])
+            page, cursor = search_messages(self.user, 'invoice', cursor)
+        self.assertEqual([message.pk for message in page], [oldest.pk])
+        self.assertIsNone(cursor)
+
+    def test_snippet_is_escaped(self):
+        # ts_headline drops whole tags, but the rest of the markup survives.
+        self.post('the invoice <script>alert(1)</script> 1 < 2 <img src=x onerror=alert(1)> ok')
+        snippet = search_messages(self.user, 'invoice')[0][0].snippet
+        self.assertIn('<mark>invoice</mark>', snippet)
+        self.assertIn('&lt;img src=x', snippet)
+        self.assertNotIn('<', snippet.replace('<mark>', '').replace('</mark>', ''))
+
+
+class AccessTests(TestCase):
+    def setUp(self):
+        self.owner, self.member, self.outsider = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('owner', 'member', 'outsider')
+        )
+        self.client_record = Client.objects.create(
+            first_name='Team', last_name='Client', email='client@example.com', created_by=self.owner,
+        )
+        self.lead = Lead.objects.create(
+            first_name='Project', last_name='Lead', email='lead@example.com', created_by=self.owner,
+        )
+        self.team = Team.objects.create(name='Team', client=self.client_record, created_by=self.owner)
+        self.membership = TeamMembership.objects.create(team=self.team, user=self.member)
+        self.conversation = Conversation.objects.create(team=self.team, created_by=self.owner)
+
+    def visible(self, user, model):
+        return set(visible_to(user, model.objects.all()).values_list('pk', flat=True))
+
+    def create_project(self):
+        project_client = Client.objects.create(
+            first_name='Project', last_name='Client', email='project@example.com', created_by=self.owner,
+        )
+        project = Project.objects.create(name='Project', client=project_client, lead=self.lead, created_by=self.owner)
+        conversation = Conversation.objects.create(project=project, created_by=self.owner)
+        return project, project_client, conversation
+
+    def test_creator_sees_own_records(self):
+        lead = Lead.objects.create(
+            first_name='Own', last_name='Lead', email='own@example.com', created_by=self.outsider,
+        )
+        self.assertEqual(self.visible(self.outsider, Lead), {lead.pk})
+        self.assertNotIn(lead.pk, self.visible(self.owner, Lead))
+        self.assertEqual(self.visible(self.owner, Client), {self.client_record.pk})
+
+    def test_membership_deactivation(self):
+        self.assertEqual(self.visible(self.member, Client), {self.client_record.pk})
+        self.assertEqual(self.visible(self.member, Conversation), {self.conversation.pk})
+        self.membership.is_active = False
+        self.membership.save()
+        self.assertEqual(self.visible(self.member, Client), set())
+        self.assertEqual(self.visible(self.member, Conversation), set())
+        self.membership.is_active = True
+        self.membership.save()
+        self.assertEqual(self.visible(self.member, Team), {self.team.pk})
+
+    def test_team_deactivation(self):
+        self.team.is_active = False
+        self.team.save()
+        self.assertEqual(self.visible(self.member, Client), set())
+        self.assertEqual(self.visible(self.member, Conversation), set())
+        self.assertEqual(self.visible(self.owner, Client), {self.client_record.pk})
+
+    def test_project_assignment(self):
+        project, project_client, conversation = self.create_project()
+        self.assertEqual(self.visible(self.member, Project), set())
+        assignment = ProjectTeamAssignment.objects.create(project=project, team=self.team)
+        self.assertEqual(self.visible(self.member, Project), {project.pk})
+        self.assertEqual(self.visible(self.member, Client), {self.client_record.pk, project_client.pk})
+        self.assertEqual(self.visible(self.member, Lead), {self.lead.pk})
+        self.assertEqual(self.visible(self.member, Conversation), {self.conversation.pk, conversation.pk})
+        assignment.delete()
+        self.assertEqual(self.visible(self.member, Project), set())
+        self.assertEqual(self.visible(self.member, Client), {self.client_record.pk})
+        self.assertEqual(self.visible(self.member, Lead), set())
+        self.assertEqual(self.visible(self.member, Conversation), {self.conversation.pk})
+
+    def test_conversation_visibility(self):
+        other_team = Team.objects.create(name='Other', created_by=self.outsider)
+        other = Conversation.objects.create(team=other_team, created_by=self.outsider)
+        self.assertNotIn(other.pk, self.visible(self.member, Conversation))
+        self.assertEqual(self.visible(self.outsider, Conversation), {other.pk})
+        other.team = self.team
+        other.save()
+        self.assertIn(other.pk, self.visible(self.member, Conversation))
+
+    def test_rebuild_matches_signals(self):
+        project, _, _ = self.create_project()
+        ProjectTeamAssignment.objects.create(project=project, team=self.team)
+        TeamMembership.objects.create(team=self.team, user=self.outsider)
+        self.membership.is_active = False
+        self.membership.save()
+        Conversation.objects.create(team=self.team, created_by=self.member)
+        grants = set(AccessGrant.objects.values_list('user_id', 'content_type_id', 'object_id'))
+        self.assertEqual(rebuild_access(), (0, 0))
+        self.assertEqual(set(AccessGrant.objects.values_list('user_id', 'content_type_id', 'object_id')), grants)
+
+
+class ThumbnailTests(TestCase):
+    def test_file_list_reads_the_cache_once(self):
+        files = [LeadFile(file=name) for name in ('leadfiles/photo.jpg', 'leadfiles/report.pdf', '')]
+        variant = 'thumbnails/ab/abcd_160x160.jpg'
+        cache.set(_cache_key('leadfiles/photo.jpg', THUMBNAIL_SIZE), variant)
+        cache.set(_cache_key('leadfiles/report.pdf', THUMBNAIL_SIZE), NO_PREVIEW)
+        with self.assertNumQueries(1):
+            urls = [file.thumbnail_url for file in with_thumbnails(files)]
+        self.assertEqual(urls, [default_storage.url(variant), static(PLACEHOLDER), static(PLACEHOLDER)])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.user, self.teammate, self.stranger = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('alice', 'amber', 'anton')
+        )
+        team = Team.objects.create(name='Team', created_by=self.user)
+        TeamMembership.objects.create(team=team, user=self.user)
+        TeamMembership.objects.create(team=team, user=self.teammate)
+        self.client.force_login(self.user)
+
+    def usernames(self, query):
+        response = self.client.get(reverse('core:autocomplete_users'), {'q': query})
+        return {User.objects.get(pk=result['id']).username for result in response.json()['results']}
+
+    def test_users_are_limited_to_teammates(self):
+        self.assertEqual(self.usernames('a'), {'alice', 'amber'})
+
+    def test_exact_username_finds_anyone(self):
+        self.assertEqual(self.usernames('Anton'), {'anton'})
+
+    def test_tampered_selection_renders(self):
+        form = TaskEditForm(data={'assigned_to': 'not-a-number'})
+        self.assertIn('name="assigned_to"', str(form['assigned_to']))
@@ -0,0 +1,167 @@
+"""
+Thumbnail and preview generation for uploaded files and profile pictures.
+
+Previews are rendered by a small background thread pool so uploads never wait
+on Pillow. Variants are written under ``MEDIA_ROOT/thumbnails`` keyed by the
+SHA-256 of the source content, so identical uploads share one thumbnail, and
+the ``source name -> variant`` mapping is kept in the Django cache. Until a
+variant exists, templates get a static placeholder. Lists of files look their
+variants up with one ``get_many`` (``thumbnail_urls``).
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = getattr(settings, 'THUMBNAIL_SIZE', (160, 160))
+AVATAR_SIZE = getattr(settings, 'AVATAR_SIZE', (200, 200))
+THUMBNAIL_DIR = 'thumbnails'
+PLACEHOLDER = 'images/empty.png'
+
+# Cached marker for sources Pillow cannot open (e.g. PDFs, office documents).
+NO_PREVIEW = ''
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+    thread_name_prefix='thumbnail',
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _cache_key(name, size):
+    return f'thumbnail:{size[0]}x{size[1]}:{name}'
+
+
+def content_hash(name):
+    """Stream the stored file through SHA-256 without loading it whole."""
+    digest = hashlib.sha256()
+    with default_storage.open(name, 'rb') as source:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def variant_name(digest, size):
+    return f'{THUMBNAIL_DIR}/{digest[:2]}/{digest}_{size[0]}x{size[1]}.jpg'
+
+
+def variant_digest(variant):
+    """Content digest a variant name (see ``variant_name``) was derived from."""
+    return variant.rsplit('/', 1)[-1].split('_', 1)[0]
+
+
+def source_digests(names, sizes=(THUMBNAIL_SIZE, AVATAR_SIZE), batch_size=500):
+    """
+    Yield the content digest of each stored file in ``names`` that may have a
+    thumbnail. Cached variant names give it for free; other files are hashed.
+    """
+    names = iter(names)
+    while batch := [name for _, name in zip(range(batch_size), names)]:
+        cached = cache.get_many([_cache_key(name, size) for name in batch for size in sizes])
+        for name in batch:
+            targets = [cached.get(_cache_key(name, size)) for size in sizes]
+            variants = [target for target in targets if target]
+            if variants:
+                yield variant_digest(variants[0])
+            elif all(target == NO_PREVIEW for target in targets):
+                continue
+            elif default_storage.exists(name):
+                yield content_hash(name)
+
+
+def generate_thumbnail(name, size=THUMBNAIL_SIZE):
+    """
+    Render the thumbnail for ``name`` and record it in the cache.
+
+    Returns the storage name of the variant, or ``NO_PREVIEW`` when the source
+    is not an image Pillow can decode.
+    """
+    target = variant_name(content_hash(name), size)
+
+    if not default_storage.exists(target):
+        try:
+            with default_storage.open(name, 'rb') as source:
+                image = Image.open(source)
+                # Multi-frame formats (TIFF, GIF, ICO) preview their first page.
+                image.seek(0)
+                # Let the JPEG decoder downscale while reading large photos.
+                image.draft('RGB', size)
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail(size)
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                buffer = BytesIO()
+                image.save(buffer, format='JPEG', quality=85, optimize=True)
+        except (UnidentifiedImageError, OSError):
+            cache.set(_cache_key(name, size), NO_PREVIEW, None)
+            return NO_PREVIEW
+
+        if not default_storage.exists(target):
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+
+    cache.set(_cache_key(name, size), target, None)
+    return target
+
+
+def _run(name, size, key):
+    try:
+        generate_thumbnail(name, size)
+    except Exception:
+        logger.exception('Thumbnail generation failed for %s', name)
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def schedule_thumbnail(name, size=THUMBNAIL_SIZE):
+    """Queue thumbnail generation for ``name`` unless it is already queued."""
+    if not name:
+        return
+    key = _cache_key(name, size)
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _executor.submit(_run, name, size, key)
+
+
+def _url(name, target, size):
+    if target is None:
+        schedule_thumbnail(name, size)
+        return static(PLACEHOLDER)
+    if target == NO_PREVIEW:
+        return static(PLACEHOLDER)
+    return default_storage.url(target)
+
+
+def thumbnail_url(field_file, size=THUMBNAIL_SIZE):
+    """
+    Return the URL of the thumbnail for ``field_file``.
+
+    Falls back to the placeholder (and queues generation) when the variant is
+    not ready yet.
+    """
+    if not field_file:
+        return static(PLACEHOLDER)
+    return _url(field_file.name, cache.get(_cache_key(field_file.name, size)), size)
+
+
+def thumbnail_urls(field_files, size=THUMBNAIL_SIZE):
+    """``thumbnail_url`` of each of ``field_files``, with one cache read for all of them."""
+    names = [field_file.name if field_file else '' for field_file in field_files]
+    cached = cache.get_many([_cache_key(name, size) for name in names if name])
+    return [
+        _url(name, cached.get(_cache_key(name, size)), size) if name else static(PLACEHOLDER)
+        for name in names
+    ]
@@ -32,4 +32,18 @@ urlpatterns += [
         views.project_team_remove,
         name="project_team_remove",
     ),
+    path("notifications/", views.NotificationListView.as_view(), name="notification_list"),
+    path("notifications/mark-read/", views.notifications_mark_read, name="notifications_mark_read"),
+    path("conversations/", views.ConversationListView.as_view(), name="conversation_list"),
+    path("conversations/add/", views.conversation_add, name="conversation_add"),
+    path("conversations/search/", views.message_search, name="message_search"),
+    path("conversations/<int:pk>/", views.ConversationDetailView.as_view(), name="conversation_detail"),
+    path("conversations/<int:pk>/post/", views.conversation_post, name="conversation_post"),
+    path("conversations/<int:pk>/read/", views.conversation_mark_read, name="conversation_mark_read"),
+    path("conversations/<int:pk>/since/", views.conversation_messages_since, name="conversation_messages_since"),
+    path("conversations/<int:pk>/stream/", views.conversation_stream, name="conversation_stream"),
+    path("autocomplete/users/", views.autocomplete_users, name="autocomplete_users"),
+    path("autocomplete/leads/", views.autocomplete_leads, name="autocomplete_leads"),
+    path("autocomplete/clients/", views.autocomplete_clients, name="autocomplete_clients"),
+    path("autocomplete/products/", views.autocomplete_products, name="autocomplete_products"),
 ]
\ No newline at end of file
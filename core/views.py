@@ -1,15 +1,36 @@
+import asyncio
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
-from django.http import Http404
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.views.generic import CreateView, DetailView, ListView, UpdateView, DeleteView
 
-from .forms import ProjectTeamAddForm, TeamForm, TeamMemberAddForm, ProjectForm
-from .models import Project, ProjectTeamAssignment, Team, TeamMembership
+from client.models import Client
+from lead.models import Lead
+from product.catalog import catalog
+from .access import granted_ids, visible_to
+from .forms import ConversationForm, ProjectTeamAddForm, TeamForm, TeamMemberAddForm, ProjectForm
+from .message_search import search_messages
+from .retention import search_archive
+from .messaging import (
+    MESSAGE_MAX_LENGTH, MESSAGE_REPLAY_LIMIT, get_broker, get_writer, mark_read, message_cursor,
+    message_history, message_payload, messages_since, unread_counts, visible_conversations,
+)
+from .models import Message, Notification, Project, ProjectTeamAssignment, Team, TeamMembership
+
+AUTOCOMPLETE_PAGE_SIZE = 10
 
 # Create your views here.
 def index(request):
@@ -56,7 +77,7 @@ class ProjectListView(LoginRequiredMixin, ListView):
     context_object_name = "projects"
 
     def get_queryset(self):
-        return Project.objects.filter(created_by=self.request.user).order_by("-created_at")
+        return visible_to(self.request.user, Project.objects.all()).order_by("-created_at")
 
 
 class TeamListView(LoginRequiredMixin, ListView):
@@ -205,10 +226,11 @@ class ProjectDetailView(LoginRequiredMixin, DetailView):
     context_object_name = "project"
 
     def get_queryset(self):
-        return Project.objects.filter(created_by=self.request.user)
+        return visible_to(self.request.user, Project.objects.all())
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        ctx["is_owner"] = self.object.created_by_id == self.request.user.id
 
         ctx["assigned_teams"] = (
             ProjectTeamAssignment.objects.select_related("team")
@@ -264,4 +286,332 @@ def project_team_remove(request, project_pk: int, assignment_pk: int):
     assignment.is_active = False
     assignment.save(update_fields=["is_active"])
     messages.success(request, "Team unassigned (deactivated).")
-    return redirect("core:project_detail", pk=project.pk)
\ No newline at end of file
+    return redirect("core:project_detail", pk=project.pk)
+
+
+class NotificationListView(LoginRequiredMixin, ListView):
+    model = Notification
+    template_name = "core/notifications/notification_list.html"
+    context_object_name = "notifications"
+    paginate_by = 20
+
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user)
+
+
+@login_required
+def notifications_mark_read(request):
+    if request.method != "POST":
+        raise Http404()
+
+    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    return redirect("core:notification_list")
+
+
+class ConversationListView(LoginRequiredMixin, ListView):
+    template_name = "core/conversations/conversation_list.html"
+    context_object_name = "conversations"
+    paginate_by = 20
+
+    def get_queryset(self):
+        return (
+            visible_conversations(self.request.user)
+            .select_related("team", "project")
+            .order_by("-created_at")
+        )
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["form"] = ConversationForm.for_user(self.request.user)
+        unread = unread_counts(self.request.user)
+        for conversation in ctx["conversations"]:
+            conversation.unread = unread.get(conversation.pk, 0)
+        return ctx
+
+
+@login_required
+def conversation_add(request):
+    if request.method != "POST":
+        raise Http404()
+
+    form = ConversationForm.for_user(request.user, request.POST)
+    if not form.is_valid():
+        messages.error(request, " ".join(form.non_field_errors()) or "Please correct the errors and try again.")
+        return redirect("core:conversation_list")
+
+    form.instance.created_by = request.user
+    conversation = form.save()
+    return redirect("core:conversation_detail", pk=conversation.pk)
+
+
+class ConversationDetailView(LoginRequiredMixin, DetailView):
+    template_name = "core/conversations/conversation_detail.html"
+    context_object_name = "conversation"
+
+    def get_queryset(self):
+        return visible_conversations(self.request.user).select_related("team", "project")
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        before = self.request.GET.get("before")
+        try:
+            ctx["chat_messages"], ctx["older_cursor"] = message_history(self.object.pk, before)
+        except ValueError:
+            raise Http404("Invalid cursor")
+        ctx["is_latest_page"] = not before
+        ctx["latest_cursor"] = message_cursor(ctx["chat_messages"][-1]) if ctx["chat_messages"] else ""
+        if ctx["is_latest_page"] and ctx["latest_cursor"]:
+            mark_read(self.request.user, self.object.pk, ctx["latest_cursor"])
+        ctx["max_length"] = MESSAGE_MAX_LENGTH
+        return ctx
+
+
+async def conversation_post(request, pk):
+    """
+    Post a message; answers with the stored message as JSON.
+
+    The message is saved by the shared ``MessageWriter`` together with the
+    others posted at about the same time, and reaches the open streams of the
+    conversation through the broker.
+    """
+    if request.method != "POST":
+        raise Http404()
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    visible = await sync_to_async(visible_conversations(request.user).filter(pk=pk).exists)()
+    if not visible:
+        raise Http404()
+
+    body = request.POST.get("body", "").strip()
+    if not body:
+        return JsonResponse({"error": "Message is empty"}, status=400)
+    if len(body) > MESSAGE_MAX_LENGTH:
+        return JsonResponse({"error": f"Messages are limited to {MESSAGE_MAX_LENGTH} characters"}, status=400)
+
+    message = Message(conversation_id=pk, sender=request.user, body=body)
+    await asyncio.wrap_future(get_writer().submit(message))
+    return JsonResponse(message_payload(message), status=201)
+
+
+@login_required
+def conversation_messages_since(request, pk):
+    """JSON list of the messages after ``?since=`` (polling fallback of the stream)."""
+    conversation = get_object_or_404(visible_conversations(request.user).only("id"), pk=pk)
+    try:
+        payloads = messages_since(conversation.pk, request.GET.get("since"))
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return JsonResponse({
+        "messages": payloads[:MESSAGE_REPLAY_LIMIT],
+        "reload": len(payloads) > MESSAGE_REPLAY_LIMIT,
+    })
+
+
+@login_required
+def message_search(request):
+    """Full-text search over the messages of the user's conversations (or their archive)."""
+    query = request.GET.get("q", "").strip()
+    cursor = request.GET.get("cursor")
+    archive = request.GET.get("archive") == "1"
+    results, next_cursor = [], None
+    if query:
+        try:
+            search = search_archive if archive else search_messages
+            results, next_cursor = search(request.user, query, cursor)
+        except ValueError:
+            raise Http404("Invalid cursor")
+    return render(request, "core/conversations/message_search.html", {
+        "query": query,
+        "archive": archive,
+        "results": results,
+        "next_cursor": next_cursor,
+        "is_first_page": not cursor,
+    })
+
+
+@login_required
+def conversation_mark_read(request, pk):
+    """Move the user's read cursor to ``cursor`` (the newest message the page shows)."""
+    if request.method != "POST":
+        raise Http404()
+
+    conversation = get_object_or_404(visible_conversations(request.user).only("id"), pk=pk)
+    try:
+        state = mark_read(request.user, conversation.pk, request.POST.get("cursor", ""))
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return JsonResponse({"unread": state.unread_count})
+
+
+MESSAGE_STREAM_KEEPALIVE_SECONDS = 15
+# Streams are recycled (EventSource reconnects with Last-Event-ID), which also
+# bounds how long a stream of a vanished client can linger.
+MESSAGE_STREAM_MAX_SECONDS = 300
+# Stream setups that may use a database connection at the same time per event
+# loop, so a burst of (re)connecting pages cannot exhaust the server's slots.
+MESSAGE_STREAM_SETUP_CONCURRENCY = 8
+_stream_setup_slots = weakref.WeakKeyDictionary()
+
+
+def _message_event(payload):
+    return f"id: {payload['cursor']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
+
+
+def _open_conversation_stream(request, pk):
+    """
+    The database side of ``conversation_stream``: ``(error_response,
+    subscription, backlog)``. It runs in one thread and closes that thread's
+    connection at the end, so open streams do not hold database connections.
+    """
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Unauthorized"}, status=403), None, None
+        if not visible_conversations(request.user).filter(pk=pk).exists():
+            raise Http404()
+
+        since = request.headers.get("Last-Event-ID") or request.GET.get("since")
+        broker = get_broker()
+        # Subscribe before reading the gap, so nothing falls between the two.
+        subscription = broker.subscribe(pk)
+        try:
+            # An empty ``?since=`` comes from a page that had no messages yet.
+            backlog = messages_since(pk, since or None) if since is not None else []
+        except ValueError:
+            broker.unsubscribe(subscription)
+            return JsonResponse({"error": "Invalid cursor"}, status=400), None, None
+        return None, subscription, backlog
+    finally:
+        connections.close_all()
+
+
+async def conversation_stream(request, pk):
+    """
+    Server-Sent Events stream of the new messages of one conversation.
+
+    Messages arrive from the broker, so an open stream runs no queries. On
+    (re)connect, messages after ``Last-Event-ID`` (or ``?since=``) are read
+    from the database before the live ones. Like the task comment stream it
+    needs an ASGI server and answers 204 otherwise; the page then polls
+    ``conversation_messages_since``.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    loop = asyncio.get_running_loop()
+    slots = _stream_setup_slots.setdefault(loop, asyncio.Semaphore(MESSAGE_STREAM_SETUP_CONCURRENCY))
+    async with slots:
+        error, subscription, backlog = await sync_to_async(_open_conversation_stream)(request, pk)
+    if error is not None:
+        return error
+    broker = get_broker()
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MESSAGE_STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            if len(backlog) > MESSAGE_REPLAY_LIMIT:
+                yield "event: reload\ndata: {}\n\n"
+                return
+            replayed = set()
+            for payload in backlog:
+                replayed.add(payload["id"])
+                yield _message_event(payload)
+            while loop.time() < deadline:
+                payload = await subscription.get(min(MESSAGE_STREAM_KEEPALIVE_SECONDS, deadline - loop.time()))
+                if subscription.dropped:
+                    # Too slow to keep up: the page reconnects and catches up from its cursor.
+                    return
+                if payload is None:
+                    yield ": keepalive\n\n"
+                elif payload["id"] not in replayed:
+                    yield _message_event(payload)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingHttpResponse(
+        events(),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Autocomplete endpoints used by core.widgets.AutocompleteSelect
+def autocomplete_response(request, queryset, search_fields, label):
+    """
+    Prefix-search ``queryset`` on ``search_fields`` and return one small page.
+
+    ``istartswith`` compiles to ``UPPER(col) LIKE 'Q%'`` on PostgreSQL, which
+    the ``text_pattern_ops`` indexes on the searched columns can answer.
+    """
+    query = request.GET.get('q', '').strip()
+    if query:
+        condition = Q()
+        for field in search_fields:
+            condition |= Q(**{f'{field}__istartswith': query})
+        queryset = queryset.filter(condition)
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+
+    # Fetch one extra row to know whether there is a next page without COUNT(*).
+    rows = list(queryset[offset:offset + AUTOCOMPLETE_PAGE_SIZE + 1])
+    return JsonResponse({
+        'results': [{'id': obj.pk, 'text': label(obj)} for obj in rows[:AUTOCOMPLETE_PAGE_SIZE]],
+        'more': len(rows) > AUTOCOMPLETE_PAGE_SIZE,
+    })
+
+
+@login_required
+def autocomplete_users(request):
+    """
+    Teammates of the user (members of the teams they can see) by prefix;
+    anyone else only by exact username, e.g. to add them to a team.
+    """
+    teammates = TeamMembership.objects.filter(team_id__in=granted_ids(request.user, Team), is_active=True)
+    visible = Q(pk=request.user.pk) | Q(pk__in=teammates.values("user_id"))
+    query = request.GET.get("q", "").strip()
+    if query:
+        visible |= Q(username__iexact=query)
+    users = User.objects.filter(visible, is_active=True).only('username', 'first_name', 'last_name')
+    return autocomplete_response(
+        request, users.order_by(Upper('username')), ['username'],
+        lambda user: user.get_full_name() or user.username,
+    )
+
+
+@login_required
+def autocomplete_leads(request):
+    leads = visible_to(request.user, Lead.objects.all()).only('first_name', 'last_name', 'company')
+    return autocomplete_response(
+        request, leads.order_by(Upper('last_name'), 'pk'), ['last_name', 'company'], str,
+    )
+
+
+@login_required
+def autocomplete_clients(request):
+    clients = visible_to(request.user, Client.objects.all()).only('first_name', 'last_name', 'company')
+    return autocomplete_response(
+        request, clients.order_by(Upper('last_name'), 'pk'), ['last_name', 'company'], str,
+    )
+
+
+@login_required
+def autocomplete_products(request):
+    """Served from the in-process product catalog instead of the database."""
+    products = catalog.search(request.GET.get('q', '').strip())
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+    return JsonResponse({
+        'results': [
+            {'id': product.pk, 'text': product.label}
+            for product in products[offset:offset + AUTOCOMPLETE_PAGE_SIZE]
+        ],
+        'more': len(products) > offset + AUTOCOMPLETE_PAGE_SIZE,
+    })
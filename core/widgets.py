@@ -0,0 +1,49 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select widget fed by a JSON search endpoint instead of the full queryset.
+
+    Only the currently selected option is rendered; static/js/autocomplete.js
+    fills in matches as the user types, so rendering the form costs one
+    primary-key lookup however large the table is.
+    """
+
+    def __init__(self, url_name, attrs=None):
+        attrs = {'class': 'form-select', **(attrs or {})}
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse_lazy(self.url_name)
+        return context
+
+    def _selected_keys(self, iterator, value):
+        # Submitted values are untrusted: skip any the key field cannot parse.
+        key = iterator.field.to_field_name or 'pk'
+        field = iterator.queryset.model._meta.get_field(key) if key != 'pk' else iterator.queryset.model._meta.pk
+        keys = []
+        for item in value:
+            if item in ('', None):
+                continue
+            try:
+                keys.append(field.to_python(item))
+            except ValidationError:
+                continue
+        return key, keys
+
+    def optgroups(self, name, value, attrs=None):
+        iterator = self.choices
+        key, selected = self._selected_keys(iterator, value)
+        choices = [('', getattr(iterator.field, 'empty_label', None) or '---------')]
+        if selected:
+            choices += [iterator.choice(obj) for obj in iterator.queryset.filter(**{f'{key}__in': selected})]
+        self.choices = choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
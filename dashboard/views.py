@@ -4,7 +4,7 @@ from django.db.models import Count, Sum, F
 from django.db.models.functions import TruncDate
 from lead.models import Lead
 from client.models import Client, Purchase
-from product.models import Product
+from product.catalog import catalog
 from datetime import timedelta
 from django.utils import timezone
 import json
@@ -187,21 +187,24 @@ def dashboard(request):
     purchase_data = (
         purchases_query
         .annotate(date=TruncDate('created_at'))
-        .values('date', 'product__name', 'product_id')
+        .values('date', 'product_id')
         .annotate(
             total_quantity=Sum('quantity'),
-            total_amount=Sum(F('quantity') * F('product__net_price'))
+            total_amount=Sum(F('quantity') * F('unit_price'))
         )
-        .order_by('date', 'product__name')
+        .order_by('date', 'product_id')
     )
 
     # Organize data by product
     purchase_products = {}
     purchase_dates_set = set()
 
+    # Names come from the catalog, so the query never joins product_product
+    products = catalog.by_id()
     for item in purchase_data:
         date_str = item['date'].strftime('%Y-%m-%d')
-        product_name = item['product__name']
+        product = products.get(item['product_id'])
+        product_name = product.name if product else f"Product #{item['product_id']}"
         purchase_dates_set.add(date_str)
 
         if product_name not in purchase_products:
@@ -211,12 +214,12 @@ def dashboard(request):
         purchase_products[product_name]['quantities'].append(item['total_quantity'])
         purchase_products[product_name]['amounts'].append(float(item['total_amount']))
 
-    # Get all products for filter dropdown
-    all_products = Product.objects.all().order_by('name')
+    # Products for the filter dropdown, from the in-process catalog
+    all_products = catalog.all()
 
     # Calculate summary statistics
     total_revenue = purchases_query.aggregate(
-        total=Sum(F('quantity') * F('product__net_price'))
+        total=Sum(F('quantity') * F('unit_price'))
     )['total'] or 0
     total_items = purchases_query.aggregate(Sum('quantity'))['quantity__sum'] or 0
 
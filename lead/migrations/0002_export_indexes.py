@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_by', 'modified_at'], name='lead_lead_created_fc3d5f_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Prefix-search indexes for the autocomplete endpoints. On PostgreSQL
+    ``istartswith`` compiles to ``UPPER(col::text) LIKE 'Q%'``, which only a
+    ``text_pattern_ops`` index on the same expression can answer.
+    """
+
+    dependencies = [
+        ('lead', '0002_export_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS lead_owner_last_name_prefix ON lead_lead (created_by_id, (UPPER(last_name::text)) text_pattern_ops);',
+            reverse_sql='DROP INDEX IF EXISTS lead_owner_last_name_prefix;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS lead_owner_company_prefix ON lead_lead (created_by_id, (UPPER(company::text)) text_pattern_ops);',
+            reverse_sql='DROP INDEX IF EXISTS lead_owner_company_prefix;',
+        ),
+    ]
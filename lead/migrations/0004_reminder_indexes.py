@@ -0,0 +1,21 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lead', '0003_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['due_date', 'due_time'], name='lead_lead_due_dat_b31044_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['modified_at'], name='lead_lead_modifie_04e94e_idx'),
+        ),
+    ]
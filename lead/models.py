@@ -58,6 +58,12 @@ class Lead(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'modified_at']),
+            # Reminder scheduler: due-window scans and the change feed.
+            models.Index(fields=['due_date', 'due_time']),
+            models.Index(fields=['modified_at']),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -1,10 +1,8 @@
-import csv
-
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponseForbidden
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
@@ -12,6 +10,9 @@ from django.views import View
 from django.db.models import Q
 
 from client.models import Client
+from core.access import visible_to
+from core.exports import ExportColumn, export_response
+from core.thumbnails import schedule_thumbnail
 from task.models import Task
 from .models import Lead, Comment, LeadFile
 from .forms import AddCommentForm, AddFileForm
@@ -25,7 +26,7 @@ class LeadListView(ListView):
 
     def get_queryset(self):
         queryset = super(LeadListView, self).get_queryset()
-        queryset = queryset.filter(created_by=self.request.user, converted_to_client=False)
+        queryset = visible_to(self.request.user, queryset).filter(converted_to_client=False)
 
         query = self.request.GET.get('q')
         if query:
@@ -64,12 +65,13 @@ class LeadDetailView(LoginRequiredMixin, DetailView):
         context['comments'] = comments_page
         context['tasks'] = tasks_page
         context['files'] = files_page
+        context['is_owner'] = self.object.created_by_id == self.request.user.id
 
         return context
 
     def get_queryset(self):
         queryset = super(LeadDetailView, self).get_queryset()
-        return queryset.filter(created_by=self.request.user, pk=self.kwargs.get('pk'))
+        return visible_to(self.request.user, queryset).filter(pk=self.kwargs.get('pk'))
 
 
 # Comment view
@@ -103,6 +105,7 @@ class AddFileView(LoginRequiredMixin, View):
             file.lead_id = pk
             file.created_by = request.user
             file.save()
+            schedule_thumbnail(file.file.name)
 
         return redirect('lead:detail', pk=pk)
 
@@ -157,24 +160,27 @@ class LeadUpdateView(LoginRequiredMixin, UpdateView):
         return queryset.filter(created_by=self.request.user, pk=self.kwargs.get('pk'))
 
 
-# Export leads in csv
-@login_required
-def leads_export(request):
-    leads = Lead.objects.filter(created_by=request.user)
+# Export leads (csv, gzipped ndjson or parquet)
+LEAD_EXPORT_COLUMNS = [
+    ExportColumn('last_name', 'Last name'),
+    ExportColumn('first_name', 'First name'),
+    ExportColumn('phone', 'Phone'),
+    ExportColumn('email', 'Email'),
+    ExportColumn('description', 'Description'),
+    ExportColumn('created_at', 'Created at'),
+    ExportColumn('created_by', 'Created by', 'created_by__username'),
+    ExportColumn('company', 'Company'),
+    ExportColumn('status', 'Status'),
+    ExportColumn('priority', 'Priority'),
+    ExportColumn('modified_at', 'Modified at'),
+    ExportColumn('id', 'ID'),
+]
 
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="leads.csv"'},
-    )
 
-    writer = csv.writer(response)
-    writer.writerow(['Last name', 'First name', 'Phone', 'Email', 'Description', 'Created at', 'Created by'])
-
-    for lead in leads:
-        writer.writerow([lead.last_name, lead.first_name, lead.phone, lead.email, lead.description,
-                         lead.created_at, lead.created_by])
-
-    return response
+@login_required
+def leads_export(request):
+    leads = visible_to(request.user, Lead.objects.all())
+    return export_response(request, leads, LEAD_EXPORT_COLUMNS, 'leads', 'modified_at')
 
 
 # Bulk delete leads
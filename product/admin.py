@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import F, Sum
 from .models import Product
 
 class ProductAdmin(admin.ModelAdmin):
@@ -7,12 +8,18 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     readonly_fields = ('sold_quantity',)  # Make sold_quantity read-only
 
+    def get_queryset(self, request):
+        # Revenue per product in the list query instead of one query per row
+        return super().get_queryset(request).annotate(
+            revenue=Sum(F('purchases__quantity') * F('purchases__unit_price'))
+        )
+
     def total_price_display(self, obj):
         """Display total price in admin list"""
-        return f"${obj.get_total_price():.2f}"
+        return f"${obj.revenue or 0:.2f}"
 
     total_price_display.short_description = 'Total Price'
-    total_price_display.admin_order_field = 'net_price'  # Allow sorting by net_price
+    total_price_display.admin_order_field = 'revenue'
 
 
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+
+    def ready(self):
+        # Keep sales caches, the catalog and leaderboards in step with products and purchases.
+        from . import signals  # noqa: F401
@@ -0,0 +1,135 @@
+"""
+In-process product catalog.
+
+Product names, prices and descriptions change rarely but are read on most
+pages (dropdowns, the product list, the product autocomplete). Each worker
+process keeps a snapshot of them: a tuple of small slotted objects sorted by
+name, plus an id index and the upper-cased names for prefix search.
+
+The snapshot is tagged with a global version number kept under
+``CATALOG_VERSION_KEY`` in the default cache. Saving or deleting a product
+bumps the version (``product/signals.py``), and every worker reloads lazily
+on its next read that sees a new version. The version itself is only read
+once per ``PRODUCT_CATALOG_CHECK_INTERVAL`` seconds per worker (a primary-key
+lookup with the database cache), so most reads cost no query at all and a
+bump reaches other workers within that interval. Views that look up many
+products take the id map once (``by_id``) rather than calling ``get`` in a
+loop.
+
+The version has to live in a cache that all workers share; the settings use
+the database cache (Redis or Memcached work too). With a per-process cache
+such as locmem, other workers never see the bump, so snapshots are also
+reloaded after ``PRODUCT_CATALOG_MAX_AGE`` seconds.
+
+Sales counters (``sold_quantity``) change with every purchase and are not
+part of the catalog.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+CATALOG_VERSION_KEY = 'product-catalog:version'
+CATALOG_MAX_AGE = getattr(settings, 'PRODUCT_CATALOG_MAX_AGE', 300)
+CATALOG_CHECK_INTERVAL = getattr(settings, 'PRODUCT_CATALOG_CHECK_INTERVAL', 1.0)
+
+
+class CatalogProduct:
+    __slots__ = ('id', 'name', 'net_price', 'description')
+
+    def __init__(self, id, name, net_price, description):
+        self.id = id
+        self.name = name
+        self.net_price = net_price
+        self.description = description
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def label(self):
+        return f"{self.name} - ${self.net_price}"
+
+    def __str__(self):
+        return self.name
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # No version yet (or it was evicted): any new value invalidates snapshots.
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def _current_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+class ProductCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = float('-inf')
+        # (products, products by id, upper-cased names), replaced as a whole.
+        self._state = ((), {}, [])
+
+    def _snapshot(self):
+        now = time.monotonic()
+        if now - self._checked_at < CATALOG_CHECK_INTERVAL and now - self._loaded_at <= CATALOG_MAX_AGE:
+            return self._state
+        version = _current_version()
+        self._checked_at = now
+        if version != self._version or now - self._loaded_at > CATALOG_MAX_AGE:
+            with self._lock:
+                if version != self._version or time.monotonic() - self._loaded_at > CATALOG_MAX_AGE:
+                    self._load(version)
+        return self._state
+
+    def _load(self, version):
+        rows = Product.objects.values_list('id', 'name', 'net_price', 'description')
+        products = sorted(
+            (CatalogProduct(*row) for row in rows), key=lambda product: (product.name.upper(), product.id),
+        )
+        # One assignment, so readers see either the old or the new snapshot.
+        self._state = (
+            tuple(products),
+            {product.id: product for product in products},
+            [product.name.upper() for product in products],
+        )
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def all(self):
+        """Every product, sorted by name."""
+        return self._snapshot()[0]
+
+    def get(self, pk):
+        return self._snapshot()[1].get(pk)
+
+    def by_id(self):
+        """``{id: product}`` of one snapshot, for views that look up many products."""
+        return self._snapshot()[1]
+
+    def search(self, prefix):
+        """Products whose name starts with ``prefix`` (case-insensitive), sorted by name."""
+        products, _, keys = self._snapshot()
+        prefix = prefix.upper()
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return products[start:end]
+
+
+catalog = ProductCatalog()
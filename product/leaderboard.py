@@ -0,0 +1,167 @@
+"""
+Product sales leaderboards.
+
+``ProductSalesPeriod`` holds one row per product and day, week, month or
+year, with the quantity sold and the revenue. Rankings read that small table
+through its ``(period, period_start, -revenue|-quantity)`` indexes and never
+aggregate ``client_purchase``: ``top_products`` takes the top rows of the
+current week, month or year straight off an index. Growth compares the
+current period with the same elapsed part of the previous one, summed from
+the daily rows.
+
+The rows are maintained incrementally:
+
+- A new purchase adds its quantity and revenue to the four periods of its
+  (local) date. A deleted purchase subtracts them. Both are hooked up in
+  ``product/signals.py``.
+- Editing a purchase is not tracked, and neither are bulk writes that skip
+  signals. ``manage.py rebuild_sales_leaderboards`` recomputes every row from
+  the purchases and can run periodically as a safety net.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from client.models import Purchase
+from .models import ProductSalesPeriod
+
+# Ranked periods; days only feed the growth comparison.
+PERIODS = (ProductSalesPeriod.WEEK, ProductSalesPeriod.MONTH, ProductSalesPeriod.YEAR)
+_TRUNC = {
+    ProductSalesPeriod.DAY: TruncDate,
+    ProductSalesPeriod.WEEK: TruncWeek,
+    ProductSalesPeriod.MONTH: TruncMonth,
+    ProductSalesPeriod.YEAR: TruncYear,
+}
+REBUILD_BATCH_SIZE = 1000
+
+
+def period_start(period, day):
+    if period == ProductSalesPeriod.DAY:
+        return day
+    if period == ProductSalesPeriod.WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == ProductSalesPeriod.MONTH:
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def previous_period_start(period, start):
+    if period == ProductSalesPeriod.WEEK:
+        return start - timedelta(days=7)
+    if period == ProductSalesPeriod.MONTH:
+        return (start - timedelta(days=1)).replace(day=1)
+    return start.replace(year=start.year - 1)
+
+
+def record_purchase(purchase, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) ``purchase`` in each of its periods."""
+    day = timezone.localdate(purchase.created_at)
+    quantity = sign * purchase.quantity
+    revenue = quantity * purchase.unit_price
+    with transaction.atomic():
+        for period in _TRUNC:
+            rows = ProductSalesPeriod.objects.filter(
+                product_id=purchase.product_id, period=period, period_start=period_start(period, day),
+            )
+            updated = rows.update(quantity=F('quantity') + quantity, revenue=F('revenue') + revenue)
+            # Only additions create rows; a removal whose row is gone (the
+            # product is being deleted) has nothing left to adjust.
+            if not updated and sign > 0:
+                row, created = ProductSalesPeriod.objects.get_or_create(
+                    product_id=purchase.product_id, period=period, period_start=period_start(period, day),
+                    defaults={'quantity': quantity, 'revenue': revenue},
+                )
+                if not created:
+                    rows.update(quantity=F('quantity') + quantity, revenue=F('revenue') + revenue)
+
+
+def rebuild_leaderboards():
+    """Recompute every period row from the purchases; returns the number of rows."""
+    line_total = ExpressionWrapper(
+        F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    count = 0
+    with transaction.atomic():
+        ProductSalesPeriod.objects.all().delete()
+        for period, trunc in _TRUNC.items():
+            totals = (
+                Purchase.objects.order_by()
+                .annotate(start=trunc('created_at', output_field=DateField()))
+                .values('product_id', 'start')
+                .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(line_total))
+            )
+            batch = []
+            for row in totals.iterator(chunk_size=REBUILD_BATCH_SIZE):
+                batch.append(ProductSalesPeriod(
+                    product_id=row['product_id'], period=period, period_start=row['start'],
+                    quantity=row['total_quantity'], revenue=row['total_revenue'],
+                ))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    count += len(ProductSalesPeriod.objects.bulk_create(batch))
+                    batch = []
+            count += len(ProductSalesPeriod.objects.bulk_create(batch))
+    return count
+
+
+def top_products(period, by='revenue', limit=10, day=None):
+    """The ``limit`` best sellers of the current ``period`` by ``revenue`` or ``quantity``."""
+    start = period_start(period, day or timezone.localdate())
+    return list(
+        # Rows of products whose purchases were all deleted stay at zero.
+        ProductSalesPeriod.objects.filter(period=period, period_start=start, **{f'{by}__gt': 0})
+        .order_by(f'-{by}', 'product_id')
+        .values('product_id', 'quantity', 'revenue')[:limit]
+    )
+
+
+def period_standings(period, day=None):
+    """
+    ``{product_id: {...}}`` with this period's quantity and revenue, the
+    previous period's revenue up to the same point (``day`` is the 10th of
+    the month: the 1st to the 10th of last month) and the growth between
+    them.
+    """
+    day = day or timezone.localdate()
+    start = period_start(period, day)
+    previous = previous_period_start(period, start)
+    # A shorter previous month or year ends before the same offset.
+    previous_end = min(previous + (day - start), start - timedelta(days=1))
+    standings = {}
+    rows = ProductSalesPeriod.objects.filter(period=period, period_start=start).values_list(
+        'product_id', 'quantity', 'revenue',
+    )
+    for product_id, quantity, revenue in rows:
+        standings[product_id] = {'quantity': quantity, 'revenue': revenue, 'previous_revenue': 0}
+    previous_rows = (
+        ProductSalesPeriod.objects.filter(
+            period=ProductSalesPeriod.DAY, period_start__range=(previous, previous_end),
+        )
+        .order_by().values('product_id').annotate(total_revenue=Sum('revenue'))
+        .values_list('product_id', 'total_revenue')
+    )
+    for product_id, revenue in previous_rows:
+        entry = standings.setdefault(product_id, {'quantity': 0, 'revenue': 0, 'previous_revenue': 0})
+        entry['previous_revenue'] = revenue
+    for entry in standings.values():
+        entry['growth'] = entry['revenue'] - entry['previous_revenue']
+    return standings
+
+
+def fastest_growing(period, limit=5, day=None):
+    """``(product_id, entry)`` pairs with the largest revenue growth over the same part of the previous period."""
+    standings = period_standings(period, day)
+    ranked = sorted(standings.items(), key=lambda item: (-item[1]['growth'], item[0]))
+    return [item for item in ranked if item[1]['growth'] > 0][:limit]
+
+
+def all_time_totals():
+    """``{product_id: (quantity, revenue)}`` summed over the yearly rows."""
+    rows = (
+        ProductSalesPeriod.objects.filter(period=ProductSalesPeriod.YEAR).order_by()
+        .values('product_id').annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+    )
+    return {row['product_id']: (row['total_quantity'], row['total_revenue']) for row in rows}
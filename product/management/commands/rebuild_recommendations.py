@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from product.recommendations import RECOMMENDATION_NEIGHBOURS, rebuild_affinities
+
+
+class Command(BaseCommand):
+    help = 'Recompute the co-purchase table behind the product suggestions from the purchases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int, default=RECOMMENDATION_NEIGHBOURS,
+            help='Related products kept per product.',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_affinities(options['neighbours'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product affinities.'))
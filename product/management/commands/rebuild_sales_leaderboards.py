@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from product.leaderboard import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily, weekly, monthly and yearly product sales totals from the purchases.'
+
+    def handle(self, *args, **options):
+        count = rebuild_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product sales periods.'))
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Prefix-search indexes for the autocomplete endpoints. On PostgreSQL
+    ``istartswith`` compiles to ``UPPER(col::text) LIKE 'Q%'``, which only a
+    ``text_pattern_ops`` index on the same expression can answer.
+    """
+
+    dependencies = [
+        ('product', '0006_remove_product_quantity'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS product_name_prefix ON product_product ((UPPER(name::text)) text_pattern_ops);',
+            reverse_sql='DROP INDEX IF EXISTS product_name_prefix;',
+        ),
+    ]
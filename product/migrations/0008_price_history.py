@@ -0,0 +1,34 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('net_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='product.product')),
+            ],
+            options={
+                'ordering': ['-valid_from'],
+                'indexes': [models.Index(fields=['product', '-valid_from'], name='product_price_asof_idx')],
+            },
+        ),
+        # No history exists yet: the current price is taken to have always applied.
+        migrations.RunSQL(
+            "INSERT INTO product_productprice (product_id, net_price, valid_from) "
+            "SELECT id, net_price, TIMESTAMPTZ '1970-01-01 00:00:00+00' FROM product_product",
+            migrations.RunSQL.noop,
+        ),
+    ]
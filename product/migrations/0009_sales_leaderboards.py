@@ -0,0 +1,59 @@
+# Generated by Django 4.2.24 on 2026-10-19 11:55
+
+from django.db import migrations, models
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+import django.db.models.deletion
+
+
+def backfill_periods(apps, schema_editor):
+    Purchase = apps.get_model('client', 'Purchase')
+    ProductSalesPeriod = apps.get_model('product', 'ProductSalesPeriod')
+    line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    for period, trunc in (('week', TruncWeek), ('month', TruncMonth), ('year', TruncYear)):
+        totals = (
+            Purchase.objects.order_by()
+            .annotate(start=trunc('created_at', output_field=DateField()))
+            .values('product_id', 'start')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(line_total))
+        )
+        ProductSalesPeriod.objects.bulk_create(
+            (
+                ProductSalesPeriod(
+                    product_id=row['product_id'], period=period, period_start=row['start'],
+                    quantity=row['total_quantity'], revenue=row['total_revenue'],
+                )
+                for row in totals.iterator(chunk_size=1000)
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_price_history'),
+        ('client', '0010_purchase_unit_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_periods', to='product.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start', '-revenue'], name='product_sales_revenue_idx'), models.Index(fields=['period', 'period_start', '-quantity'], name='product_sales_quantity_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productsalesperiod',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'product'), name='unique_product_sales_period'),
+        ),
+        migrations.RunPython(backfill_periods, migrations.RunPython.noop),
+    ]
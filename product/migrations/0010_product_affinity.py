@@ -0,0 +1,60 @@
+# Generated by Django 4.2.24 on 2026-10-19 12:10
+
+from django.db import migrations, models
+from django.db.models import Count, F
+import django.db.models.deletion
+
+
+def backfill_affinities(apps, schema_editor):
+    Purchase = apps.get_model('client', 'Purchase')
+    ProductAffinity = apps.get_model('product', 'ProductAffinity')
+    pairs = (
+        Purchase.objects
+        .annotate(related_id=F('client__purchases__product_id'))
+        .exclude(related_id=F('product_id'))
+        .values('product_id', 'related_id')
+        .annotate(clients=Count('client_id', distinct=True))
+        .order_by('product_id', '-clients', 'related_id')
+        .values_list('product_id', 'related_id', 'clients')
+    )
+    batch = []
+    current, kept = None, 0
+    for product_id, related_id, clients in pairs.iterator(chunk_size=1000):
+        if product_id != current:
+            current, kept = product_id, 0
+        if kept >= 50:
+            continue
+        kept += 1
+        batch.append(ProductAffinity(product_id=product_id, related_id=related_id, clients=clients))
+        if len(batch) >= 1000:
+            ProductAffinity.objects.bulk_create(batch)
+            batch = []
+    ProductAffinity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_sales_leaderboards'),
+        ('client', '0010_purchase_unit_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clients', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to='product.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-clients'], include=('related',), name='product_affinity_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productaffinity',
+            constraint=models.UniqueConstraint(fields=('product', 'related'), name='unique_product_affinity'),
+        ),
+        migrations.RunPython(backfill_affinities, migrations.RunPython.noop),
+    ]
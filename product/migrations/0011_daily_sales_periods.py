@@ -0,0 +1,47 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:55
+
+from django.db import migrations, models
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_days(apps, schema_editor):
+    Purchase = apps.get_model('client', 'Purchase')
+    ProductSalesPeriod = apps.get_model('product', 'ProductSalesPeriod')
+    line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    totals = (
+        Purchase.objects.order_by()
+        .annotate(start=TruncDate('created_at', output_field=DateField()))
+        .values('product_id', 'start')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(line_total))
+    )
+    ProductSalesPeriod.objects.bulk_create(
+        (
+            ProductSalesPeriod(
+                product_id=row['product_id'], period='day', period_start=row['start'],
+                quantity=row['total_quantity'], revenue=row['total_revenue'],
+            )
+            for row in totals.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+def drop_days(apps, schema_editor):
+    apps.get_model('product', 'ProductSalesPeriod').objects.filter(period='day').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_product_affinity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productsalesperiod',
+            name='period',
+            field=models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10),
+        ),
+        migrations.RunPython(backfill_days, drop_days),
+    ]
@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
+
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
@@ -7,8 +11,101 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
 
     def get_total_price(self):
-        """Calculate total price based on net price and sold quantity"""
-        return self.net_price * self.sold_quantity
+        """Revenue from this product's purchases, at the prices they were sold for"""
+        total = self.purchases.aggregate(
+            total=models.Sum(models.F('quantity') * models.F('unit_price'))
+        )['total']
+        return total or 0
+
+    def price_at(self, moment):
+        """Net price in effect at ``moment`` (one indexed lookup in the price history)."""
+        price = (
+            self.price_history.filter(valid_from__lte=moment)
+            .order_by('-valid_from').values_list('net_price', flat=True).first()
+        )
+        return self.net_price if price is None else price
+
+    def save(self, *args, **kwargs):
+        # Record a price history entry whenever the net price changes.
+        if self.pk:
+            previous = Product.objects.filter(pk=self.pk).values_list('net_price', flat=True).first()
+        else:
+            previous = None
+        super().save(*args, **kwargs)
+        if previous is None or previous != Decimal(str(self.net_price)):
+            ProductPrice.objects.create(product=self, net_price=self.net_price)
+
+    def __str__(self):
+        return self.name
+
+
+# Net price of a product from valid_from until the next entry
+class ProductPrice(models.Model):
+    product = models.ForeignKey(Product, related_name='price_history', on_delete=models.CASCADE)
+    net_price = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-valid_from']
+        indexes = [
+            # As-of lookups: latest entry at or before a moment.
+            models.Index(fields=['product', '-valid_from'], name='product_price_asof_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product} - {self.net_price} from {self.valid_from:%Y-%m-%d %H:%M}'
+
+
+# Sales of a product in one week, month or year (see product/leaderboard.py)
+class ProductSalesPeriod(models.Model):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    YEAR = 'year'
+
+    # Days are not ranked; they give the part of a period elapsed so far.
+    PERIOD_CHOICES = (
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+        (YEAR, 'Year'),
+    )
+
+    product = models.ForeignKey(Product, related_name='sales_periods', on_delete=models.CASCADE)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'product'], name='unique_product_sales_period'),
+        ]
+        indexes = [
+            # Top-k of one period by revenue or by quantity.
+            models.Index(fields=['period', 'period_start', '-revenue'], name='product_sales_revenue_idx'),
+            models.Index(fields=['period', 'period_start', '-quantity'], name='product_sales_quantity_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product} - {self.period} of {self.period_start}'
+
+
+# "Clients who bought product also bought related": number of clients that
+# bought both (see product/recommendations.py)
+class ProductAffinity(models.Model):
+    product = models.ForeignKey(Product, related_name='affinities', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    clients = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_affinity'),
+        ]
+        indexes = [
+            # Top neighbours of a set of products.
+            models.Index(fields=['product', '-clients'], include=['related'], name='product_affinity_top_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f'{self.product} -> {self.related} ({self.clients})'
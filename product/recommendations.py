@@ -0,0 +1,137 @@
+"""
+Co-purchase recommendations ("clients who bought X also bought Y").
+
+``ProductAffinity`` is the sparse product-by-product co-occurrence matrix:
+one row per ordered pair of products bought by at least one common client,
+holding the number of such clients. Only the ``RECOMMENDATION_NEIGHBOURS``
+strongest neighbours of each product are kept.
+
+- ``rebuild_affinities`` computes the whole matrix in the database. A
+  self-join of purchases through the client, grouped by product pair,
+  counts distinct clients and streams the pairs strongest first, so only
+  the top neighbours of each product are kept. Purchases never leave the
+  database; only the aggregated pairs do.
+- ``record_purchase``/``forget_purchase`` keep it current between rebuilds.
+  When a client buys a product for the first time, each pair with the
+  client's other products gains one client. When the client's last
+  purchase of a product goes, the pairs lose one. A pair that was pruned
+  by the last rebuild comes back with a low count until the next rebuild
+  (``manage.py rebuild_recommendations``).
+- ``forget_client`` drops a deleted client from every pair it counts in
+  before its purchases cascade away; deleting them all at once leaves the
+  purchase signals no other products to pair with.
+- ``upsell_suggestions`` ranks the neighbours of everything a client has
+  bought, minus what they already own, with one query on the
+  ``(product, -clients)`` index.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from client.models import Purchase
+from .models import ProductAffinity
+
+RECOMMENDATION_NEIGHBOURS = getattr(settings, 'PRODUCT_RECOMMENDATION_NEIGHBOURS', 50)
+REBUILD_BATCH_SIZE = 1000
+
+
+def rebuild_affinities(neighbours=RECOMMENDATION_NEIGHBOURS):
+    """Recompute the co-occurrence table from all purchases; returns the number of rows."""
+    pairs = (
+        Purchase.objects
+        # Each purchase joined with every purchase of the same client.
+        .annotate(related_id=F('client__purchases__product_id'))
+        .exclude(related_id=F('product_id'))
+        .values('product_id', 'related_id')
+        .annotate(clients=Count('client_id', distinct=True))
+        .order_by('product_id', '-clients', 'related_id')
+        .values_list('product_id', 'related_id', 'clients')
+    )
+    count = 0
+    with transaction.atomic():
+        ProductAffinity.objects.all().delete()
+        batch = []
+        current, kept = None, 0
+        # Pairs arrive strongest first within each product; keep the head.
+        for product_id, related_id, clients in pairs.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            if product_id != current:
+                current, kept = product_id, 0
+            if kept >= neighbours:
+                continue
+            kept += 1
+            batch.append(ProductAffinity(product_id=product_id, related_id=related_id, clients=clients))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                count += len(ProductAffinity.objects.bulk_create(batch))
+                batch = []
+        count += len(ProductAffinity.objects.bulk_create(batch))
+    return count
+
+
+def _client_products(purchase):
+    """Other products the purchase's client owns, or ``None`` if it already owned this one."""
+    owned = set(
+        Purchase.objects.filter(client_id=purchase.client_id).exclude(pk=purchase.pk)
+        .values_list('product_id', flat=True).distinct()
+    )
+    if purchase.product_id in owned:
+        return None
+    return owned
+
+
+def _pairs(product_id, others):
+    return Q(product_id=product_id, related_id__in=others) | Q(product_id__in=others, related_id=product_id)
+
+
+def record_purchase(purchase):
+    """Count the purchase's client towards every pair its new product forms."""
+    others = _client_products(purchase)
+    if not others:
+        return
+    with transaction.atomic():
+        pairs = ProductAffinity.objects.filter(_pairs(purchase.product_id, others))
+        existing = set(pairs.values_list('product_id', 'related_id'))
+        pairs.update(clients=F('clients') + 1)
+        ProductAffinity.objects.bulk_create(
+            [
+                ProductAffinity(product_id=product_id, related_id=related_id, clients=1)
+                for other in others
+                for product_id, related_id in ((purchase.product_id, other), (other, purchase.product_id))
+                if (product_id, related_id) not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def forget_purchase(purchase):
+    """Undo ``record_purchase`` once the client no longer owns the product."""
+    others = _client_products(purchase)
+    if not others:
+        return
+    with transaction.atomic():
+        pairs = ProductAffinity.objects.filter(_pairs(purchase.product_id, others))
+        pairs.filter(clients__lte=1).delete()
+        pairs.update(clients=F('clients') - 1)
+
+
+def forget_client(client_id):
+    """Take ``client_id`` out of the count of every pair of products it owns."""
+    owned = list(Purchase.objects.filter(client_id=client_id).values_list('product_id', flat=True).distinct())
+    if len(owned) < 2:
+        return
+    with transaction.atomic():
+        pairs = ProductAffinity.objects.filter(product_id__in=owned, related_id__in=owned)
+        pairs.filter(clients__lte=1).delete()
+        pairs.update(clients=F('clients') - 1)
+
+
+def upsell_suggestions(client_id, limit=5):
+    """``[(product_id, clients)]`` bought by clients who share products with ``client_id``."""
+    owned = Purchase.objects.filter(client_id=client_id).values('product_id')
+    return list(
+        ProductAffinity.objects.filter(product_id__in=owned)
+        .exclude(related_id__in=owned)
+        .values('related_id')
+        .annotate(score=Sum('clients'))
+        .order_by('-score', 'related_id')
+        .values_list('related_id', 'score')[:limit]
+    )
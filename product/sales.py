@@ -0,0 +1,100 @@
+"""
+Sales figures for the product detail page.
+
+- ``purchase_page`` returns one page of a product's purchases, newest first,
+  keyed by a ``created_at|id`` cursor. Line totals are computed in SQL from
+  the unit price captured on each purchase.
+- ``product_sales`` returns the monthly sales series and the top buyers. Both
+  come from GROUP BY queries and are cached per product. The signals in
+  ``product/signals.py`` drop the entry when one of the product's purchases,
+  or its price, changes. ``PRODUCT_SALES_CACHE_SECONDS`` bounds how stale the
+  entry can get after bulk edits that skip those signals.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_datetime
+
+PURCHASES_PAGE_SIZE = 25
+TOP_BUYERS = 10
+SALES_CACHE_SECONDS = getattr(settings, 'PRODUCT_SALES_CACHE_SECONDS', 15 * 60)
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=20, decimal_places=2),
+)
+
+
+def purchase_cursor(purchase):
+    return f'{purchase.created_at.isoformat()}|{purchase.pk}'
+
+
+def purchase_page(product, cursor=None):
+    """
+    ``(purchases, next_cursor)`` for the page after ``cursor``; ``next_cursor``
+    is ``None`` on the last page. Raises ``ValueError`` for a malformed cursor.
+    """
+    purchases = (
+        product.purchases.select_related('client')
+        .only('product', 'quantity', 'unit_price', 'notes', 'created_at', 'client__first_name', 'client__last_name')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('-created_at', '-id')
+    )
+    if cursor:
+        created_at, _, pk = cursor.rpartition('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk.isdigit():
+            raise ValueError('Invalid cursor')
+        purchases = purchases.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=int(pk)))
+
+    page = list(purchases[:PURCHASES_PAGE_SIZE + 1])
+    next_cursor = purchase_cursor(page[PURCHASES_PAGE_SIZE - 1]) if len(page) > PURCHASES_PAGE_SIZE else None
+    return page[:PURCHASES_PAGE_SIZE], next_cursor
+
+
+def _cache_key(product_id):
+    return f'product-sales:{product_id}'
+
+
+def invalidate_product_sales(product_id):
+    cache.delete(_cache_key(product_id))
+
+
+def _compute_product_sales(product):
+    purchases = product.purchases.order_by()
+    monthly = (
+        purchases.annotate(month=TruncMonth('created_at'))
+        .values('month')
+        .annotate(total_quantity=Sum('quantity'), revenue=Sum(LINE_TOTAL))
+        .order_by('month')
+    )
+    top_buyers = (
+        purchases.values('client_id', 'client__first_name', 'client__last_name')
+        .annotate(total_quantity=Sum('quantity'), revenue=Sum(LINE_TOTAL), orders=Count('id'))
+        .order_by('-total_quantity', 'client_id')[:TOP_BUYERS]
+    )
+    return {
+        'months': [row['month'].strftime('%Y-%m') for row in monthly],
+        'quantities': [row['total_quantity'] for row in monthly],
+        'revenues': [float(row['revenue']) for row in monthly],
+        'top_buyers': [
+            {
+                'client_id': row['client_id'],
+                'name': f"{row['client__last_name']}, {row['client__first_name']}",
+                'quantity': row['total_quantity'],
+                'revenue': row['revenue'],
+                'orders': row['orders'],
+            }
+            for row in top_buyers
+        ],
+    }
+
+
+def product_sales(product):
+    """Monthly quantity/revenue series and top buyers of ``product``, cached."""
+    key = _cache_key(product.pk)
+    sales = cache.get(key)
+    if sales is None:
+        sales = _compute_product_sales(product)
+        cache.set(key, sales, SALES_CACHE_SECONDS)
+    return sales
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from client.models import Client, Purchase
+from .catalog import bump_catalog_version
+from .leaderboard import record_purchase
+from .models import Product
+from .recommendations import forget_client, forget_purchase, record_purchase as record_affinity
+from .sales import invalidate_product_sales
+
+
+# Invalidate after commit, so no reader can cache the old rows again.
+def purchase_changed(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: invalidate_product_sales(product_id))
+
+
+# Leaderboard rows change in the same transaction as the purchase.
+def purchase_saved(sender, instance, created, **kwargs):
+    if created:
+        record_purchase(instance)
+
+
+def purchase_deleted(sender, instance, **kwargs):
+    record_purchase(instance, sign=-1)
+
+
+# Co-purchase counts only change when a client gains or loses a product.
+def purchase_affinity_saved(sender, instance, created, **kwargs):
+    if created:
+        record_affinity(instance)
+
+
+def purchase_affinity_deleted(sender, instance, **kwargs):
+    forget_purchase(instance)
+
+
+# A client's purchases are all deleted before their post_delete signals run,
+# so its pairs are settled while the purchases still exist.
+def client_affinity_deleted(sender, instance, **kwargs):
+    forget_client(instance.pk)
+
+
+def product_changed(sender, instance, **kwargs):
+    product_id = instance.pk
+
+    def invalidate():
+        invalidate_product_sales(product_id)
+        bump_catalog_version()
+
+    transaction.on_commit(invalidate)
+
+
+post_save.connect(purchase_changed, sender=Purchase, dispatch_uid='product_sales_purchase_saved')
+post_delete.connect(purchase_changed, sender=Purchase, dispatch_uid='product_sales_purchase_deleted')
+post_save.connect(purchase_saved, sender=Purchase, dispatch_uid='product_leaderboard_purchase_saved')
+post_delete.connect(purchase_deleted, sender=Purchase, dispatch_uid='product_leaderboard_purchase_deleted')
+post_save.connect(purchase_affinity_saved, sender=Purchase, dispatch_uid='product_affinity_purchase_saved')
+post_delete.connect(purchase_affinity_deleted, sender=Purchase, dispatch_uid='product_affinity_purchase_deleted')
+pre_delete.connect(client_affinity_deleted, sender=Client, dispatch_uid='product_affinity_client_deleted')
+post_save.connect(product_changed, sender=Product, dispatch_uid='product_sales_product_saved')
+post_delete.connect(product_changed, sender=Product, dispatch_uid='product_sales_product_deleted')
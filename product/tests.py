@@ -1,3 +1,90 @@
+from datetime import date, datetime
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from client.models import Client, Purchase
+from .catalog import ProductCatalog
+from .leaderboard import period_standings, rebuild_leaderboards, top_products
+from .models import Product, ProductAffinity, ProductSalesPeriod
+from .recommendations import rebuild_affinities
+
+
+class AffinityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('affinity', 'affinity@example.com', 'x')
+        self.products = [Product.objects.create(name=name, net_price=10) for name in 'ABC']
+
+    def create_client(self, name, products):
+        client = Client.objects.create(
+            first_name=name, last_name='Client', email=f'{name}@example.com', created_by=self.user,
+        )
+        for product in products:
+            Purchase.objects.create(client=client, product=product, created_by=self.user)
+        return client
+
+    def counts(self):
+        return dict(
+            ((product_id, related_id), clients)
+            for product_id, related_id, clients in ProductAffinity.objects.values_list('product_id', 'related_id', 'clients')
+        )
+
+    def test_deleted_client_leaves_pairs(self):
+        first = self.create_client('first', self.products)
+        self.create_client('second', self.products[:2])
+        a, b = self.products[0].pk, self.products[1].pk
+        first.delete()
+        self.assertEqual(self.counts(), {(a, b): 1, (b, a): 1})
+
+    def test_bulk_delete_matches_rebuild(self):
+        self.create_client('first', self.products)
+        self.create_client('second', self.products[:2])
+        self.create_client('third', self.products[1:])
+        Client.objects.filter(first_name__in=['first', 'third']).delete()
+        counts = self.counts()
+        rebuild_affinities()
+        self.assertEqual(counts, self.counts())
+
+
+class CatalogTests(TestCase):
+    def test_version_is_checked_once_per_interval(self):
+        catalog = ProductCatalog()
+        product = Product.objects.create(name='Widget', net_price=5)
+        self.assertEqual(catalog.get(product.pk).name, 'Widget')
+        product.name = 'Gadget'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()  # bumps the catalog version on commit
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get(product.pk).name, 'Widget')
+            catalog.search('W')
+        catalog._checked_at = float('-inf')  # the interval has passed
+        self.assertEqual(catalog.get(product.pk).name, 'Gadget')
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('leaderboard', 'leaderboard@example.com', 'x')
+        client = Client.objects.create(first_name='Buyer', last_name='One', email='b@example.com', created_by=user)
+        self.first, self.second = (Product.objects.create(name=name, net_price=1) for name in ('First', 'Second'))
+        for product, day, amount in (
+            (self.first, date(2026, 2, 5), 10),
+            (self.first, date(2026, 2, 20), 100),
+            (self.first, date(2026, 3, 3), 50),
+            (self.second, date(2026, 3, 8), 80),
+        ):
+            purchase = Purchase.objects.create(
+                client=client, product=product, quantity=amount, unit_price=1, created_by=user,
+            )
+            moment = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=12)))
+            Purchase.objects.filter(pk=purchase.pk).update(created_at=moment)
+        rebuild_leaderboards()
+
+    def test_growth_compares_the_same_part_of_the_previous_period(self):
+        standings = period_standings(ProductSalesPeriod.MONTH, day=date(2026, 3, 10))
+        self.assertEqual(standings[self.first.pk]['previous_revenue'], 10)
+        self.assertEqual(standings[self.first.pk]['growth'], 40)
 
-# Create your tests here.
+    def test_top_products(self):
+        top = top_products(ProductSalesPeriod.MONTH, limit=1, day=date(2026, 3, 10))
+        self.assertEqual([entry['product_id'] for entry in top], [self.second.pk])
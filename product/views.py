@@ -2,17 +2,81 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from product.models import Product
+from product.models import Product, ProductSalesPeriod
 from django.views.generic import ListView, DetailView
+from django.http import Http404
+from product.catalog import catalog
+from product.leaderboard import PERIODS, all_time_totals, fastest_growing, period_standings, top_products
+from product.sales import product_sales, purchase_page
 
 
 # Create your views here.
+# Sortable columns of the product list; values come from the rows built below.
+PRODUCT_LIST_SORTS = {
+    'name': lambda row: row['product'].name.upper(),
+    'price': lambda row: row['product'].net_price,
+    'sold': lambda row: row['sold'],
+    'revenue': lambda row: row['revenue'],
+    'period_quantity': lambda row: row['period_quantity'],
+    'period_revenue': lambda row: row['period_revenue'],
+    'growth': lambda row: row['growth'],
+}
+LEADERBOARD_SIZE = 5
+
+
 class ProductListView(ListView):
     model = Product
 
     template_name = 'product/products-list.html'
     context_object_name = 'products'
-    ordering = ['-id']
+
+    def get_queryset(self):
+        # Newest first, from the in-process catalog
+        return sorted(catalog.all(), key=lambda product: product.id, reverse=True)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        period = self.request.GET.get('period')
+        if period not in PERIODS:
+            period = ProductSalesPeriod.MONTH
+
+        # Sales figures come from the leaderboard tables, not from the purchases.
+        totals = all_time_totals()
+        standings = period_standings(period)
+        rows = []
+        for product in context['products']:
+            standing = standings.get(product.id, {})
+            sold, revenue = totals.get(product.id, (0, 0))
+            rows.append({
+                'product': product,
+                'sold': sold,
+                'revenue': revenue,
+                'period_quantity': standing.get('quantity', 0),
+                'period_revenue': standing.get('revenue', 0),
+                'growth': standing.get('growth', 0),
+            })
+
+        sort = self.request.GET.get('sort', '')
+        if sort.lstrip('-') in PRODUCT_LIST_SORTS:
+            rows.sort(key=PRODUCT_LIST_SORTS[sort.lstrip('-')], reverse=sort.startswith('-'))
+        else:
+            sort = ''
+
+        context['product_rows'] = rows
+        context['period'] = period
+        context['periods'] = [choice for choice in ProductSalesPeriod.PERIOD_CHOICES if choice[0] in PERIODS]
+        context['sort'] = sort
+        # Top-k straight off the (period, period_start, -revenue) index.
+        products = catalog.by_id()
+        context['top_sellers'] = [
+            (product, entry) for entry in top_products(period, limit=LEADERBOARD_SIZE)
+            if (product := products.get(entry['product_id']))
+        ]
+        context['fastest_growing'] = [
+            (product, entry) for product_id, entry in fastest_growing(period)
+            if (product := products.get(product_id))
+        ]
+        return context
 
 
 class ProductDetailView(LoginRequiredMixin, DetailView):
@@ -22,8 +86,15 @@ class ProductDetailView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Get all purchases for this product
-        context['purchases'] = self.object.purchases.all().select_related('client', 'created_by')
+        # One page of purchases (newest first) with line totals from SQL
+        cursor = self.request.GET.get('cursor')
+        try:
+            context['purchases'], context['next_cursor'] = purchase_page(self.object, cursor)
+        except ValueError:
+            raise Http404('Invalid cursor')
+        context['is_first_page'] = not cursor
+        context['sales'] = product_sales(self.object)
+        context['price_history'] = self.object.price_history.all()[:10]
         return context
 
 
@@ -0,0 +1,75 @@
+// Turn <select data-autocomplete-url="..."> into a search-as-you-type picker.
+// The server only renders the selected option; matches are fetched in small
+// pages from the autocomplete endpoint as the user types.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        const url = select.dataset.autocompleteUrl;
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control mb-1';
+        search.placeholder = 'Type to search...';
+        select.parentNode.insertBefore(search, select);
+
+        let page = 1;
+        let timer = null;
+        let more = false;
+
+        function load(reset) {
+            if (reset) {
+                page = 1;
+            }
+            const params = new URLSearchParams({q: search.value, page: page});
+            fetch(url + '?' + params.toString(), {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (reset) {
+                        // Keep the empty option and the current selection.
+                        Array.from(select.options).forEach(function (option) {
+                            if (option.value && !option.selected) {
+                                option.remove();
+                            }
+                        });
+                        Array.from(select.querySelectorAll('option[data-more]')).forEach(function (option) {
+                            option.remove();
+                        });
+                    } else {
+                        const moreOption = select.querySelector('option[data-more]');
+                        if (moreOption) {
+                            moreOption.remove();
+                        }
+                    }
+                    data.results.forEach(function (item) {
+                        if (!select.querySelector('option[value="' + item.id + '"]')) {
+                            select.add(new Option(item.text, item.id));
+                        }
+                    });
+                    more = data.more;
+                    if (more) {
+                        const moreOption = new Option('More results...', '');
+                        moreOption.dataset.more = '1';
+                        select.add(moreOption);
+                    }
+                });
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(true); }, 250);
+        });
+
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2) {
+                load(true);
+            }
+        }, {once: true});
+
+        select.addEventListener('change', function () {
+            const option = select.options[select.selectedIndex];
+            if (option && option.dataset.more && more) {
+                select.selectedIndex = 0;
+                page += 1;
+                load(false);
+            }
+        });
+    });
+});
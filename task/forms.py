@@ -1,22 +1,28 @@
 from django import forms
+from django.contrib.auth.models import User
 
+from core.widgets import AutocompleteSelect
 from .models import Task, TaskComment
 
 
 class TaskForm(forms.ModelForm):
     class Meta:
         model = Task
-        fields = ['title', 'description', 'status', 'priority', 'lead', 'client', 'assigned_to','due_date', 'due_time']
+        fields = ['title', 'description', 'status', 'priority', 'lead', 'client', 'assigned_to','due_date', 'due_time',
+                  'recurrence', 'recurrence_interval', 'recurrence_until']
         widgets = {
+            'recurrence': forms.Select(attrs={'class': 'form-select'}),
+            'recurrence_interval': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
+            'recurrence_until': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'due_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'due_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-select'}),
             'priority': forms.Select(attrs={'class': 'form-select'}),
-            'assigned_to': forms.Select(attrs={'class': 'form-select'}),
-            'lead': forms.Select(attrs={'class': 'form-select'}),
-            'client': forms.Select(attrs={'class': 'form-select'}),
+            'assigned_to': AutocompleteSelect('core:autocomplete_users'),
+            'lead': AutocompleteSelect('core:autocomplete_leads'),
+            'client': AutocompleteSelect('core:autocomplete_clients'),
         }
 
     def clean(self):
@@ -30,6 +36,9 @@ class TaskForm(forms.ModelForm):
             import datetime
             cleaned_data['due_datetime'] = datetime.datetime.combine(due_date, due_time)
 
+        if cleaned_data.get('recurrence') and not due_date:
+            self.add_error('due_date', "A repeating task needs a due date.")
+
         # Ensure not both lead and client are selected
         if lead and client:
             raise forms.ValidationError(
@@ -66,4 +75,49 @@ class TaskEditForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-select'}),
             'priority': forms.Select(attrs={'class': 'form-select'}),
-        }
\ No newline at end of file
+            'assigned_to': AutocompleteSelect('core:autocomplete_users'),
+        }
+
+class TaskBulkForm(forms.Form):
+    """One change applied to many tasks, either the ticked rows or the current filter result."""
+    ACTION_CHOICES = (
+        ('status', 'Change status'),
+        ('priority', 'Change priority'),
+        ('assigned_to', 'Reassign'),
+        ('due_date', 'Change due date'),
+    )
+    SCOPE_CHOICES = (
+        ('selected', 'Selected tasks'),
+        ('filter', 'All tasks matching the filters'),
+    )
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES, widget=forms.Select(attrs={'class': 'form-select'}))
+    scope = forms.ChoiceField(choices=SCOPE_CHOICES, initial='selected',
+                              widget=forms.Select(attrs={'class': 'form-select'}))
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, required=False,
+                               widget=forms.Select(attrs={'class': 'form-select'}))
+    priority = forms.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False,
+                                 widget=forms.Select(attrs={'class': 'form-select'}))
+    assigned_to = forms.ModelChoiceField(queryset=User.objects.all(), required=False,
+                                         widget=AutocompleteSelect('core:autocomplete_users'))
+    due_date = forms.DateField(required=False,
+                               widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('action') == 'status' and not cleaned_data.get('status'):
+            self.add_error('status', "Choose a status.")
+
+        # Row checkboxes live in the task table rather than in this form.
+        try:
+            cleaned_data['ids'] = [int(value) for value in self.data.getlist('ids')]
+        except ValueError:
+            raise forms.ValidationError("Invalid task selection.")
+        if cleaned_data.get('scope') == 'selected' and not cleaned_data['ids']:
+            raise forms.ValidationError("Select at least one task.")
+        return cleaned_data
+
+    def changes(self):
+        """Column update for the chosen action; an empty value clears the field."""
+        action = self.cleaned_data['action']
+        return {action: self.cleaned_data.get(action)}
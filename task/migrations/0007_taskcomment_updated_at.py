@@ -0,0 +1,28 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0006_task_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskcomment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            'UPDATE task_taskcomment SET updated_at = created_at',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', 'updated_at'], name='task_taskco_task_id_5364ed_idx'),
+        ),
+    ]
@@ -2,6 +2,21 @@ from django.db import models
 from django.contrib.auth.models import User
 from lead.models import Lead
 from client.models import Client
+from core.access import granted_ids
+
+
+class TaskQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Tasks the user created or is assigned to, plus tasks on clients and
+        leads the user can see (see ``core.access``).
+        """
+        return self.filter(
+            models.Q(created_by=user)
+            | models.Q(assigned_to=user)
+            | models.Q(client_id__in=granted_ids(user, Client))
+            | models.Q(lead_id__in=granted_ids(user, Lead))
+        )
 
 
 # Create your models here.
@@ -20,6 +35,14 @@ class Task(models.Model):
         ('canceled', 'Canceled'),
     )
 
+    RECURRENCE_CHOICES = (
+        ('', 'Does not repeat'),
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    )
+
     title = models.CharField(max_length=255)
     created_by = models.ForeignKey(User, related_name='tasks', on_delete=models.CASCADE)
     assigned_to = models.ForeignKey(User, related_name='assigned_tasks',
@@ -33,11 +56,34 @@ class Task(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='', blank=True, null=True)
     due_date = models.DateField(blank=True, null=True)
     due_time = models.TimeField(blank=True, null=True)
+    # Recurrence rule; see task/recurrence.py. Only the current occurrence exists as a row.
+    recurrence = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='', blank=True)
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)
+    recurrence_until = models.DateField(blank=True, null=True)
+    series = models.ForeignKey('self', related_name='occurrences', on_delete=models.SET_NULL,
+                               null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', 'updated_at']),
+            # The list is ordered newest first within each visibility branch.
+            models.Index(fields=['created_by', '-created_at']),
+            models.Index(fields=['assigned_to', '-created_at']),
+            # Board columns: newest first within one status.
+            models.Index(fields=['created_by', 'status', '-created_at']),
+            models.Index(fields=['assigned_to', 'status', '-created_at']),
+            # Reminder scheduler: due-window scans and the change feed.
+            models.Index(fields=['due_date', 'due_time']),
+            models.Index(fields=['updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'due_date'], name='unique_task_occurrence'),
+        ]
 
     def __str__(self):
         return self.title
@@ -47,9 +93,14 @@ class TaskComment(models.Model):
     content = models.TextField(blank=True, null=True)
     created_by = models.ForeignKey(User, related_name='task_comments', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Live comment updates: "changed since cursor" per task.
+            models.Index(fields=['task', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.created_by.username
@@ -0,0 +1,151 @@
+"""
+Recurring tasks.
+
+A recurrence rule (frequency, interval and an optional end date) is stored on
+the task itself; occurrences are never pre-generated:
+
+- ``occurrences_between`` expands a task's rule lazily for the window being
+  viewed, computing the first index in the window directly instead of walking
+  the series from its start.
+- ``materialize_next_occurrence`` creates only the next concrete row, when the
+  current occurrence is completed. Occurrences point at the first task of the
+  series, and ``(series, due_date)`` is unique, so completing the same task
+  twice never creates duplicates.
+
+Occurrences are anchored on the series' first due date, so a monthly task due
+on the 31st falls on the last day of shorter months without drifting.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+
+# Rule -> (unit, days per unit); months and years are stepped on the calendar.
+FREQUENCIES = {
+    'daily': ('days', 1),
+    'weekly': ('days', 7),
+    'monthly': ('months', None),
+    'yearly': ('years', None),
+}
+
+
+def _add_months(anchor, months):
+    month_index = anchor.month - 1 + months
+    year, month = anchor.year + month_index // 12, month_index % 12 + 1
+    day = min(anchor.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def occurrence_date(anchor, rule, interval, index):
+    """Due date of the ``index``-th occurrence (0 is the anchor itself)."""
+    unit, days = FREQUENCIES[rule]
+    steps = index * interval
+    if unit == 'days':
+        return anchor + timedelta(days=steps * days)
+    if unit == 'months':
+        return _add_months(anchor, steps)
+    return _add_months(anchor, steps * 12)
+
+
+def _first_index_on_or_after(anchor, rule, interval, day):
+    """Smallest occurrence index whose date is on or after ``day``."""
+    if day <= anchor:
+        return 0
+    unit, days = FREQUENCIES[rule]
+    if unit == 'days':
+        elapsed = (day - anchor).days // (days * interval)
+    else:
+        months = (day.year - anchor.year) * 12 + day.month - anchor.month
+        if unit == 'years':
+            months //= 12
+        elapsed = months // interval
+    # The estimate can be one short because of day clamping; step forward.
+    index = max(elapsed - 1, 0)
+    while occurrence_date(anchor, rule, interval, index) < day:
+        index += 1
+    return index
+
+
+def series_anchor(task):
+    """First due date of the task's series (the task's own if it starts one)."""
+    if task.series_id and task.series is not None and task.series.due_date:
+        return task.series.due_date
+    return task.due_date
+
+
+def occurrences_between(task, start, end):
+    """
+    Yield the due dates of ``task``'s recurrence falling in ``[start, end]``,
+    from the task's own due date onwards.
+    """
+    if not task.recurrence or task.due_date is None:
+        if task.due_date and start <= task.due_date <= end:
+            yield task.due_date
+        return
+
+    anchor = series_anchor(task)
+    interval = max(task.recurrence_interval or 1, 1)
+    last = min(end, task.recurrence_until) if task.recurrence_until else end
+    index = _first_index_on_or_after(anchor, task.recurrence, interval, max(start, task.due_date))
+    while True:
+        day = occurrence_date(anchor, task.recurrence, interval, index)
+        if day > last:
+            return
+        yield day
+        index += 1
+
+
+def next_occurrence_date(task):
+    """Due date of the occurrence after ``task``, or ``None`` when the series ends."""
+    if not task.recurrence or task.due_date is None:
+        return None
+    anchor = series_anchor(task)
+    interval = max(task.recurrence_interval or 1, 1)
+    index = _first_index_on_or_after(anchor, task.recurrence, interval, task.due_date + timedelta(days=1))
+    day = occurrence_date(anchor, task.recurrence, interval, index)
+    if task.recurrence_until and day > task.recurrence_until:
+        return None
+    return day
+
+
+def materialize_next_occurrence(task):
+    """
+    Create the next occurrence of a completed recurring task.
+
+    Returns the next occurrence (new or already existing), or ``None`` if the
+    task does not recur or the series is over.
+    """
+    from .models import Task
+
+    next_due = next_occurrence_date(task)
+    if next_due is None:
+        return None
+
+    series_id = task.series_id or task.pk
+    existing = Task.objects.filter(series_id=series_id, due_date=next_due).first()
+    if existing is not None:
+        return existing
+
+    occurrence = Task(
+        series_id=series_id,
+        title=task.title,
+        description=task.description,
+        priority=task.priority,
+        status='todo',
+        created_by_id=task.created_by_id,
+        assigned_to_id=task.assigned_to_id,
+        lead_id=task.lead_id,
+        client_id=task.client_id,
+        due_date=next_due,
+        due_time=task.due_time,
+        recurrence=task.recurrence,
+        recurrence_interval=task.recurrence_interval,
+        recurrence_until=task.recurrence_until,
+    )
+    try:
+        with transaction.atomic():
+            occurrence.save()
+    except IntegrityError:
+        # Completed concurrently from another request; use that row.
+        return Task.objects.get(series_id=series_id, due_date=next_due)
+    return occurrence
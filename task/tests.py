@@ -1,3 +1,30 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Task, TaskComment
+
+
+class TaskCommentAccessTests(TestCase):
+    def setUp(self):
+        self.owner, self.other = (
+            User.objects.create_user(name, f'{name}@example.com', 'x') for name in ('owner', 'other')
+        )
+        self.task = Task.objects.create(title='Private', created_by=self.owner, status='todo')
+        TaskComment.objects.create(task=self.task, created_by=self.owner, content='Secret')
+
+    def get(self, name):
+        return self.client.get(reverse(f'task:{name}', args=[self.task.pk]))
+
+    def test_comments_of_invisible_tasks_are_not_found(self):
+        self.client.force_login(self.other)
+        for name in ('task_comments_partial', 'task_comments_since', 'task_comments_stream'):
+            with self.subTest(name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_visible_task_comments(self):
+        self.client.force_login(self.owner)
+        self.assertContains(self.get('task_comments_partial'), 'Secret')
+        self.assertEqual(self.get('task_comments_since').json()['count'], 1)
+        # Streams need ASGI; the page falls back to polling.
+        self.assertEqual(self.get('task_comments_stream').status_code, 204)
@@ -17,4 +17,11 @@ urlpatterns = [
     path('<int:client_id>/task/add/', views.task_add_client, name='task_add_client'),
     path('leads/<int:lead_id>/task/add/', views.task_add_lead, name='task_add_lead'),
     path('<int:pk>/comments-partial/', views.task_comments_partial, name='task_comments_partial'),
+    path('<int:pk>/comments/since/', views.task_comments_since, name='task_comments_since'),
+    path('<int:pk>/comments/stream/', views.task_comments_stream, name='task_comments_stream'),
+    path('export/', views.tasks_export, name='task_export'),
+    path('bulk/', views.task_bulk_update, name='task_bulk_update'),
+    path('board/', views.task_board, name='task_board'),
+    path('board/<str:status>/', views.task_board_column, name='task_board_column'),
+    path('board/move/<int:pk>/', views.task_board_move, name='task_board_move'),
 ]
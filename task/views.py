@@ -1,57 +1,143 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Max, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 
+from calendarapp.agenda import TASK_VIEWER_FIELDS, record_task_departures, task_viewers
 from client.models import Client
+from core.exports import ExportColumn, export_response
 from lead.models import Lead
-from .forms import TaskForm, TaskCommentForm
+from .forms import TaskBulkForm, TaskForm, TaskCommentForm
 from .models import Task, TaskComment
+from .recurrence import materialize_next_occurrence, occurrences_between
+
+
+TASK_EXPORT_COLUMNS = [
+    ExportColumn('id', 'ID'),
+    ExportColumn('title', 'Title'),
+    ExportColumn('description', 'Description'),
+    ExportColumn('status', 'Status'),
+    ExportColumn('priority', 'Priority'),
+    ExportColumn('assigned_to', 'Assigned to', 'assigned_to__username'),
+    ExportColumn('lead_id', 'Lead ID', 'lead_id'),
+    ExportColumn('client_id', 'Client ID', 'client_id'),
+    ExportColumn('due_date', 'Due date'),
+    ExportColumn('due_time', 'Due time'),
+    ExportColumn('created_at', 'Created at'),
+    ExportColumn('updated_at', 'Updated at'),
+    ExportColumn('created_by', 'Created by', 'created_by__username'),
+]
+
+
+# Facets shown next to the task list filters, in the order of the GET params.
+TASK_FACETS = ('status', 'priority', 'assigned_to', 'related_to')
+
+RELATED_TO = Case(
+    When(lead__isnull=False, then=Value('lead')),
+    When(client__isnull=False, then=Value('client')),
+    default=Value('none'),
+    output_field=CharField(),
+)
+
+RELATED_TO_CHOICES = (
+    ('lead', 'Lead'),
+    ('client', 'Client'),
+    ('none', 'Nobody'),
+)
+
+
+def task_facet_counts(queryset, selected):
+    """
+    Count tasks per facet value with a single GROUP BY over all four facets.
+
+    Each facet is counted with every *other* active filter applied, so the
+    numbers next to a dropdown show what selecting that option would return.
+    """
+    groups = (
+        queryset.order_by()
+        .annotate(related_to=RELATED_TO)
+        .values(*TASK_FACETS)
+        .annotate(count=Count('id'))
+    )
+    counts = {facet: defaultdict(int) for facet in TASK_FACETS}
+    for group in groups:
+        for facet in TASK_FACETS:
+            if all(
+                not selected[other] or str(group[other]) == selected[other]
+                for other in TASK_FACETS if other != facet
+            ):
+                counts[facet][group[facet]] += group['count']
+    return counts
+
+
+def filter_tasks(queryset, selected):
+    """Apply the task list filters (``TASK_FACETS`` values) to ``queryset``."""
+    if selected['status']:
+        queryset = queryset.filter(status=selected['status'])
+    if selected['priority']:
+        queryset = queryset.filter(priority=selected['priority'])
+    if selected['assigned_to']:
+        queryset = queryset.filter(assigned_to_id=selected['assigned_to'])
+    if selected['related_to'] == "lead":
+        queryset = queryset.filter(lead__isnull=False)
+    elif selected['related_to'] == "client":
+        queryset = queryset.filter(lead__isnull=True, client__isnull=False)
+    elif selected['related_to'] == "none":
+        queryset = queryset.filter(lead__isnull=True, client__isnull=True)
+    return queryset
 
 
 # Create your views here.
 # Task list view function
 @login_required
 def tasks(request):
-    # Get all users for the filter dropdown
-    users = User.objects.all()
-
-    # Get tasks with filters
-    tasks_list = Task.objects.all()
+    scoped = Task.objects.visible_to(request.user)
+    selected = {facet: request.GET.get(facet, '') for facet in TASK_FACETS}
+    counts = task_facet_counts(scoped, selected)
 
     # Apply filters
-    status = request.GET.get('status')
-    if status:
-        tasks_list = tasks_list.filter(status=status)
-
-    priority = request.GET.get('priority')
-    if priority:
-        tasks_list = tasks_list.filter(priority=priority)
-
-    assigned_to = request.GET.get('assigned_to')
-    if assigned_to:
-        tasks_list = tasks_list.filter(assigned_to_id=assigned_to)
-
-    related_to = request.GET.get('related_to')
-    if related_to == "lead":
-        tasks_list = tasks_list.filter(lead__isnull=False)
-    elif related_to == "client":
-        tasks_list = tasks_list.filter(client__isnull=False)
-    elif related_to == "none":
-        tasks_list = tasks_list.filter(lead__isnull=True, client__isnull=True)
+    tasks_list = filter_tasks(scoped, selected).select_related('assigned_to', 'lead', 'client')
+
+    # Only users that actually appear as assignees in the visible tasks
+    assignee_ids = [pk for pk in counts['assigned_to'] if pk is not None]
+    users = User.objects.filter(pk__in=assignee_ids).order_by('username')
 
     # Pagination
     paginator = Paginator(tasks_list, 10)  # Show 10 tasks per page
     page = request.GET.get('page')
     tasks = paginator.get_page(page)
 
+    filters = request.GET.copy()
+    filters.pop('page', None)
+
     context = {
         'tasks': tasks,
-        'users': users,
+        'status_facets': [(value, label, counts['status'][value]) for value, label in Task.STATUS_CHOICES],
+        'priority_facets': [(value, label, counts['priority'][value]) for value, label in Task.PRIORITY_CHOICES if value],
+        'assignee_facets': [(str(user.pk), user.get_full_name() or user.username, counts['assigned_to'][user.pk]) for user in users],
+        'related_facets': [(value, label, counts['related_to'][value]) for value, label in RELATED_TO_CHOICES],
+        'selected': selected,
+        'filter_query': filters.urlencode(),
+        'bulk_form': TaskBulkForm(),
     }
 
     return render(request, 'task/task_list.html', context)
@@ -60,11 +146,18 @@ def tasks(request):
 # Task detail view function, with comments and files attached to the task.
 @login_required
 def task_detail(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    task_comments = TaskComment.objects.filter(task_id=pk)
+    task = get_object_or_404(Task.objects.select_related('series'), pk=pk)
+    task_comments = list(TaskComment.objects.filter(task_id=pk).select_related('created_by'))
+    comments_cursor = max((comment.updated_at for comment in task_comments), default=None)
     form = TaskCommentForm()
+    # Expanded on the fly; only the current occurrence exists in the database.
+    upcoming = []
+    if task.recurrence and task.due_date:
+        start = max(timezone.localdate(), task.due_date + timedelta(days=1))
+        upcoming = list(islice(occurrences_between(task, start, start + timedelta(days=366)), 5))
     return render(request, 'task/task_detail.html', {'task': task, 'task_comments': task_comments,
-                                                     'form': form})
+                                                     'form': form, 'upcoming_occurrences': upcoming,
+                                                     'comments_cursor': comments_cursor.isoformat() if comments_cursor else ''})
 
 
 # Add this new view function
@@ -125,9 +218,12 @@ def task_edit(request, pk):
         raise PermissionDenied("You don't have permission to edit this task.")
 
     if request.method == 'POST':
+        was_completed = task.status == 'completed'
         form = TaskForm(request.POST, instance=task)
         if form.is_valid():
-            form.save()
+            task = form.save()
+            if task.status == 'completed' and not was_completed:
+                materialize_next_occurrence(task)
             next_url = request.POST.get('next') or request.GET.get('next')
             if next_url:
                 return redirect(next_url)
@@ -232,13 +328,127 @@ def task_add_client(request, client_id):
 
     return redirect('client:detail', client_id)
 
+@login_required
 def task_comments_partial(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    comments = task.comments.all()
+    task = get_object_or_404(Task.objects.visible_to(request.user).only('id'), pk=pk)
+    comments = task.comments.select_related('created_by')
     # Return only the HTML for comments
     return render(request, 'task/partials/_comments.html', {'comments': comments})
 
 
+# Live comment updates: the page keeps a cursor (the newest updated_at it has
+# seen) and the number of comments it shows, and only receives the difference.
+COMMENT_STREAM_POLL_SECONDS = 2
+COMMENT_STREAM_KEEPALIVE_SECONDS = 15
+# EventSource reconnects on its own (with Last-Event-ID), so streams are
+# recycled regularly instead of holding a worker forever.
+COMMENT_STREAM_MAX_SECONDS = 55
+# Rows committed just after a poll can carry a slightly older timestamp;
+# re-sending them is harmless because the page replaces comments by id.
+COMMENT_CURSOR_OVERLAP = timedelta(seconds=2)
+
+
+def _parse_comment_cursor(value):
+    cursor = parse_datetime(value) if value else None
+    if cursor is not None and timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor)
+    return cursor
+
+
+def task_comment_changes(task_id, since, known_count):
+    """
+    Comments of ``task_id`` created or edited after ``since``, rendered one by one.
+
+    A single aggregate over the ``(task, updated_at)`` index answers the common
+    "nothing changed" case. The full id list is only included when the count
+    shows that comments were deleted, so the page can drop them.
+    """
+    comments = TaskComment.objects.filter(task_id=task_id)
+    state = comments.aggregate(latest=Max('updated_at'), count=Count('id'))
+    payload = {'cursor': since.isoformat() if since else None, 'count': state['count'], 'comments': []}
+
+    created = 0
+    if state['latest'] is not None and (since is None or state['latest'] > since):
+        changed = comments.select_related('created_by').order_by('updated_at')
+        if since is not None:
+            changed = changed.filter(updated_at__gt=since - COMMENT_CURSOR_OVERLAP)
+        for comment in changed:
+            payload['comments'].append({
+                'id': comment.id,
+                'html': render_to_string('task/partials/_comment.html', {'comment': comment}),
+            })
+            if since is None or comment.created_at > since:
+                created += 1
+        if changed:
+            payload['cursor'] = max(comment.updated_at for comment in changed).isoformat()
+
+    if known_count is not None and known_count + created != state['count']:
+        payload['ids'] = list(comments.values_list('id', flat=True))
+    return payload
+
+
+@login_required
+def task_comments_since(request, pk):
+    """JSON diff of the comments changed since ``?since=`` (the page's cursor)."""
+    task = get_object_or_404(Task.objects.visible_to(request.user).only('id'), pk=pk)
+    try:
+        known_count = int(request.GET['count']) if 'count' in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid count"}, status=400)
+    since = _parse_comment_cursor(request.GET.get('since'))
+    return JsonResponse(task_comment_changes(task.id, since, known_count))
+
+
+async def task_comments_stream(request, pk):
+    """
+    Server-Sent Events stream of comment diffs for one task.
+
+    Needs an ASGI server: under WSGI a long-lived response would pin a worker
+    thread, so the stream answers 204, which tells EventSource not to retry;
+    the page then falls back to polling ``task_comments_since``.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    exists = await sync_to_async(lambda: Task.objects.visible_to(request.user).filter(pk=pk).exists())()
+    if not exists:
+        raise Http404()
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    since = _parse_comment_cursor(
+        request.headers.get('Last-Event-ID') or request.GET.get('since')
+    )
+    try:
+        known_count = int(request.GET.get('count', ''))
+    except ValueError:
+        known_count = None
+
+    async def events():
+        nonlocal since, known_count
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + COMMENT_STREAM_MAX_SECONDS
+        last_sent = loop.time()
+        yield 'retry: 3000\n\n'
+        while loop.time() < deadline:
+            payload = await sync_to_async(task_comment_changes)(pk, since, known_count)
+            if payload['comments'] or 'ids' in payload:
+                since = _parse_comment_cursor(payload['cursor'])
+                yield f"id: {payload['cursor'] or ''}\nevent: comments\ndata: {json.dumps(payload)}\n\n"
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= COMMENT_STREAM_KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = loop.time()
+            known_count = payload['count']
+            await asyncio.sleep(COMMENT_STREAM_POLL_SECONDS)
+
+    return StreamingHttpResponse(
+        events(),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 
 @login_required
 def task_add_lead(request, lead_id):
@@ -270,4 +480,195 @@ def task_add_lead(request, lead_id):
                 created_by=request.user,
             )
         return redirect('lead:detail', lead_id)
-    return redirect('lead:detail', lead_id)
\ No newline at end of file
+    return redirect('lead:detail', lead_id)
+
+
+# Export tasks (csv, gzipped ndjson or parquet)
+@login_required
+def tasks_export(request):
+    tasks_list = Task.objects.filter(Q(created_by=request.user) | Q(assigned_to=request.user))
+    return export_response(request, tasks_list, TASK_EXPORT_COLUMNS, 'tasks', 'updated_at')
+
+
+# Kanban board
+BOARD_PAGE_SIZE = 20
+BOARD_ORDER = ('-created_at', '-id')
+
+
+def _board_card(task):
+    return {
+        'id': task.pk,
+        'title': task.title,
+        'priority': task.priority,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'assigned_to': (task.assigned_to.get_full_name() or task.assigned_to.username) if task.assigned_to else None,
+        'cursor': f'{task.created_at.isoformat()}|{task.pk}',
+    }
+
+
+def _board_queryset(user):
+    return Task.objects.visible_to(user).select_related('assigned_to').only(
+        'title', 'priority', 'status', 'due_date', 'created_at',
+        'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name',
+    )
+
+
+@login_required
+def task_board(request):
+    statuses = [value for value, label in Task.STATUS_CHOICES]
+    scoped = Task.objects.visible_to(request.user).filter(status__in=statuses)
+
+    # Per-column totals in one GROUP BY
+    counts = dict(scoped.order_by().values_list('status').annotate(count=Count('id')))
+
+    # First page of every column in one query: number rows within each status
+    # and keep the first BOARD_PAGE_SIZE + 1 (the extra row signals "more").
+    first_pages = (
+        _board_queryset(request.user)
+        .filter(status__in=statuses)
+        .annotate(row=Window(RowNumber(), partition_by=F('status'), order_by=[F('created_at').desc(), F('id').desc()]))
+        .filter(row__lte=BOARD_PAGE_SIZE + 1)
+        .order_by('status', 'row')
+    )
+    cards = {status: [] for status in statuses}
+    for task in first_pages:
+        cards[task.status].append(task)
+
+    columns = []
+    for value, label in Task.STATUS_CHOICES:
+        column_tasks = cards[value]
+        columns.append({
+            'status': value,
+            'label': label,
+            'count': counts.get(value, 0),
+            'cards': [_board_card(task) for task in column_tasks[:BOARD_PAGE_SIZE]],
+            'has_more': len(column_tasks) > BOARD_PAGE_SIZE,
+        })
+
+    return render(request, 'task/task_board.html', {'columns': columns})
+
+
+@login_required
+def task_board_column(request, status):
+    """Next page of one board column, keyed by the (created_at, id) cursor."""
+    if status not in dict(Task.STATUS_CHOICES):
+        raise Http404()
+
+    tasks_list = _board_queryset(request.user).filter(status=status).order_by(*BOARD_ORDER)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        created_at, _, pk = cursor.rpartition('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk.isdigit():
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        tasks_list = tasks_list.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=int(pk))
+        )
+
+    page = list(tasks_list[:BOARD_PAGE_SIZE + 1])
+    return JsonResponse({
+        'cards': [_board_card(task) for task in page[:BOARD_PAGE_SIZE]],
+        'has_more': len(page) > BOARD_PAGE_SIZE,
+    })
+
+
+@login_required
+def task_board_move(request, pk):
+    """Drag-and-drop status change applied as a single UPDATE."""
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    status = request.POST.get('status')
+    if status not in dict(Task.STATUS_CHOICES):
+        return JsonResponse({"error": "Invalid status"}, status=400)
+
+    # Same rule as task_edit: only the creator or the assignee may change it.
+    updated = (
+        Task.objects.filter(pk=pk)
+        .filter(Q(created_by=request.user) | Q(assigned_to=request.user))
+        .update(status=status, updated_at=timezone.now())
+    )
+    if not updated:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    if status == 'completed':
+        materialize_next_occurrence(Task.objects.select_related('series').get(pk=pk))
+    return JsonResponse({"success": True})
+
+
+@login_required
+def task_bulk_update(request):
+    """
+    Apply one change (status, priority, assignee or due date) to many tasks.
+
+    The target is either the ticked rows or everything the list filters
+    match. Permissions are counted in the same query that sizes the target
+    (only the creator or the assignee may edit, as in ``task_edit``), and the
+    change is a single UPDATE inside one transaction.
+    """
+    if request.method != "POST":
+        raise Http404()
+
+    form = TaskBulkForm(request.POST)
+    wants_json = request.headers.get('Accept') == 'application/json'
+    if not form.is_valid():
+        errors = '; '.join(error for errors in form.errors.values() for error in errors)
+        if wants_json:
+            return JsonResponse({"error": errors}, status=400)
+        messages.error(request, errors)
+        return redirect(_task_list_url(request.POST))
+
+    targets = Task.objects.visible_to(request.user)
+    if form.cleaned_data['scope'] == 'filter':
+        selected = {facet: request.POST.get(f'filter_{facet}', '') for facet in TASK_FACETS}
+        targets = filter_tasks(targets, selected)
+    else:
+        targets = targets.filter(pk__in=form.cleaned_data['ids'])
+
+    can_edit = Q(created_by=request.user) | Q(assigned_to=request.user)
+    editable = Task.objects.filter(pk__in=targets.values('pk')).filter(can_edit)
+    changes = form.changes()
+
+    with transaction.atomic():
+        counts = targets.aggregate(matched=Count('id'), editable=Count('id', filter=can_edit))
+        completing = []
+        if changes.get('status') == 'completed':
+            # Recurring tasks get their next occurrence, as in task_edit.
+            completing = list(
+                editable.exclude(status='completed').exclude(recurrence='').select_related('series')
+            )
+        viewers = None
+        if 'assigned_to' in changes:
+            # The UPDATE skips signals; previous assignees' agenda feeds still
+            # have to drop the tasks.
+            viewers = task_viewers(editable.only(*TASK_VIEWER_FIELDS))
+        updated = editable.update(**changes, updated_at=timezone.now())
+        if viewers:
+            record_task_departures(viewers, Task.objects.filter(pk__in=viewers).only(*TASK_VIEWER_FIELDS))
+        for task in completing:
+            task.status = 'completed'
+            materialize_next_occurrence(task)
+
+    result = {
+        'matched': counts['matched'],
+        'updated': updated,
+        'skipped': counts['matched'] - updated,
+    }
+    if wants_json:
+        return JsonResponse(result)
+
+    message = f"Updated {updated} task{'s' if updated != 1 else ''}."
+    if result['skipped']:
+        message += f" Skipped {result['skipped']} you cannot edit."
+    messages.success(request, message)
+    return redirect(_task_list_url(request.POST))
+
+
+def _task_list_url(data):
+    """Task list URL keeping the filters the bulk form was submitted with."""
+    filters = QueryDict(mutable=True)
+    for facet in TASK_FACETS:
+        if data.get(f'filter_{facet}'):
+            filters[facet] = data[f'filter_{facet}']
+    url = reverse('task:task_list')
+    return f'{url}?{filters.urlencode()}' if filters else url
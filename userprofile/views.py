@@ -8,6 +8,7 @@ from django.urls import reverse, reverse_lazy
 from django.db import IntegrityError
 from django.utils.decorators import method_decorator
 
+from core.thumbnails import AVATAR_SIZE, schedule_thumbnail
 from userprofile.forms import UserProfileForm, CustomPasswordChangeForm
 from userprofile.models import UserProfile
 
@@ -73,7 +74,9 @@ def edit_profile(request):
         form = UserProfileForm(request.POST, request.FILES, instance=user_profile)
 
         if form.is_valid():
-            form.save()
+            user_profile = form.save()
+            if user_profile.profile_pic:
+                schedule_thumbnail(user_profile.profile_pic.name, AVATAR_SIZE)
 
             return redirect('userprofile:account')
 
@@ -91,6 +94,7 @@ def user_account(request):
     # Renders the current user's account page
     context = {
         "user": request.user,
+        "user_profile": UserProfile.objects.filter(user=request.user).first(),
     }
     return render(request, "userprofile/account.html", context)
 